@@ -0,0 +1,248 @@
+"""
+Load test of the app served by several processes on a synthetic database: start-up time of the workers, which memory
+map the aggregate cube computed by the first one, and requests per second as the number of workers grows.
+The workers are werkzeug servers listening on local ports, one per worker, and the clients are local HTTP clients
+spreading their requests over the workers. Finally, transactions are saved while the workers are running, as by an
+archive, and the data served by each worker are compared.
+
+    python benchmarks/bench_app_workers.py [number of transactions] [maximum number of workers]
+"""
+import sys
+import json
+import time
+import logging
+import sqlite3
+import tempfile
+import http.client
+import multiprocessing as mp
+from contextlib import contextmanager
+from pathlib import Path, PurePath
+from werkzeug.serving import make_server
+from bench_database_indexes import create_synthetic_db
+from finances.app import create_server
+from finances.database.database import get_data_version
+from finances.database.migrations import migrate
+
+ACCOUNT_NAME = 'Account 2'
+BASE_PORT = 8150
+DURATION = 5  # s
+CLIENTS_BY_WORKER = 2
+LAST_MONTH = 10000  # after the last month: the ranges are clipped to the months of the account
+ARCHIVED_TRANSACTIONS = 1000
+
+
+def callback(output: str, inputs: dict, state: dict = None):
+    """
+    Body of a request of a dash callback
+    :param output: output of the callback (id.property)
+    :param inputs: values of the inputs (id.property)
+    :param state: values of the states (id.property)
+    :return: request body
+    """
+    def to_props(values: dict):
+        return [{'id': key.split('.')[0], 'property': key.split('.')[1], 'value': value}
+                for key, value in values.items()]
+
+    component_id, component_property = output.split('.')
+    return json.dumps({
+        'output': output,
+        'outputs': {'id': component_id, 'property': component_property},
+        'inputs': to_props(inputs),
+        'state': to_props(state or {}),
+        'changedPropIds': [],
+    })
+
+
+# Requests of a client, in turn: page layout, tab rendering, figures (revalidated with their ETag) and sub-category figure
+REQUESTS = [
+    ('GET', '/_dash-layout', None),
+    ('POST', '/_dash-update-component', callback('tab_content.children', {'tabs.value': 'balance',
+                                                                         'month_range.value': [0, LAST_MONTH]})),
+    ('GET', f'/figures/total/0/{LAST_MONTH}', None),
+    ('GET', f'/figures/category/0/{LAST_MONTH}', None),
+    ('POST', '/_dash-update-component', callback('sub_category_figure_bar.figure', {
+        'category_radio_item.value': 'Category 1', 'month_range.value': [0, LAST_MONTH]})),
+    ('GET', f'/figures/category/24/{LAST_MONTH}', None),
+]
+
+
+def serve(folder: str, port: int, ready: mp.Queue):
+    """
+    Create the app and serve it on a local port
+    :param folder: project folder
+    :param port: port of the worker
+    :param ready: queue receiving the start-up time of the worker
+    """
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    start = time.perf_counter()
+    server = create_server(folder, 'benchmark.db', ACCOUNT_NAME)
+    ready.put(time.perf_counter() - start)
+    make_server('127.0.0.1', port, server, threaded=True).serve_forever()
+
+
+def load(ports: list, duration: float, offset: int):
+    """
+    Send requests to the workers in turn during a given time
+    :param ports: ports of the workers
+    :param duration: time of the test in s
+    :param offset: first request of the client
+    :return: number of requests answered
+    """
+    connections = [http.client.HTTPConnection('127.0.0.1', port) for port in ports]
+    etags = {}
+    count = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        i = offset + count
+        method, path, body = REQUESTS[i % len(REQUESTS)]
+        headers = {'Content-Type': 'application/json', 'Accept-Encoding': 'gzip'}
+        if path in etags:
+            headers['If-None-Match'] = etags[path]
+        con = connections[i % len(connections)]
+        con.request(method, path, body, headers)
+        response = con.getresponse()
+        response.read()
+        if response.status not in (200, 304):
+            raise RuntimeError(f'{method} {path}: {response.status}')
+        if response.getheader('ETag'):
+            etags[path] = response.getheader('ETag')
+        count += 1
+    for con in connections:
+        con.close()
+    return count
+
+
+@contextmanager
+def running_workers(folder: str, worker_number: int):
+    """
+    Start the workers and stop them on exit
+    :param folder: project folder
+    :param worker_number: number of workers
+    :return: ports of the workers and their start-up times in s
+    """
+    ready = mp.Queue()
+    ports = [BASE_PORT + i for i in range(worker_number)]
+    workers = []
+    try:
+        for port in ports:
+            worker = mp.Process(target=serve, args=(folder, port, ready), daemon=True)
+            worker.start()
+            workers.append(worker)
+        startup_times = [ready.get() for _ in workers]
+        time.sleep(0.5)
+        yield ports, startup_times
+    finally:
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+
+
+def run(folder: str, worker_number: int):
+    """
+    Start the workers and load them
+    :param folder: project folder
+    :param worker_number: number of workers
+    :return: start-up times of the workers in s and requests per second
+    """
+    with running_workers(folder, worker_number) as (ports, startup_times):
+        client_number = CLIENTS_BY_WORKER * worker_number
+        with mp.Pool(client_number) as pool:
+            counts = pool.starmap(load, [(ports, DURATION, i) for i in range(client_number)])
+    return startup_times, sum(counts) / DURATION
+
+
+def archive(database: Path, transaction_number: int):
+    """
+    Save new transactions of the account in a single database transaction, as when a statement is archived
+    :param database: the database path
+    :param transaction_number: number of transactions
+    :return: data version of the database after the archive
+    """
+    con = sqlite3.connect(str(database))
+    db_cursor = con.cursor()
+    db_cursor.execute('SELECT account_id FROM Account WHERE name = ?', (ACCOUNT_NAME,))
+    account_id = db_cursor.fetchone()[0]
+    db_cursor.execute("SELECT DATE(MAX(date), '+1 day') FROM Statement")
+    date = db_cursor.fetchone()[0]
+    db_cursor.executemany('''INSERT INTO Statement (date, account_id, detail, entity_id, amount, currency, method_id,
+                             type_id, category_id, sub_category_id)
+                             VALUES (?, ?, 'DETAIL', 1, -1, 'GBP', 1, 1, ?, 1)''',
+                          [(date, account_id, i % 20 + 1) for i in range(transaction_number)])
+    con.commit()
+    data_version = get_data_version(db_cursor)
+    con.close()
+    return data_version
+
+
+def get_served_data(port: int):
+    """
+    Request the header and the data version of the account from a worker. The header is requested first, as by a
+    session that has seen the change from another worker
+    :param port: port of the worker
+    :return: header, data version and time of the requests in s
+    """
+    con = http.client.HTTPConnection('127.0.0.1', port)
+    start = time.perf_counter()
+    served = []
+    for output, inputs, state in [
+        ('header.children', {'data_version.data': None}, None),
+        ('data_version.data', {'refresh_interval.n_intervals': 1}, {'data_version.data': None}),
+    ]:
+        con.request('POST', '/_dash-update-component', callback(output, inputs, state),
+                    {'Content-Type': 'application/json'})
+        response = con.getresponse()
+        if response.status != 200:
+            raise RuntimeError(f'POST {output}: {response.status}')
+        props = json.loads(response.read())['response']
+        component_id, component_property = output.split('.')
+        # The single outputs are not keyed by component id before dash 1.11
+        served.append(props['props' if 'props' in props else component_id][component_property])
+    con.close()
+    return json.dumps(served[0]), served[1], time.perf_counter() - start
+
+
+def check_consistency(folder: str, worker_number: int):
+    """
+    Archive transactions while the workers are running, then check that they all serve the new data to the next
+    requests, whichever worker the sessions have polled
+    :param folder: project folder
+    :param worker_number: number of workers
+    :return: time of the first requests to each worker after the archive in s
+    """
+    with running_workers(folder, worker_number) as (ports, _):
+        header_before, _, _ = get_served_data(ports[0])
+        data_version = archive(Path(PurePath(folder, 'benchmark.db')), ARCHIVED_TRANSACTIONS)
+        served = [get_served_data(port) for port in ports]
+    data_versions = [served_version for _, served_version, _ in served]
+    if set(data_versions) != {data_version}:
+        raise RuntimeError(f'Data versions served after the archive: {data_versions}, expected: {data_version}')
+    headers = {header for header, _, _ in served}
+    if len(headers) != 1 or header_before in headers:
+        raise RuntimeError('The workers do not serve the same header after the archive')
+    return [request_time for _, _, request_time in served]
+
+
+def main(transaction_number: int, max_workers: int):
+    with tempfile.TemporaryDirectory() as folder:
+        database = Path(PurePath(folder, 'benchmark.db'))
+        print(f'Creating a database of {transaction_number:,} transactions in 10 accounts')
+        create_synthetic_db(database, transaction_number)
+        con = sqlite3.connect(str(database))
+        migrate(con.cursor())
+        con.close()
+        # The first start-up computes the aggregate cube and saves it, the next ones memory map it
+        startup_times, _ = run(folder, 1)
+        print(f'Start-up computing the aggregates: {startup_times[0]:.2f} s')
+        print(f'{"workers":>8}{"start-up (s)":>14}{"requests/s":>12}')
+        worker_number = 1
+        while worker_number <= max_workers:
+            startup_times, requests_per_second = run(folder, worker_number)
+            print(f'{worker_number:>8}{max(startup_times):>14.2f}{requests_per_second:>12.0f}')
+            worker_number *= 2
+        request_times = check_consistency(folder, max_workers)
+        print(f'{ARCHIVED_TRANSACTIONS} transactions archived: same data served by the {max_workers} workers, '
+              f'first requests in {max(request_times) * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000, int(sys.argv[2]) if len(sys.argv) > 2 else 4)
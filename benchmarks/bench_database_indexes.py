@@ -0,0 +1,90 @@
+"""
+Benchmark of the query latency on a synthetic database before and after the index migration.
+
+    python benchmarks/bench_database_indexes.py [number of transactions]
+"""
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+import datetime as dt
+from pathlib import Path, PurePath
+from finances.database.migrations import migrate, SCHEMA_VERSION
+
+QUERIES = {
+    'last date': 'SELECT MAX(date) FROM Statement',
+    'account last date': 'SELECT MAX(date) FROM Statement WHERE account_id = 2',
+    'account month': '''SELECT COUNT(*), SUM(amount) FROM Statement
+                        WHERE account_id = 2 AND date BETWEEN '2015-06-01' AND '2015-06-30' ''',
+    'category': 'SELECT COUNT(*), SUM(amount) FROM Statement WHERE category_id = 7',
+    'entity': 'SELECT date, amount FROM Statement WHERE entity_id = 42',
+}
+
+
+def create_synthetic_db(database: Path, transaction_number: int):
+    """
+    Create a database at the schema version before the indexes with random transactions
+    :param database: the database path
+    :param transaction_number: number of transactions
+    """
+    con = sqlite3.connect(str(database))
+    db_cursor = con.cursor()
+    migrate(db_cursor, target_version=2)
+    rnd = random.Random(0)
+    db_cursor.executemany('INSERT INTO Account (name) VALUES (?)', [(f'Account {i}',) for i in range(10)])
+    db_cursor.executemany('INSERT INTO Entity (name) VALUES (?)', [(f'Entity {i}',) for i in range(2000)])
+    db_cursor.executemany('INSERT INTO Category (name) VALUES (?)', [(f'Category {i}',) for i in range(20)])
+    db_cursor.executemany('INSERT INTO Sub_category (name) VALUES (?)', [(f'Sub category {i}',) for i in range(100)])
+    db_cursor.executemany('INSERT INTO Type (name) VALUES (?)', [(f'Type {i}',) for i in range(4)])
+    db_cursor.executemany('INSERT INTO Method (name, symbol) VALUES (?, ?)', [(f'Method {i}', f'M{i}')
+                                                                              for i in range(14)])
+    start = dt.date(2000, 1, 1)
+    rows = ((str(start + dt.timedelta(days=rnd.randrange(9000))), rnd.randint(1, 10), 'DETAIL',
+             rnd.randint(1, 2000), round(rnd.uniform(-200, 200), 2), 'GBP', rnd.randint(1, 14), rnd.randint(1, 4),
+             rnd.randint(1, 20), rnd.randint(1, 100)) for _ in range(transaction_number))
+    db_cursor.executemany('''INSERT INTO Statement (date, account_id, detail, entity_id, amount, currency, method_id,
+                             type_id, category_id, sub_category_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+    con.commit()
+    con.close()
+
+
+def time_queries(database: Path, repeat: int = 5):
+    """
+    Time each query
+    :param database: the database path
+    :param repeat: number of runs of each query
+    :return: dictionary of the best latency of each query in ms
+    """
+    con = sqlite3.connect(str(database))
+    latencies = {}
+    for name, query in QUERIES.items():
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            con.execute(query).fetchall()
+            best = min(best, time.perf_counter() - start)
+        latencies[name] = best * 1000
+    con.close()
+    return latencies
+
+
+def main(transaction_number: int):
+    with tempfile.TemporaryDirectory() as folder:
+        database = Path(PurePath(folder, 'benchmark.db'))
+        print(f'Creating a database of {transaction_number:,} transactions')
+        create_synthetic_db(database, transaction_number)
+        before = time_queries(database)
+        con = sqlite3.connect(str(database))
+        start = time.perf_counter()
+        migrate(con.cursor(), target_version=SCHEMA_VERSION)
+        print(f'Migration to version {SCHEMA_VERSION}: {time.perf_counter() - start:.1f} s')
+        con.close()
+        after = time_queries(database)
+    print(f'{"query":<20}{"before (ms)":>14}{"after (ms)":>14}{"speedup":>10}')
+    for name in QUERIES:
+        print(f'{name:<20}{before[name]:>14.2f}{after[name]:>14.3f}{before[name] / after[name]:>9.0f}x')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000000)
@@ -0,0 +1,111 @@
+"""
+Benchmark of the figures of the dash_app: import time of the figure modules and build time and JSON size of a grouped
+bar figure built from NumPy arrays against the previous cufflinks figure (measured when cufflinks is installed).
+
+    python benchmarks/bench_figures.py [number of months] [number of categories]
+"""
+import sys
+import json
+import time
+import subprocess
+import numpy as np
+import pandas as pd
+from plotly.utils import PlotlyJSONEncoder
+from finances.dash_app.cube import AggregateCube
+from finances.dash_app.layout import generate_layout, get_trace, get_bar_figure
+
+REPEAT = 20
+
+
+def import_time(statement: str):
+    """
+    Measure the import time in a new interpreter
+    :param statement: import statement
+    :return: time in s, None if the import failed
+    """
+    code = f'import time; start = time.perf_counter(); {statement}; print(time.perf_counter() - start)'
+    result = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    return float(result.stdout) if result.returncode == 0 else None
+
+
+def create_aggregates(month_count: int, category_count: int):
+    """
+    Create synthetic monthly amounts by category, in the format of aggregate_transactions
+    :param month_count: number of months
+    :param category_count: number of categories
+    :return: DataFrame of the month, category and amount columns
+    """
+    rng = np.random.RandomState(0)
+    months = pd.date_range('2010-01-31', periods=month_count, freq=pd.offsets.MonthEnd())
+    categories = [f'Category {i}' for i in range(category_count)]
+    df = pd.DataFrame({'month': np.repeat(months, category_count), 'category': categories * month_count})
+    df['amount'] = rng.normal(-100, 50, len(df)).round(2)
+    return df
+
+
+def build_numpy_figure(df: pd.DataFrame):
+    """
+    Build the figure from the aggregate cube of the amounts, emitting one trace per column
+    :param df: aggregated amounts
+    :return: figure
+    """
+    cube = AggregateCube.from_transactions(df.assign(date=df['month'], sub_category=None))
+    months, categories, amounts = cube.category_amounts()
+    months = months.strftime('%Y-%m-%d')
+    figure = get_bar_figure('All Transactions', months, categories, amounts)
+    figure['data'].append(get_trace(months, amounts.sum(axis=1)))
+    return figure
+
+
+def build_cufflinks_figure(df: pd.DataFrame):
+    """
+    Previous figure: pivot_table and cufflinks iplot
+    :param df: aggregated amounts
+    :return: figure
+    """
+    figure = (df.pivot_table(index='month', columns='category', values='amount', aggfunc=np.sum, fill_value=0)
+              .iplot(kind='bar', barmode='group', asFigure=True))
+    figure['layout'] = generate_layout(title='All Transactions')
+    total_df = df.groupby('month').agg({'amount': np.sum})
+    figure.add_trace(get_trace(total_df.index, total_df['amount']))
+    return figure
+
+
+def measure(build_figure, df: pd.DataFrame):
+    """
+    :param build_figure: figure builder
+    :param df: aggregated amounts
+    :return: median build time in ms and size of the figure JSON in kB
+    """
+    times = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        figure = build_figure(df)
+        times.append(time.perf_counter() - start)
+    return 1000 * float(np.median(times)), len(json.dumps(figure, cls=PlotlyJSONEncoder)) / 1000
+
+
+def main(month_count: int = 120, category_count: int = 15):
+    account_import = import_time('import finances.dash_app.account')
+    if account_import is not None:
+        print(f'Import finances.dash_app.account: {account_import:.2f}s')
+    else:
+        print('finances.dash_app.account cannot be imported, its import time is not measured')
+    cufflinks_import = import_time('import cufflinks; cufflinks.go_offline()')
+    if cufflinks_import is not None:
+        print(f'Import cufflinks: {cufflinks_import:.2f}s')
+    df = create_aggregates(month_count, category_count)
+    print(f'{month_count} months x {category_count} categories')
+    build_time, size = measure(build_numpy_figure, df)
+    print(f'NumPy figure: {build_time:.1f}ms, {size:.0f}kB')
+    if cufflinks_import is None:
+        print('cufflinks is not installed, the previous figure is not measured')
+        return
+    import cufflinks
+    cufflinks.go_offline()
+    build_time, size = measure(build_cufflinks_figure, df)
+    print(f'cufflinks figure: {build_time:.1f}ms, {size:.0f}kB')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:3]))
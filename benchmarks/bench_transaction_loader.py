@@ -0,0 +1,85 @@
+"""
+Benchmark of the transaction loader and of the Arrow snapshot against the previous fetchall loader on a synthetic
+database: load time, peak memory while loading and memory of the DataFrame.
+
+    python benchmarks/bench_transaction_loader.py [number of transactions]
+"""
+import sys
+import time
+import sqlite3
+import tempfile
+import tracemalloc
+from pathlib import Path, PurePath
+import pandas as pd
+from bench_database_indexes import create_synthetic_db
+from finances.database.database import ATTRIBUTES, load_all_transactions
+from finances.database.migrations import migrate
+from finances.database.snapshot import write_snapshot, read_snapshot
+
+
+def load_all_transactions_fetchall(database: Path, account_name: str):
+    """
+    Previous loader: fetchall of the joined names and DataFrame of python strings
+    :param database: the database path
+    :param account_name: the account name
+    :return: Dataframe of all the transactions
+    """
+    con = sqlite3.connect(str(database))
+    db_cursor = con.cursor()
+    db_cursor.execute(
+        f'''
+        SELECT S.date, A.name, E.name, T.name,
+               C.name, SC.name, S.detail, M.name, S.currency, S.amount
+              FROM Statement S
+              OUTER LEFT JOIN Entity E on E.entity_id = S.entity_id
+              OUTER LEFT JOIN Method M on M.method_id = S.method_id
+              INNER JOIN Type T on T.type_id = S.type_id
+              OUTER LEFT JOIN Category C on C.category_id = S.category_id
+              OUTER LEFT JOIN Account A on A.account_id = S.account_id
+              OUTER LEFT JOIN Sub_category SC on SC.sub_category_id = S.sub_category_id
+              WHERE A.name = '{account_name}';
+        ''')
+    res = db_cursor.fetchall()
+    con.close()
+    df = pd.DataFrame(res, columns=ATTRIBUTES.keys())
+    df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
+    df['amount'] = df['amount'].astype(float)
+    return df
+
+
+def measure(loader, database: Path, account_name: str):
+    """
+    Load the transactions of an account while tracing the memory allocations
+    :param loader: transaction loader
+    :param database: the database path
+    :param account_name: the account name
+    :return: time in s, peak memory in MB and DataFrame memory in MB
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    df = loader(database, account_name)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20, df.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def main(transaction_number: int):
+    with tempfile.TemporaryDirectory() as folder:
+        database = Path(PurePath(folder, 'benchmark.db'))
+        print(f'Creating a database of {transaction_number:,} transactions in 10 accounts')
+        create_synthetic_db(database, transaction_number)
+        con = sqlite3.connect(str(database))
+        migrate(con.cursor())
+        con.close()
+        results = {'fetchall': measure(load_all_transactions_fetchall, database, 'Account 2'),
+                   'chunked': measure(load_all_transactions, database, 'Account 2')}
+        write_snapshot(database)
+        results['snapshot'] = measure(read_snapshot, database, 'Account 2')
+    print(f'{"loader":<12}{"time (s)":>10}{"peak (MB)":>12}{"frame (MB)":>12}')
+    for name, (elapsed, peak, frame) in results.items():
+        print(f'{name:<12}{elapsed:>10.2f}{peak:>12.1f}{frame:>12.1f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000000)
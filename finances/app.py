@@ -4,52 +4,174 @@ import logging
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output
-from flask.helpers import get_root_path
-from .dash_app.account import Account
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
+from flask import abort
+from .dash_app.account import Account, AccountState
+from .dash_app.table import get_transaction_page
+from .dash_app.figure_cache import FigureCache
+from .dash_app.figure_store import FigureStore, send_figure, send_not_modified
 from .dash_app.layout import TAB_STYLE, TAB_SELECTED_STYLE
-from .dash_app.content import (main_header, tab_balance, tab_category_breakdown,
-                               tab_sub_category_breakdown, tab_transaction)
+from .dash_app.content import TABS, main_header, month_range_slider, get_month_marks
 
 logger = logging.getLogger('finances.dash_app')
 
-ASSETS_PATH = os.path.join(get_root_path('__main__'), r'finances\dash_app\assets')
+ASSETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dash_app', 'assets')
 
+# Interval between two checks of the database for new transactions, in ms
+REFRESH_INTERVAL = 10000
 
-def run_app(project_folder: str, database_name: str):
+
+def create_app(project_folder: str, database_name: str, account_name: str = 'HSBC UK'):
     """
-    Run the app
+    Create the app. Each process serving the app creates its own: the aggregates of the account are computed by the
+    first one and memory mapped by the others from the cube file saved next to the database.
     :param project_folder: folder of the project
     :param database_name: name of the database
+    :param account_name: the account name. When more accounts are supported, it will be selected via callback in the
+    dash_app
+    :return: Dash app, its Flask server is app.server
     """
     database = Path(PurePath(project_folder, database_name))
-    account_name = 'HSBC UK'  # Whren more accounts are supported, this will be selected via callback in the dash_app
     account = Account(database=database, account_name=account_name)
-    app = dash.Dash(__name__, assets_folder=ASSETS_PATH)
+    account.warm_figure_cache()
+    # The tab contents are rendered by callback, so their components are not in the initial layout
+    app = dash.Dash(__name__, assets_folder=ASSETS_PATH, suppress_callback_exceptions=True)
     app.title = 'Transactions Analysis'
+    state = account.state
     app.layout = html.Div(
         children=[
-            main_header(account),
+            dcc.Store(id='data_version', data=state.data_version),
+            dcc.Interval(id='refresh_interval', interval=REFRESH_INTERVAL),
+            html.Div(id='header'),
+            month_range_slider(state),
             dcc.Tabs(
+                id='tabs',
+                value='balance',
                 children=[
-                    dcc.Tab(label='Balance', style=TAB_STYLE, selected_style=TAB_SELECTED_STYLE,
-                            children=[tab_balance(account)]),
-                    dcc.Tab(label='Category breakdown', style=TAB_STYLE, selected_style=TAB_SELECTED_STYLE,
-                            children=[tab_category_breakdown(account)]),
-                    dcc.Tab(label='Sub-category breakdown', style=TAB_STYLE, selected_style=TAB_SELECTED_STYLE,
-                            children=[tab_sub_category_breakdown(account)]),
-                    dcc.Tab(label='Transaction', style=TAB_STYLE, selected_style=TAB_SELECTED_STYLE,
-                            children=[tab_transaction(account)]),
+                    dcc.Tab(label=label, value=value, style=TAB_STYLE, selected_style=TAB_SELECTED_STYLE)
+                    for value, (label, _) in TABS.items()
                 ]
             ),
+            html.Div(id='tab_content'),
         ]
     )
 
+    @app.server.before_request
+    def refresh_account():
+        # Each process serving the app has its own account: it is brought up to date before serving any request, so
+        # that all the processes serve the same data whichever one the requests of a session land on
+        account.refresh()
+
+    tab_cache = FigureCache(max_size=4 * len(TABS))
+    figure_store = FigureStore(database)
+    figures = {'total': AccountState.get_total_figure, 'category': AccountState.get_category_figure_bar}
+
+    # The callbacks and routes read the state of the account once: it is replaced as a whole when it is refreshed
+    @app.server.route('/figures/<name>/<int:start>/<int:end>')
+    def get_figure(name, start, end):
+        if name not in figures:
+            abort(404)
+        state = account.state
+        start, end = state.get_month_range([start, end - 1])
+        figure_name = f'{name}-{start}-{end}'
+        # The ETag depends on the data version only: a client with the current figure gets a 304 without any read
+        response = send_not_modified(FigureStore.get_etag(figure_name, state.data_version))
+        if response is not None:
+            return response
+        figure = figure_store.get(figure_name, state.data_version, lambda: figures[name](state, start, end))
+        return send_figure(*figure)
+
+    for figure_id, url_id in [('total_figure_cumsum', 'total_figure_url'), ('bar', 'category_figure_url')]:
+        app.clientside_callback(
+            ClientsideFunction(namespace='figures', function_name='fetch_figure'),
+            Output(figure_id, 'figure'),
+            [Input(url_id, 'data')])
+
+    @app.callback(
+        Output('data_version', 'data'),
+        [Input('refresh_interval', 'n_intervals')],
+        [State('data_version', 'data')])
+    def refresh_data(n_intervals, data_version):
+        # The account has been refreshed before the request: each session compares its own data version
+        current_data_version = account.state.data_version
+        if current_data_version == data_version:
+            raise PreventUpdate
+        return current_data_version
+
+    @app.callback(
+        Output('header', 'children'),
+        [Input('data_version', 'data')])
+    def render_header(data_version):
+        return main_header(account.state)
+
+    @app.callback(
+        [Output('month_range', 'max'), Output('month_range', 'marks'), Output('month_range', 'value'),
+         Output('first_month', 'data')],
+        [Input('data_version', 'data')],
+        [State('month_range', 'value'), State('month_range', 'max'), State('first_month', 'data')])
+    def update_month_range(data_version, month_range, previous_last, previous_first_month):
+        state = account.state
+        last = len(state.months) - 1
+        # A range ending on the last month follows the new months
+        follow_last = not month_range or month_range[1] >= previous_last
+        if month_range and previous_first_month is not None and state.first_month is not None:
+            # The positions are shifted by the months added before the first one, so the same months stay selected
+            shift = previous_first_month - state.first_month
+            month_range = [position + shift for position in month_range]
+        start, end = state.get_month_range(month_range)
+        if follow_last:
+            end = last + 1
+        return last, get_month_marks(state), [start, end - 1], state.first_month
+
+    @app.callback(
+        Output('tab_content', 'children'),
+        [Input('tabs', 'value'), Input('month_range', 'value')])
+    def render_tab(tab, month_range):
+        _, create_tab = TABS[tab]
+        state = account.state
+        start, end = state.get_month_range(month_range)
+        return tab_cache.get((tab, start, end, state.data_version), lambda: create_tab(state, start, end))
+
     @app.callback(
         Output('sub_category_figure_bar', 'figure'),
-        [Input('category_radio_item', 'value')])
-    def update_figure(category):
-        return account.get_sub_category_figure_bar(category)
+        [Input('category_radio_item', 'value'), Input('month_range', 'value')])
+    def update_figure(category, month_range):
+        state = account.state
+        figure = state.get_sub_category_figure_bar(category, *state.get_month_range(month_range))
+        logger.debug(f'Figure cache: {account.figure_cache.stats()}')
+        return figure
 
+    @app.callback(
+        [Output('datatable', 'data'), Output('datatable', 'page_count')],
+        [Input('datatable', 'page_current'), Input('datatable', 'page_size'), Input('datatable', 'sort_by'),
+         Input('datatable', 'filter_query')])
+    def update_transaction_table(page_current, page_size, sort_by, filter_query):
+        return get_transaction_page(database, account_name, page_current, page_size, sort_by, filter_query,
+                                    account.state.data_version)
+
+    return app
+
+
+def create_server(project_folder: str, database_name: str, account_name: str = 'HSBC UK'):
+    """
+    Create the WSGI application of the app, e.g. to serve it with several workers:
+    gunicorn --workers 4 'finances.app:create_server("my_project_folder", "my_database_name")'
+    The app must be created in each worker (no --preload): the database connections are not shared between processes.
+    :param project_folder: folder of the project
+    :param database_name: name of the database
+    :param account_name: the account name
+    :return: Flask server of the app
+    """
+    return create_app(project_folder, database_name, account_name).server
+
+
+def run_app(project_folder: str, database_name: str):
+    """
+    Run the app on the development server of Flask
+    :param project_folder: folder of the project
+    :param database_name: name of the database
+    """
+    app = create_app(project_folder, database_name)
     logger.info(f'App is running in http://127.0.0.1:8050/')
     app.run_server(debug=False)
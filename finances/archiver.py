@@ -2,11 +2,22 @@ import sqlite3
 import logging
 import datetime as dt
 from pathlib import Path, PurePath
+from typing import List
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 from pandas.tseries.offsets import Day
 from .utils.logger import create_logger
-from .database.database import create_db, get_db_last_date, get_balance
-from .utils.tools import to_date, statement_file_date
+from .database.connection import get_connection_manager
+from .database.snapshot import write_snapshot
+from .database.database import (create_db, load_entity_memo, save_entity_memo, DimensionCache, get_ledger_entry,
+                                get_ledger_hashes, get_previous_end_balance, get_next_start_balance,
+                                get_unledgered_last_date, delete_statement)
+from .utils.tools import to_date, statement_file_date, file_hash
 from .processing.statement import Statement
+from .processing.matcher import EntityMemo
+from .processing.mapping import get_entity_mapping
+from .hsbc.cache import PageCache
+from .utils.pipeline import Pipeline, Stage
 
 
 def get_statement_file(statements_folder: Path, last_date: dt.date):
@@ -25,14 +36,44 @@ def get_statement_file(statements_folder: Path, last_date: dt.date):
     return statement_file_list
 
 
-def archive_statements(project_folder: str, database_name: str, statements_folder: str):
+def get_pending_statement_files(statements_folder: Path, db_cursor: sqlite3.Cursor):
     """
-    Archive each given statement in the Database
+    Find the pdf statements that have not been archived yet.
+    The statements in the ledger are recognised by their file hash without being read. For databases filled before
+    the ledger, the statements before the last date of these transactions are skipped.
+    :param statements_folder: statement folder
+    :param db_cursor: database cursor
+    :return: the path of the statements files sorted by date
+    """
+    logger = logging.getLogger('finances.archiver')
+    unledgered_last_date = get_unledgered_last_date(db_cursor)
+    if unledgered_last_date is None:
+        last_date = dt.date.min
+    else:
+        last_date = (to_date(unledgered_last_date, '%Y-%m-%d') - Day(6)).date()
+    ledger_hashes = get_ledger_hashes(db_cursor)
+    ledger_periods = set(ledger_hashes.values())
+    statement_file_list = []
+    for statement_file in get_statement_file(statements_folder, last_date):
+        if file_hash(statement_file) in ledger_hashes:
+            continue
+        period = f'{statement_file_date(statement_file):%Y-%m}'
+        if period in ledger_periods:
+            logger.warning(f'{statement_file.name}: another statement of {period} has already been archived. '
+                           f'Use reingest_statement to replace it')
+            continue
+        statement_file_list.append(statement_file)
+    return statement_file_list
+
+
+def connect_database(project_folder: str, database_name: str):
+    """
+    Connect to the database of the project, creating it or upgrading its schema if needed.
+    The connection is reused by the next calls from the same thread until the manager closes it.
     :param project_folder: the project folder
     :param database_name: the database name
-    :param statements_folder: the statement folder
+    :return: connection manager of the database
     """
-    create_logger(Path(project_folder))
     logger = logging.getLogger('finances.archiver')
     if not Path(project_folder).exists():
         logger.error(f'folder: {project_folder} not found')
@@ -40,24 +81,194 @@ def archive_statements(project_folder: str, database_name: str, statements_folde
     database = Path(PurePath(project_folder, database_name))
     if Path(database).exists():
         logger.info('Connecting to Database')
-        con = sqlite3.connect(database)
-        con.execute('pragma foreign_keys=ON')
-        db_cursor = con.cursor()
     else:
         logger.info(f'No Database found for path {database}'
                     f'--> Creating New Database')
-        con = sqlite3.connect(database)
-        con.execute('pragma foreign_keys=ON')
-        db_cursor = con.cursor()
-        create_db(db_cursor)
+    connection_manager = get_connection_manager(database)
+    create_db(connection_manager.connection.cursor())
+    return connection_manager
+
+
+def read_statement(statement_file: Path, project_folder: Path, page_cache: PageCache = None,
+                   fast_extraction: bool = False, entity_memo: EntityMemo = None):
+    """
+    Read the transactions of a statement and map their entities. Used by the worker processes when archiving in
+    parallel
+    :param statement_file: statement file
+    :param project_folder: the project folder
+    :param page_cache: cache of the statement pages
+    :param fast_extraction: if True, only the transaction table is read without layout analysis
+    :param entity_memo: memo of the previous entity mapping decisions. The new decisions are kept in the memo of the
+    statement and merged by the main process
+    :return: the statement read and mapped
+    """
+    statement = Statement(statement_file, project_folder, page_cache=page_cache, fast_extraction=fast_extraction,
+                          entity_memo=entity_memo)
+    statement.process()
+    return statement
+
+
+def read_statements(statement_file_list: List[Path], project_folder: Path, workers: int = 1,
+                    page_cache: PageCache = None, fast_extraction: bool = False, entity_memo: EntityMemo = None):
+    """
+    Yield the statements read and mapped in the order of the statement files.
+    When workers > 1, the statements are read and mapped in a process pool while the previous ones are consumed.
+    :param statement_file_list: the statement files sorted by date
+    :param project_folder: the project folder
+    :param workers: number of worker processes
+    :param page_cache: cache of the statement pages
+    :param fast_extraction: if True, only the transaction table is read without layout analysis
+    :param entity_memo: memo of the previous entity mapping decisions. The workers get a copy of it, taken when the
+    statements are submitted
+    :return: generator of statements
+    """
+    if workers <= 1 or len(statement_file_list) <= 1:
+        for statement_file in statement_file_list:
+            yield read_statement(statement_file, project_folder, page_cache, fast_extraction, entity_memo)
+        return
 
-    last_database_date = (to_date(get_db_last_date(db_cursor), '%Y-%m-%d') - Day(6)).date()
-    statement_file_list = get_statement_file(Path(statements_folder), last_database_date)
+    with ProcessPoolExecutor(max_workers=workers, initializer=create_logger) as executor:
+        futures = [executor.submit(read_statement, statement_file, project_folder, page_cache, fast_extraction,
+                                   entity_memo)
+                   for statement_file in statement_file_list]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            # Stop the pending statements if the consumer stopped early (balance or mapping error)
+            for future in futures:
+                future.cancel()
 
-    for statement_file in statement_file_list:
-        prev_end_balance = get_balance(db_cursor)
-        statement = Statement(statement_file, Path(project_folder), prev_end_balance)
+
+def write_statement(statement: Statement, con: sqlite3.Connection, dimension_cache: DimensionCache,
+                    entity_memo: EntityMemo):
+    """
+    Check the balance of a mapped statement against the ledger and commit its transactions
+    :param statement: mapped statement
+    :param con: database connection
+    :param dimension_cache: name to id maps of the dimension tables
+    :param entity_memo: memo of the archiving, completed with the new entity mapping decisions of the statement
+    """
+    if statement.entity_memo.mapping_hash == entity_memo.mapping_hash:
+        entity_memo.merge(statement.entity_memo)
+    logger = logging.getLogger('finances.archiver')
+    db_cursor = con.cursor()
+    statement.prev_end_balance = get_previous_end_balance(db_cursor, statement.period)
+    statement.next_start_balance = get_next_start_balance(db_cursor, statement.period)
+    statement.save_to_database(db_cursor, dimension_cache)
+    save_entity_memo(db_cursor, statement.entity_memo.mapping_hash, statement.entity_memo.new_entries)
+    con.commit()
+    logger.info(f'{statement.statement_file.name}: SUCCESS')
+
+
+def update_snapshot(database: Path):
+    """
+    Export the transaction snapshot of the database once the statements are saved. A failure does not undo the
+    saved statements: it is logged and the app loads the transactions from the database until the next export.
+    :param database: the database path
+    """
+    try:
+        write_snapshot(database)
+    except Exception:
+        logging.getLogger('finances.archiver').exception('Transaction snapshot not saved')
+    finally:
+        # The read only connections of the export would otherwise keep the database file open (locked on Windows)
+        get_connection_manager(database, read_only=True).close_all()
+
+
+def transaction_count(statement: Statement):
+    """
+    :param statement: statement read
+    :return: number of transactions of the statement
+    """
+    return len(statement.transaction_collection)
+
+
+def archive_statements(project_folder: str, database_name: str, statements_folder: str, workers: int = 1,
+                       use_cache: bool = True, cache_size: int = 50, fast_extraction: bool = False):
+    """
+    Archive each given statement in the Database.
+    The statements go through a pipeline: the pdf files are read and their transactions mapped, in a thread or in the
+    worker processes, while the previous statements are saved in the calling thread. The statements are saved in date
+    order, each one in its own transaction: an error in any step stops the archiving after the statements already
+    saved.
+    :param project_folder: the project folder
+    :param database_name: the database name
+    :param statements_folder: the statement folder
+    :param workers: number of processes used to read the pdf statements and map their transactions. The statements
+    are still saved one by one in date order.
+    :param use_cache: if True, the pages read from the pdf statements are cached in the project cache folder
+    :param cache_size: maximum size of the page cache in MB
+    :param fast_extraction: if True, only the characters inside hsbc.vars.TABLE_BBOX are read, without pdfminer
+    layout analysis
+    """
+    create_logger(Path(project_folder))
+    logger = logging.getLogger('finances.archiver')
+    connection_manager = connect_database(project_folder, database_name)
+    con = connection_manager.connection
+    db_cursor = con.cursor()
+
+    try:
+        statement_file_list = get_pending_statement_files(Path(statements_folder), db_cursor)
+
+        page_cache = None
+        if use_cache:
+            page_cache = PageCache(Path(PurePath(project_folder, 'cache')), max_size=cache_size * 2 ** 20)
+
+        mapping_hash = get_entity_mapping(project_folder).hash
+        entity_memo = EntityMemo(mapping_hash, load_entity_memo(db_cursor, mapping_hash))
+        dimension_cache = DimensionCache(db_cursor)
+        con.commit()
+
+        pipeline = Pipeline([
+            Stage('read', size=transaction_count, unit='transactions'),
+            Stage('write', partial(write_statement, con=con, dimension_cache=dimension_cache,
+                                   entity_memo=entity_memo),
+                  size=transaction_count, unit='transactions'),
+        ])
+        pipeline.run(read_statements(statement_file_list, Path(project_folder), workers, page_cache,
+                                     fast_extraction, entity_memo))
+    finally:
+        # Closing the connection rolls back the statement being saved on error
+        connection_manager.close()
+    update_snapshot(connection_manager.database)
+    pipeline.log_summary()
+    logger.info(f'Entity mapping memo: {entity_memo.hits} hits / {entity_memo.misses} misses')
+
+
+def reingest_statement(project_folder: str, database_name: str, statement_file: str):
+    """
+    Replace the transactions of an archived statement by the ones of a corrected statement file of the same period
+    :param project_folder: the project folder
+    :param database_name: the database name
+    :param statement_file: the corrected statement file
+    """
+    create_logger(Path(project_folder))
+    logger = logging.getLogger('finances.archiver')
+    statement_file = Path(statement_file)
+    connection_manager = connect_database(project_folder, database_name)
+    con = connection_manager.connection
+    db_cursor = con.cursor()
+    try:
+        mapping_hash = get_entity_mapping(project_folder).hash
+        entity_memo = EntityMemo(mapping_hash, load_entity_memo(db_cursor, mapping_hash))
+        statement = Statement(statement_file, Path(project_folder), entity_memo=entity_memo)
+        ledger_entry = get_ledger_entry(db_cursor, statement.period)
+        if ledger_entry is None:
+            logger.error(f'No statement of {statement.period} in the ledger')
+            raise ValueError(f'No statement of {statement.period} in the ledger')
+        statement_id, ledger_file_hash, _, _ = ledger_entry
+        if ledger_file_hash == statement.file_hash:
+            logger.info(f'{statement_file.name} is already archived')
+            return
+        statement.prev_end_balance = get_previous_end_balance(db_cursor, statement.period)
+        statement.next_start_balance = get_next_start_balance(db_cursor, statement.period)
+        statement.process()
+        delete_statement(db_cursor, statement_id)
         statement.save_to_database(db_cursor)
+        save_entity_memo(db_cursor, mapping_hash, statement.entity_memo.new_entries)
         con.commit()
-        logger.info(f'{statement_file.name}: SUCCESS')
-    con.close()
+        logger.info(f'{statement_file.name}: REPLACED')
+    finally:
+        connection_manager.close()
+    update_snapshot(connection_manager.database)
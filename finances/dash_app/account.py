@@ -1,79 +1,259 @@
+import logging
+import threading
 import numpy as np
+import pandas as pd
 from pandas.tseries.offsets import MonthBegin, MonthEnd
-from typing import Union
+from typing import List, Union
 from pathlib import Path
-import cufflinks as cf
-from ..database.database import load_all_transactions
-from ..utils.tools import replace_none
-from ..dash_app.layout import generate_layout, get_trace
+from ..database.connection import connect, read_transaction
+from ..database.database import get_data_version, get_last_transaction_id, get_statement_ids, load_new_transactions
+from ..database.snapshot import load_transactions
+from ..dash_app.cube import AggregateCube, get_cube_file, read_cube, write_cube
+from ..dash_app.layout import get_trace, get_line_figure, get_bar_figure
+from ..dash_app.figure_cache import FigureCache
 
-cf.go_offline()
+logger = logging.getLogger('finances.dash_app')
 
 
-class Account:
+class AccountState:
     """
-    Class used to generate stats and figures of a given account from the database that are used in the dash_app
+    Transactions of an account aggregated at a given data version of the database, with the prefix sums of the amounts
+    by month from which the stats of any range of months are computed by subtraction.
+    A state is never modified once created: the account publishes a new one when new transactions are saved, so the
+    threads serving the dash_app read a consistent state from a single reference while it is refreshed.
     """
 
-    def __init__(self, database: Union[Path, str], account_name: str):
-        self.database = database
-        self.account_name = account_name
-        self._process_data()
+    def __init__(self, cube: AggregateCube, data_version: str, last_transaction_id: int, statement_ids: set,
+                 currency: str, last_transaction_date: pd.Timestamp, figure_cache: FigureCache):
+        self.cube = cube
+        self.data_version = data_version
+        self.last_transaction_id = last_transaction_id
+        self.statement_ids = statement_ids
+        self.currency = currency
+        self.last_transaction_date = last_transaction_date
+        self.figure_cache = figure_cache
+        self.months = cube.months
+        self.first_month = None if cube.first_month is None else int(cube.first_month)
+        self.categories = {category for category in cube.categories if category is not None}
+        self.cumulative_amounts, self.cumulative_counts = cube.cumulative_amounts()
+        self.cumulative_totals = self.cumulative_amounts.sum(axis=1)
+        self.cumulative_total_counts = self.cumulative_counts.sum(axis=1)
+        self.balance = self.cumulative_totals[-1]
 
-    def _process_data(self):
+    def get_month_range(self, month_range: List[int] = None):
+        """
+        Get the positions of a range of months selected in the dash_app
+        :param month_range: positions of the first and last months in self.months, None for all the months
+        :return: positions of the first month and after the last month
+        """
+        last = len(self.months) - 1
+        if not month_range:
+            return 0, last + 1
+        start = min(max(int(month_range[0]), 0), last)
+        end = min(max(int(month_range[1]), start), last) + 1
+        return start, end
+
+    def get_summary(self, start: int = 0, end: int = None):
+        """
+        Compute the stats of a range of months in O(1) from the prefix sums
+        :param start: position of the first month
+        :param end: position after the last month, None for the last month
+        :return: dictionary of the stats
+        """
+        totals = self.cumulative_totals
+        end = len(self.months) if end is None else end
+        last = end - 1
+        previous = max(last - 1, 0)
+        # The monthly average excludes the last month, which may not be over
+        month_count = last - start
+        avg_monthly_pnl = (totals[last] - totals[start]) / month_count if month_count else totals[end] - totals[last]
+        return dict(
+            balance=totals[end],
+            range_begin=self.months[start] + MonthBegin(-1),
+            range_end=self.months[last],
+            range_pnl=totals[end] - totals[start],
+            actual_month_begin=self.months[last] + MonthBegin(-1),
+            actual_month_pnl=totals[end] - totals[last],
+            previous_month_end=self.months[last] + MonthEnd(-1),
+            previous_month_pnl=totals[last] - totals[previous],
+            avg_monthly_pnl=avg_monthly_pnl,
+        )
+
+    def get_total_figure(self, start: int = 0, end: int = None):
         """
-        Load transactions of the account from the database and compute stats and figures
+        Get the total balance figure of a range of months: the balance is read from the prefix sums
+        :param start: position of the first month
+        :param end: position after the last month, None for the last month
+        :return: total balance figure
         """
-        transaction_df = load_all_transactions(self.database, self.account_name)
-        transaction_df['month_end'] = transaction_df['date'] + MonthEnd(1)
-        transaction_df['sub_category'] = transaction_df['sub_category'].apply(replace_none)
-        self.total_df = transaction_df.groupby('month_end').agg({'amount': np.sum}).sort_index()
-        self.transaction_df = transaction_df
-        self._summarize()
-        self._get_figures()
+        end = len(self.months) if end is None else end
+        return self.figure_cache.get(('total', start, end, self.data_version),
+                                     lambda: self._create_total_figure(start, end))
 
-    def _summarize(self):
+    def _create_total_figure(self, start: int, end: int):
         """
-        Compute stats from the transactions
+        Compute the total balance figure of a range of months
+        :param start: position of the first month
+        :param end: position after the last month
+        :return: total balance figure
         """
-        self.currency = self.transaction_df.iloc[0]['currency']
-        self.categories = set(self.transaction_df['category'])
-        self.last_transaction_date = self.transaction_df['date'].max()
-        self.balance = self.transaction_df['amount'].sum()
-        self.actual_month_end = self.total_df.index[-1]
-        self.actual_month_begin = self.actual_month_end + MonthBegin(-1)
-        self.actual_month_pnl = self.total_df.loc[self.actual_month_end, 'amount']
-        self.previous_month_end = self.total_df.index[-2]
-        self.previous_month_pnl = self.total_df.loc[self.previous_month_end, 'amount']
-        self.avg_monthly_pnl = self.total_df[:-1]['amount'].sum() / len(self.total_df[:-1])
+        found = np.diff(self.cumulative_total_counts[start:end + 1]) > 0
+        return get_line_figure('Total Balance', self.months[start:end][found].strftime('%Y-%m-%d'),
+                               self.cumulative_totals[start + 1:end + 1][found])
 
-    def _get_figures(self):
+    def get_category_figure_bar(self, start: int = 0, end: int = None):
         """
-        Compute total balance and category figures
+        Get the category figure of a range of months from the figure cache
+        :param start: position of the first month
+        :param end: position after the last month, None for the last month
+        :return: category figure
         """
-        total_figure_cumsum = self.total_df.cumsum().iplot(asFigure=True)
-        total_figure_cumsum['layout'] = generate_layout(title='Total Balance')
-        self.total_figure_cumsum = total_figure_cumsum
-        category_figure_bar = (self.transaction_df
-                               .pivot_table(index='month_end', columns='category', values='amount', aggfunc=np.sum,
-                                            fill_value=0)
-                               .iplot(kind='bar', barmode='group', asFigure=True))
-        category_figure_bar['layout'] = generate_layout(title='All Transactions')
-        category_figure_bar.add_trace(get_trace(self.total_df))
-        self.category_figure_bar = category_figure_bar
+        end = len(self.months) if end is None else end
+        return self.figure_cache.get(('category', start, end, self.data_version),
+                                     lambda: self._create_category_figure_bar(start, end))
 
-    def get_sub_category_figure_bar(self, category: str):
+    def _create_category_figure_bar(self, start: int, end: int):
+        """
+        Compute the category figure of a range of months
+        :param start: position of the first month
+        :param end: position after the last month
+        :return: category figure
+        """
+        months, categories, amounts = self.cube.category_amounts(start, end)
+        months_with_total, totals = self.cube.month_totals(start, end)
+        category_figure_bar = get_bar_figure('All Transactions', months.strftime('%Y-%m-%d'), categories, amounts)
+        category_figure_bar['data'].append(get_trace(months_with_total.strftime('%Y-%m-%d'), totals))
+        return category_figure_bar
+
+    def get_sub_category_figure_bar(self, category: str, start: int = 0, end: int = None):
+        """
+        Get the sub_category figure corresponding to a given category from the figure cache
+        :param category: category
+        :param start: position of the first month
+        :param end: position after the last month, None for the last month
+        :return: sub_category figure
+        """
+        # The figures of all the months are cached under the same key whether end is given or not, e.g. when warmed
+        end = len(self.months) if end is None else end
+        return self.figure_cache.get(('sub_category', category, start, end, self.data_version),
+                                     lambda: self._create_sub_category_figure_bar(category, start, end))
+
+    def _create_sub_category_figure_bar(self, category: str, start: int, end: int):
         """
         Compute sub_category figure corresponding to a given category
         :param category: category
+        :param start: position of the first month
+        :param end: position after the last month
         :return: sub_category figure
         """
-        sub_category_df = self.transaction_df[self.transaction_df['category'] == category]
-        sub_category_figure_bar = (sub_category_df
-                                   .pivot_table(index='month_end', columns='sub_category', values='amount',
-                                                aggfunc=np.sum, fill_value=0)
-                                   .iplot(kind='bar', barmode='group', asFigure=True))
-        sub_category_total_df = sub_category_df.groupby('month_end').agg({'amount': np.sum})
-        sub_category_figure_bar['layout'] = generate_layout(title=category)
-        sub_category_figure_bar.add_trace(get_trace(sub_category_total_df))
+        months, sub_categories, amounts = self.cube.sub_category_amounts(category, start, end)
+        months = months.strftime('%Y-%m-%d')
+        sub_category_figure_bar = get_bar_figure(category, months, sub_categories, amounts)
+        sub_category_figure_bar['data'].append(get_trace(months, amounts.sum(axis=1)))
         return sub_category_figure_bar
+
+
+class Account:
+    """
+    Class used to generate stats and figures of a given account from the database that are used in the dash_app.
+    The current data of the account are in its state, replaced as a whole when new transactions are saved.
+    """
+
+    def __init__(self, database: Union[Path, str], account_name: str, figure_cache_size: int = 32):
+        self.database = database
+        self.account_name = account_name
+        self.figure_cache = FigureCache(figure_cache_size)
+        # Connection used to poll the changes of the database: PRAGMA data_version changes when another connection
+        # commits, so it is compared on the same connection
+        self._poll_connection = connect(database, read_only=True)
+        self._poll_version = self._get_poll_version()
+        self._refresh_lock = threading.Lock()
+        self.state = self._process_data()
+
+    def _get_poll_version(self):
+        """
+        :return: PRAGMA data_version of the poll connection
+        """
+        return self._poll_connection.execute('PRAGMA data_version').fetchone()[0]
+
+    def _process_data(self):
+        """
+        Load transactions of the account from the database and compute stats and figures.
+        The aggregate cube is read from the cube file of the account when it is up to date, otherwise it is computed
+        from the transactions and saved for the other processes of the app.
+        :return: state of the account
+        """
+        cube_file = get_cube_file(self.database, self.account_name)
+        with read_transaction(self.database) as con:
+            db_cursor = con.cursor()
+            data_version = get_data_version(db_cursor)
+            last_transaction_id = get_last_transaction_id(db_cursor)
+            statement_ids = get_statement_ids(db_cursor)
+            saved_cube = read_cube(cube_file)
+            if saved_cube is not None and saved_cube[1]['data_version'] == data_version:
+                cube, metadata = saved_cube
+                currency = metadata['currency']
+                last_transaction_date = pd.Timestamp(metadata['last_transaction_date'])
+            else:
+                transaction_df = load_transactions(self.database, self.account_name)
+                cube = AggregateCube.from_transactions(transaction_df)
+                currency = transaction_df.iloc[0]['currency']
+                last_transaction_date = transaction_df['date'].max()
+                write_cube(cube_file, cube, dict(data_version=data_version, currency=currency,
+                                                 last_transaction_date=last_transaction_date.isoformat()))
+        return AccountState(cube, data_version, last_transaction_id, statement_ids, currency, last_transaction_date,
+                            self.figure_cache)
+
+    def refresh(self):
+        """
+        Update the stats and figures with the transactions saved since the last update. The new transactions are
+        added to a copy of the aggregate cube, when a statement has been replaced the data are processed again. The
+        new state is published with a single assignment.
+        :return: True if the data have changed
+        """
+        with self._refresh_lock:
+            poll_version = self._get_poll_version()
+            if poll_version == self._poll_version:
+                return False
+            self._poll_version = poll_version
+            state = self.state
+            with read_transaction(self.database) as con:
+                db_cursor = con.cursor()
+                data_version = get_data_version(db_cursor)
+                if data_version == state.data_version:
+                    return False
+                statement_ids = get_statement_ids(db_cursor)
+                replaced = not state.statement_ids <= statement_ids
+                if not replaced:
+                    last_transaction_id = get_last_transaction_id(db_cursor)
+                    transaction_df = load_new_transactions(self.database, state.last_transaction_id,
+                                                           self.account_name)
+            if replaced:
+                logger.info(f'Statements replaced: reloading the transactions of {self.account_name}')
+                self.state = self._process_data()
+            else:
+                logger.info(f'{len(transaction_df)} new transactions for {self.account_name}')
+                cube, last_transaction_date = state.cube, state.last_transaction_date
+                if not transaction_df.empty:
+                    cube = cube.copy()
+                    cube.append(transaction_df)
+                    last_transaction_date = max(last_transaction_date, transaction_df['date'].max())
+                self.state = AccountState(cube, data_version, last_transaction_id, statement_ids, state.currency,
+                                          last_transaction_date, self.figure_cache)
+            self.figure_cache.clear()
+            return True
+
+    def warm_figure_cache(self):
+        """
+        Compute the sub_category figures of all the categories in a background thread
+        :return: the thread
+        """
+        def warm():
+            state = self.state
+            for category in sorted(state.categories):
+                state.get_sub_category_figure_bar(category)
+            logger.info(f'Figure cache warmed: {self.figure_cache.stats()}')
+
+        thread = threading.Thread(target=warm, name='figure-cache-warmer', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,21 @@
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    figures: {
+        /**
+         * Fetch a figure serialized by the server. The browser keeps the figure and sends its ETag, so an unchanged
+         * figure costs a 304 response.
+         * The request is synchronous: the clientside callbacks cannot wait for a promise.
+         */
+        fetch_figure: function(url) {
+            if (!url) {
+                return {data: [], layout: {}};
+            }
+            var request = new XMLHttpRequest();
+            request.open('GET', url, false);
+            request.send(null);
+            if (request.status !== 200) {
+                return {data: [], layout: {}};
+            }
+            return JSON.parse(request.responseText);
+        }
+    }
+});
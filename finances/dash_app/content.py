@@ -2,7 +2,8 @@ import dash_core_components as dcc
 import dash_html_components as html
 import dash_table as dte
 from ..database.database import ATTRIBUTES
-from ..dash_app.account import Account
+from ..dash_app.account import AccountState
+from ..dash_app.table import PAGE_SIZE, COLUMN_TYPES
 
 
 def get_color_class_name(number):
@@ -17,10 +18,10 @@ def get_color_class_name(number):
         return 'red'
 
 
-def main_header(account: Account):
+def main_header(state: AccountState):
     """
     Create the main dash_app header
-    :param account: Account Class
+    :param state: AccountState Class
     :return: header content
     """
     return html.Div(
@@ -28,7 +29,7 @@ def main_header(account: Account):
             html.Div(
                 children=[
                     html.Span(
-                        children=f'Last transaction date: {account.last_transaction_date:%d %b %Y}',
+                        children=f'Last transaction date: {state.last_transaction_date:%d %b %Y}',
                         className='header'
                     ),
                 ],
@@ -63,12 +64,53 @@ def main_header(account: Account):
     )
 
 
-def tab_balance(account: Account):
+def get_month_marks(state: AccountState):
+    """
+    Find the marks of the month range slider: the years at their first month
+    :param state: AccountState Class
+    :return: marks by month position
+    """
+    return {i: f'{month:%Y}' for i, month in enumerate(state.months) if month.month == 1 or i == 0}
+
+
+def month_range_slider(state: AccountState):
+    """
+    Create the slider selecting the range of months shown in the tabs
+    :param state: AccountState Class
+    :return: month range slider
+    """
+    return html.Div(
+        children=[
+            # Month number of the first position of the slider, to keep the selected months when earlier months
+            # are added
+            dcc.Store(id='first_month', data=state.first_month),
+            dcc.RangeSlider(
+                id='month_range',
+                min=0,
+                max=len(state.months) - 1,
+                value=[0, len(state.months) - 1],
+                marks=get_month_marks(state),
+                allowCross=False
+            )
+        ],
+        style=dict(
+            marginTop=10,
+            marginBottom=30,
+            marginLeft='3%',
+            marginRight='3%'
+        )
+    )
+
+
+def tab_balance(state: AccountState, start: int, end: int):
     """
     Create the tab Blance of the dash_app
-    :param account: Account Class
+    :param state: AccountState Class
+    :param start: position of the first month of the range
+    :param end: position after the last month of the range
     :return: Balance Tab content
     """
+    summary = state.get_summary(start, end)
     return html.Div(
         children=[
             html.Ul(
@@ -77,28 +119,38 @@ def tab_balance(account: Account):
                         children=[
                             html.Span(children='Balance: '),
                             html.Span(
-                                children=f'{account.balance:,.2f}',
-                                className=get_color_class_name(account.balance)
+                                children=f'{summary["balance"]:,.2f}',
+                                className=get_color_class_name(summary['balance'])
+                            )
+                        ]),
+                    html.Li(
+                        children=[
+                            html.Span(
+                                children=f'From {summary["range_begin"]:%b %Y} to {summary["range_end"]:%b %Y}: '
+                            ),
+                            html.Span(
+                                children=f'{state.currency} {summary["range_pnl"]:,.2f}',
+                                className=get_color_class_name(summary['range_pnl'])
                             )
                         ]),
                     html.Li(
                         children=[
                             html.Span(
-                                children=f'Since {account.actual_month_begin:%d %b %Y}: '
+                                children=f'Since {summary["actual_month_begin"]:%d %b %Y}: '
                             ),
                             html.Span(
-                                children=f'{account.currency} {account.actual_month_pnl:,.2f}',
-                                className=get_color_class_name(account.actual_month_pnl)
+                                children=f'{state.currency} {summary["actual_month_pnl"]:,.2f}',
+                                className=get_color_class_name(summary['actual_month_pnl'])
                             )
                         ]),
                     html.Li(
                         children=[
                             html.Span(
-                                children=f'During {account.previous_month_end:%B %Y}: '
+                                children=f'During {summary["previous_month_end"]:%B %Y}: '
                             ),
                             html.Span(
-                                children=f'{account.currency} {account.previous_month_pnl:,.2f}',
-                                className=get_color_class_name(account.previous_month_pnl)
+                                children=f'{state.currency} {summary["previous_month_pnl"]:,.2f}',
+                                className=get_color_class_name(summary['previous_month_pnl'])
                             )
                         ]),
                     html.Li(
@@ -107,8 +159,8 @@ def tab_balance(account: Account):
                                 children=f'Monthly average: '
                             ),
                             html.Span(
-                                children=f'{account.currency} {account.avg_monthly_pnl:,.2f}',
-                                className=get_color_class_name(account.avg_monthly_pnl)
+                                children=f'{state.currency} {summary["avg_monthly_pnl"]:,.2f}',
+                                className=get_color_class_name(summary['avg_monthly_pnl'])
                             )
                         ])
                 ],
@@ -119,10 +171,9 @@ def tab_balance(account: Account):
             ),
             html.Div(
                 children=[
-                    dcc.Graph(
-                        id='total_figure_cumsum',
-                        figure=account.total_figure_cumsum
-                    ),
+                    # The figure is fetched from the figure route by the fetch_figure clientside callback
+                    dcc.Store(id='total_figure_url', data=f'/figures/total/{start}/{end}'),
+                    dcc.Graph(id='total_figure_cumsum'),
                 ],
                 style=dict(
                     marginTop=20
@@ -135,20 +186,20 @@ def tab_balance(account: Account):
     )
 
 
-def tab_category_breakdown(account: Account):
+def tab_category_breakdown(state: AccountState, start: int, end: int):
     """
     Create the tab Category breakdown of the dash_app
-    :param account: Account Class
+    :param state: AccountState Class
+    :param start: position of the first month of the range
+    :param end: position after the last month of the range
     :return: Category breakdown Tab content
     """
     return html.Div(
         children=[
             html.Div(
                 children=[
-                    dcc.Graph(
-                        id='bar',
-                        figure=account.category_figure_bar
-                    ),
+                    dcc.Store(id='category_figure_url', data=f'/figures/category/{start}/{end}'),
+                    dcc.Graph(id='bar'),
                 ],
                 className='twelve columns',
                 style=dict(marginTop=20)
@@ -158,10 +209,12 @@ def tab_category_breakdown(account: Account):
     )
 
 
-def tab_sub_category_breakdown(account: Account):
+def tab_sub_category_breakdown(state: AccountState, start: int, end: int):
     """
     Create the tab Sub-category breakdown of the dash_app
-    :param account: Account Class
+    :param state: AccountState Class
+    :param start: position of the first month of the range
+    :param end: position after the last month of the range
     :return: Sub-category breakdown Tab content
     """
     return html.Div(
@@ -173,7 +226,7 @@ def tab_sub_category_breakdown(account: Account):
                     ),
                     dcc.RadioItems(
                         id='category_radio_item',
-                        options=[dict(label=k, value=k) for k in account.categories],
+                        options=[dict(label=k, value=k) for k in state.categories],
                         style=dict(color='rgb(170, 170, 170)'),
                         value='Food & Drink'
                     )
@@ -197,10 +250,12 @@ def tab_sub_category_breakdown(account: Account):
     )
 
 
-def tab_transaction(account: Account):
+def tab_transaction(state: AccountState, start: int, end: int):
     """
     Create the tab Transaction of the dash_app
-    :param account: Account Class
+    :param state: AccountState Class
+    :param start: position of the first month of the range
+    :param end: position after the last month of the range
     :return: Transaction Tab content
     """
     return html.Div(
@@ -214,17 +269,22 @@ def tab_transaction(account: Account):
                             'color': 'rgb(170, 170, 170)',
                             'border': '0px'
                         },
-                        data=account.transaction_df.to_dict('records'),
+                        # The pages are sorted and filtered in SQL by the update_transaction_table callback
+                        data=[],
                         editable=False,
-                        filter_action='native',
-                        sort_action='native',
+                        filter_action='custom',
+                        filter_query='',
+                        sort_action='custom',
                         sort_mode='multi',
+                        sort_by=[],
                         selected_rows=[],
-                        virtualization=True,
-                        page_action='none',
+                        page_action='custom',
+                        page_current=0,
+                        page_size=PAGE_SIZE,
                         columns=[
                             {'name': value,
                              'id': key,
+                             'type': COLUMN_TYPES.get(key, 'text'),
                              'hideable': True} for key, value in ATTRIBUTES.items()
                         ],
                         fixed_rows={'headers': True, 'data': 0},
@@ -278,3 +338,13 @@ def tab_transaction(account: Account):
         ],
         className='row'
     )
+
+
+# Tabs of the dash_app: value -> (label, function creating the tab content). The content of the selected tab is
+# rendered on demand by the render_tab callback.
+TABS = {
+    'balance': ('Balance', tab_balance),
+    'category_breakdown': ('Category breakdown', tab_category_breakdown),
+    'sub_category_breakdown': ('Sub-category breakdown', tab_sub_category_breakdown),
+    'transaction': ('Transaction', tab_transaction),
+}
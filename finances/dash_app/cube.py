@@ -0,0 +1,237 @@
+import os
+import re
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Union
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pandas.tseries.offsets import MonthEnd
+
+logger = logging.getLogger('finances.dash_app')
+
+CUBE_METADATA_KEY = b'cube'
+
+
+def get_cube_file(database: Union[Path, str], account_name: str):
+    """
+    Path of the aggregate cube file of an account, saved next to the database
+    :param database: the database path
+    :param account_name: the account name
+    :return: cube file path
+    """
+    database = Path(database)
+    return database.with_name(f'{database.stem}.{re.sub(r"[^0-9A-Za-z]+", "_", account_name)}.cube.arrow')
+
+
+class AggregateCube:
+    """
+    Amounts and numbers of transactions by month, category and sub_category in dense arrays.
+    The months are a continuous range of month ends. The categories and sub_categories are kept in the order they were
+    met, None standing for the transactions without category or sub_category, and sorted when the cube is sliced.
+    Every aggregation of the cube costs O(months x categories x sub_categories) whatever the number of transactions.
+    """
+
+    def __init__(self):
+        self.first_month = None  # month number (year * 12 + month - 1) of the first month
+        self.categories = []
+        self.sub_categories = []
+        self.amounts = np.zeros((0, 0, 0))
+        self.counts = np.zeros((0, 0, 0), dtype=np.int64)
+
+    @classmethod
+    def from_transactions(cls, transaction_df: pd.DataFrame):
+        """
+        Build the cube of transactions
+        :param transaction_df: DataFrame of the transactions with the date, category, sub_category and amount columns
+        :return: the cube
+        """
+        cube = cls()
+        cube.append(transaction_df)
+        return cube
+
+    def copy(self):
+        """
+        :return: copy of the cube with its own labels and arrays, to which transactions are appended while the cube
+        is read by other threads
+        """
+        cube = AggregateCube()
+        cube.first_month = self.first_month
+        cube.categories, cube.sub_categories = list(self.categories), list(self.sub_categories)
+        cube.amounts, cube.counts = self.amounts.copy(), self.counts.copy()
+        return cube
+
+    @property
+    def months(self):
+        """
+        :return: month ends of the cube
+        """
+        if self.first_month is None:
+            return pd.DatetimeIndex([])
+        first_month = pd.Timestamp(year=self.first_month // 12, month=self.first_month % 12 + 1, day=1) + MonthEnd(0)
+        return pd.date_range(first_month, periods=self.amounts.shape[0], freq=MonthEnd())
+
+    def _get_positions(self, labels: list, values: pd.Series):
+        """
+        Find the positions of values on an axis of the cube, adding the new values to the axis
+        :param labels: labels of the axis, extended in place
+        :param values: values of the transactions
+        :return: positions of the values
+        """
+        codes, uniques = pd.factorize(values.astype(object))
+        positions = {label: i for i, label in enumerate(labels)}
+        for label in list(uniques) + ([None] if (codes < 0).any() else []):
+            if label not in positions:
+                positions[label] = len(labels)
+                labels.append(label)
+        # The code -1 of the missing values takes the last item: the position of None
+        lookup = [positions[label] for label in uniques] + [positions.get(None, -1)]
+        return np.array(lookup, dtype=np.int64)[codes]
+
+    def _resize(self, first_month: int, month_count: int):
+        """
+        Extend the cube to the months and to the labels of its axes
+        :param first_month: month number of the first month
+        :param month_count: number of months
+        """
+        shape = (month_count, len(self.categories), len(self.sub_categories))
+        if self.amounts.shape == shape:
+            return
+        start = 0 if self.first_month is None else self.first_month - first_month
+        amounts, counts = np.zeros(shape), np.zeros(shape, dtype=np.int64)
+        old_shape = self.amounts.shape
+        amounts[start:start + old_shape[0], :old_shape[1], :old_shape[2]] = self.amounts
+        counts[start:start + old_shape[0], :old_shape[1], :old_shape[2]] = self.counts
+        self.first_month, self.amounts, self.counts = first_month, amounts, counts
+
+    def append(self, transaction_df: pd.DataFrame):
+        """
+        Add transactions to the cube, in O(transactions + cube size)
+        :param transaction_df: DataFrame of the transactions with the date, category, sub_category and amount columns
+        """
+        if transaction_df.empty:
+            return
+        if not self.amounts.flags.writeable:
+            # Arrays memory mapped from a cube file: copied on the first write
+            self.amounts, self.counts = self.amounts.copy(), self.counts.copy()
+        dates = transaction_df['date']
+        month_numbers = (dates.dt.year * 12 + dates.dt.month - 1).values.astype(np.int64)
+        category_positions = self._get_positions(self.categories, transaction_df['category'])
+        sub_category_positions = self._get_positions(self.sub_categories, transaction_df['sub_category'])
+        first_month = month_numbers.min()
+        last_month = month_numbers.max()
+        if self.first_month is not None:
+            first_month = min(first_month, self.first_month)
+            last_month = max(last_month, self.first_month + self.amounts.shape[0] - 1)
+        self._resize(first_month, last_month - first_month + 1)
+        # Flat index of each transaction in the cube: the amounts are summed by cell with a single bincount
+        index = np.ravel_multi_index((month_numbers - first_month, category_positions, sub_category_positions),
+                                     self.amounts.shape)
+        self.amounts += np.bincount(index, weights=transaction_df['amount'].values,
+                                    minlength=self.amounts.size).reshape(self.amounts.shape)
+        self.counts += np.bincount(index, minlength=self.counts.size).reshape(self.counts.shape)
+
+    def cumulative_amounts(self):
+        """
+        Prefix sums over the months of the amounts and of the counts by category, starting with a row of zeros: the
+        sums by category from the month i to the month j included are cumulative[j + 1] - cumulative[i]
+        :return: cumulative amounts and cumulative counts, 2D arrays of (months + 1) x categories
+        """
+        amounts = np.zeros((self.amounts.shape[0] + 1, self.amounts.shape[1]))
+        counts = np.zeros(amounts.shape, dtype=np.int64)
+        np.cumsum(self.amounts.sum(axis=2), axis=0, out=amounts[1:])
+        np.cumsum(self.counts.sum(axis=2), axis=0, out=counts[1:])
+        return amounts, counts
+
+    def month_totals(self, start: int = 0, end: int = None):
+        """
+        :param start: position of the first month
+        :param end: position after the last month, None for the last month of the cube
+        :return: month ends of the months with transactions and their total amounts
+        """
+        amounts, counts = self.amounts[start:end].sum(axis=(1, 2)), self.counts[start:end].sum(axis=(1, 2))
+        found = counts > 0
+        return self.months[start:end][found], amounts[found]
+
+    def category_amounts(self, start: int = 0, end: int = None):
+        """
+        :param start: position of the first month
+        :param end: position after the last month, None for the last month of the cube
+        :return: month ends of the months with transactions, sorted categories and 2D array of the amounts by month
+        and category. The transactions without category are only counted in the totals.
+        """
+        amounts, counts = self.amounts[start:end].sum(axis=2), self.counts[start:end].sum(axis=2)
+        found = counts.sum(axis=1) > 0
+        positions = sorted((i for i, category in enumerate(self.categories)
+                            if category is not None and counts[:, i].any()), key=lambda i: self.categories[i])
+        return self.months[start:end][found], [self.categories[i] for i in positions], amounts[found][:, positions]
+
+    def sub_category_amounts(self, category: str, start: int = 0, end: int = None):
+        """
+        :param category: category
+        :param start: position of the first month
+        :param end: position after the last month, None for the last month of the cube
+        :return: month ends of the months with transactions in the category, sorted sub_categories (None as 'None')
+        and 2D array of the amounts by month and sub_category
+        """
+        if category not in self.categories:
+            return pd.DatetimeIndex([]), [], np.zeros((0, 0))
+        i = self.categories.index(category)
+        amounts, counts = self.amounts[start:end, i, :], self.counts[start:end, i, :]
+        found = counts.sum(axis=1) > 0
+        names = ['None' if sub_category is None else sub_category for sub_category in self.sub_categories]
+        positions = sorted((j for j in range(len(names)) if counts[:, j].any()), key=lambda j: names[j])
+        return self.months[start:end][found], [names[j] for j in positions], amounts[found][:, positions]
+
+
+def write_cube(cube_file: Path, cube: AggregateCube, metadata: dict):
+    """
+    Save a cube to an Arrow IPC file, which the processes of the app memory map instead of computing the cube again
+    :param cube_file: cube file path
+    :param cube: the cube
+    :param metadata: JSON serializable data saved with the cube, e.g. its data version
+    """
+    table = pa.Table.from_batches([pa.RecordBatch.from_arrays([pa.array(cube.amounts.ravel()),
+                                                              pa.array(cube.counts.ravel())], ['amounts', 'counts'])])
+    cube_metadata = dict(metadata, shape=cube.amounts.shape, first_month=cube.first_month,
+                         categories=cube.categories, sub_categories=cube.sub_categories)
+    table = table.replace_schema_metadata({CUBE_METADATA_KEY: json.dumps(cube_metadata, default=int).encode()})
+    # Written to a temporary file then renamed so that a process never maps a partial file
+    tmp_file = cube_file.with_name(f'{cube_file.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    with pa.OSFile(str(tmp_file), 'wb') as sink:
+        with pa.RecordBatchFileWriter(sink, table.schema) as writer:
+            writer.write_table(table)
+    try:
+        os.replace(str(tmp_file), str(cube_file))
+    except OSError:
+        # The file may be mapped by another process on Windows: it is replaced by the next computation
+        logger.warning(f'Aggregate cube file {cube_file} in use: not replaced')
+        tmp_file.unlink()
+
+
+def read_cube(cube_file: Path):
+    """
+    Memory map a cube file: the arrays of the cube are read only views of the file shared by the processes
+    :param cube_file: cube file path
+    :return: the cube and its metadata, None if the file does not exist or cannot be read
+    """
+    if not cube_file.exists():
+        return None
+    try:
+        source = pa.memory_map(str(cube_file))
+        reader = pa.ipc.open_file(source)
+        metadata = json.loads(reader.schema.metadata[CUBE_METADATA_KEY].decode())
+        batch = reader.get_batch(0)
+    except (pa.ArrowException, KeyError, ValueError):
+        logger.warning(f'Invalid aggregate cube file {cube_file}')
+        return None
+    cube = AggregateCube()
+    shape = tuple(metadata.pop('shape'))
+    cube.amounts = batch.column(0).to_numpy().reshape(shape)
+    cube.counts = batch.column(1).to_numpy().reshape(shape)
+    cube.first_month = metadata.pop('first_month')
+    cube.categories = metadata.pop('categories')
+    cube.sub_categories = metadata.pop('sub_categories')
+    return cube, metadata
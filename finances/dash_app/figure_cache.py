@@ -0,0 +1,62 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+logger = logging.getLogger('finances.dash_app')
+
+
+class FigureCache:
+    """
+    Least recently used cache of the figures of the dash_app, shared by the threads serving the callbacks
+    """
+
+    def __init__(self, max_size: int = 32):
+        self.max_size = max_size
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._figures)
+
+    def __contains__(self, key: Hashable):
+        return key in self._figures
+
+    def get(self, key: Hashable, create_figure: Callable):
+        """
+        Get a figure from the cache or create it on a miss. The least recently used figure is evicted when the cache
+        is full.
+        :param key: key of the figure
+        :param create_figure: function creating the figure
+        :return: figure
+        """
+        with self._lock:
+            figure = self._figures.get(key)
+            if figure is not None:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                return figure
+            self.misses += 1
+        # Created outside of the lock so that the other figures stay available meanwhile
+        figure = create_figure()
+        with self._lock:
+            self._figures[key] = figure
+            self._figures.move_to_end(key)
+            while len(self._figures) > self.max_size:
+                self._figures.popitem(last=False)
+        return figure
+
+    def clear(self):
+        """
+        Remove all the figures
+        """
+        with self._lock:
+            self._figures.clear()
+
+    def stats(self):
+        """
+        :return: usage of the cache
+        """
+        return f'{len(self._figures)}/{self.max_size} figures, {self.hits} hits / {self.misses} misses'
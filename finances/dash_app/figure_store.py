@@ -0,0 +1,139 @@
+import os
+import gzip
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Union
+from flask import Response, request
+from plotly.utils import PlotlyJSONEncoder
+
+logger = logging.getLogger('finances.dash_app')
+
+# Version of the figures: to be increased when the figures change for the same data, so that the saved figures of the
+# previous versions are not served anymore
+FIGURE_FORMAT = 1
+
+
+def get_figure_folder(database: Union[Path, str]):
+    """
+    Path of the folder of the serialized figures of a database, next to it
+    :param database: the database path
+    :return: figure folder path
+    """
+    database = Path(database)
+    return database.with_name(f'{database.stem}.figures')
+
+
+class FigureStore:
+    """
+    Figures serialized to gzipped JSON files keyed by the data version of the database. The files are kept across the
+    restarts of the app and shared by its processes, so a figure is encoded once per data version. The files of the
+    previous data versions are deleted and the oldest files are removed when there are more than max_files.
+    """
+
+    def __init__(self, database: Union[Path, str], max_files: int = 256):
+        self.folder = get_figure_folder(database)
+        self.max_files = max_files
+        self.folder.mkdir(exist_ok=True)
+
+    @staticmethod
+    def get_key(data_version: str):
+        """
+        :param data_version: data version of the database
+        :return: key of the figures of a data version, used in the file names and the ETags
+        """
+        return hashlib.sha1(f'{FIGURE_FORMAT}-{data_version}'.encode()).hexdigest()[:16]
+
+    @classmethod
+    def get_etag(cls, name: str, data_version: str):
+        """
+        :param name: name of the figure
+        :param data_version: data version of the database
+        :return: ETag of the figure, known without reading the figure
+        """
+        return f'{name}.{cls.get_key(data_version)}'
+
+    def get(self, name: str, data_version: str, create_figure: Callable):
+        """
+        Get a serialized figure, creating its file when it does not exist for the data version.
+        The content is returned rather than the file, which may be deleted by another process once read.
+        :param name: name of the figure
+        :param data_version: data version of the database
+        :param create_figure: function creating the figure
+        :return: gzipped JSON of the figure, its ETag and its modification time
+        """
+        key = self.get_key(data_version)
+        figure_file = self.folder / f'{name}.{key}.json.gz'
+        etag = self.get_etag(name, data_version)
+        try:
+            with figure_file.open('rb') as f:
+                return f.read(), etag, os.fstat(f.fileno()).st_mtime
+        except FileNotFoundError:
+            pass
+        content = gzip.compress(json.dumps(create_figure(), cls=PlotlyJSONEncoder).encode())
+        # Written to a temporary file then renamed so that a partial file is never served
+        tmp_file = figure_file.with_name(f'{figure_file.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        tmp_file.write_bytes(content)
+        last_modified = tmp_file.stat().st_mtime
+        os.replace(str(tmp_file), str(figure_file))
+        logger.debug(f'Figure saved: {figure_file.name}')
+        self._evict(key)
+        return content, etag, last_modified
+
+    def _evict(self, key: str):
+        """
+        Remove the files of the other data versions, then the oldest files until there are at most max_files
+        :param key: key of the current data version
+        """
+        files = []
+        for figure_file in self.folder.glob('*.json.gz'):
+            try:
+                if not figure_file.name.endswith(f'.{key}.json.gz'):
+                    figure_file.unlink()
+                    continue
+                files.append((figure_file.stat().st_mtime, figure_file))
+            except FileNotFoundError:
+                # Deleted by another thread or process
+                pass
+        for _, figure_file in sorted(files)[:max(len(files) - self.max_files, 0)]:
+            try:
+                figure_file.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def send_not_modified(etag: str):
+    """
+    Answer a conditional request of a figure before reading it
+    :param etag: ETag of the figure
+    :return: flask response 304 if the client has the current figure, None otherwise
+    """
+    if etag not in request.if_none_match:
+        return None
+    response = Response(status=304, headers={'Vary': 'Accept-Encoding'})
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+def send_figure(content: bytes, etag: str, last_modified: float):
+    """
+    Send a serialized figure with its ETag and Last-Modified date: the clients get a 304 while it does not change
+    :param content: gzipped JSON of the figure
+    :param etag: ETag of the figure, made of its name and the key of the data version
+    :param last_modified: modification time of the figure
+    :return: flask response
+    """
+    headers = {'Vary': 'Accept-Encoding'}
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        headers['Content-Encoding'] = 'gzip'
+    else:
+        content = gzip.decompress(content)
+    response = Response(content, mimetype='application/json', headers=headers)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # The clients keep the figure but check whether it has changed before using it
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
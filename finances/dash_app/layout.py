@@ -1,4 +1,5 @@
-import pandas as pd
+import numpy as np
+from typing import Sequence
 
 COLORS = dict(
     background='rgb(15, 15, 15)',
@@ -62,16 +63,17 @@ def generate_layout(title):
     )
 
 
-def get_trace(df: pd.DataFrame):
+def get_trace(x: Sequence, y: Sequence):
     """
-    Return the figure trace of the DataFrame's amount column
-    :param df: DataFrame containing the amount column
+    Return the figure trace of the total amounts
+    :param x: dates
+    :param y: total amounts
     :return: the figure trace
     """
     return dict(
         type='scatter',
-        x=list(df.index),
-        y=df['amount'],
+        x=list(x),
+        y=list(y),
         mode='lines+markers',
         marker=dict(
             size=3,
@@ -83,3 +85,30 @@ def get_trace(df: pd.DataFrame):
         ),
         name='Total'
     )
+
+
+def get_line_figure(title: str, x: Sequence, y: np.ndarray, name: str = 'amount'):
+    """
+    Generate a line figure
+    :param title: title of the figure
+    :param x: dates
+    :param y: values
+    :param name: name of the trace
+    :return: the figure
+    """
+    data = [dict(type='scatter', x=list(x), y=y.tolist(), mode='lines', name=name, line=dict(width=1.3))]
+    return dict(data=data, layout=generate_layout(title=title))
+
+
+def get_bar_figure(title: str, x: Sequence, names: Sequence[str], values: np.ndarray):
+    """
+    Generate a grouped bar figure with one trace per column of values
+    :param title: title of the figure
+    :param x: dates, one per row of values
+    :param names: names of the traces, one per column of values
+    :param values: 2D array of the values
+    :return: the figure
+    """
+    x = list(x)
+    data = [dict(type='bar', x=x, y=values[:, i].tolist(), name=name) for i, name in enumerate(names)]
+    return dict(data=data, layout=generate_layout(title=title))
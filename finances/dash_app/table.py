@@ -0,0 +1,81 @@
+import re
+import math
+import logging
+from pathlib import Path
+from typing import List, Union
+from ..database.query import TABLE_COLUMNS, page_transactions
+
+logger = logging.getLogger('finances.dash_app')
+
+PAGE_SIZE = 50
+
+# Types of the columns of the transaction table used by the filters
+COLUMN_TYPES = {'date': 'datetime', 'amount': 'numeric'}
+
+# Part of a filter query of the DataTable: {column} operator value
+FILTER_PART = re.compile(r'^\s*\{(?P<column>[^}]+)\}\s+(?P<operator>\S+)\s+(?P<value>.*?)\s*$')
+
+# Operators of the DataTable filters and the corresponding operators of page_transactions
+FILTER_OPERATORS = {'eq': '=', '=': '=', 'ne': '!=', '!=': '!=', 'lt': '<', '<': '<', 'le': '<=', '<=': '<=',
+                    'gt': '>', '>': '>', 'ge': '>=', '>=': '>=', 'contains': 'contains',
+                    'datestartswith': 'datestartswith'}
+
+
+def parse_filter_value(value: str, numeric: bool = False):
+    """
+    Parse the value of a filter: the quotes are removed and the numbers are only converted for the numeric
+    comparisons, so that e.g. the dates and details are matched on their text
+    :param value: value of the filter query
+    :param numeric: True if the value is compared to a numeric column
+    :return: parsed value
+    """
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in ('"', "'", '`'):
+        value = value[1:-1].replace('\\' + value[0], value[0])
+    if numeric:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    return value
+
+
+def parse_filter_query(filter_query: str):
+    """
+    Parse the filter query of the DataTable, e.g. {amount} > 10 && {entity} contains "Tesco"
+    The parts that are not supported are ignored.
+    :param filter_query: filter query of the DataTable
+    :return: filters (column, operator, value)
+    """
+    filters = []
+    for filter_part in (filter_query or '').split(' && '):
+        if not filter_part.strip():
+            continue
+        match = FILTER_PART.match(filter_part)
+        if (match is None or match.group('column') not in TABLE_COLUMNS
+                or match.group('operator') not in FILTER_OPERATORS):
+            logger.debug(f'Unsupported filter: {filter_part}')
+            continue
+        column, operator = match.group('column'), FILTER_OPERATORS[match.group('operator')]
+        numeric = COLUMN_TYPES.get(column) == 'numeric' and operator not in ('contains', 'datestartswith')
+        filters.append((column, operator, parse_filter_value(match.group('value'), numeric)))
+    return filters
+
+
+def get_transaction_page(database: Union[Path, str], account_name: str, page_current: int, page_size: int,
+                         sort_by: List[dict] = None, filter_query: str = None, data_version: str = None):
+    """
+    Get the page of the DataTable of the transactions
+    :param database: the database path
+    :param account_name: the account name
+    :param page_current: page number starting from 0
+    :param page_size: number of transactions by page
+    :param sort_by: sort_by property of the DataTable
+    :param filter_query: filter_query property of the DataTable
+    :param data_version: data version of the database, with which the page counts and positions are cached
+    :return: transactions of the page and number of pages
+    """
+    sort_by = [(column['column_id'], column['direction'] == 'asc') for column in sort_by or []
+               if column['column_id'] in TABLE_COLUMNS]
+    rows, transaction_count = page_transactions(database, page_current or 0, page_size, sort_by,
+                                                parse_filter_query(filter_query), account_name, data_version)
+    return rows, max(math.ceil(transaction_count / page_size), 1)
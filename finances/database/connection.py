@@ -0,0 +1,136 @@
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Union
+
+logger = logging.getLogger('finances.database')
+
+# Pragmas of every connection. In WAL mode the readers read the last committed state without waiting for a running
+# ingest, and synchronous NORMAL only syncs the WAL at checkpoints.
+PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,  # in KiB
+    'mmap_size': 256 * 2 ** 20,
+    'busy_timeout': 5000,  # in ms, only waited by writers and checkpoints
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+}
+
+# Connection managers of the current process, by database path and mode
+_connection_managers = {}
+_connection_managers_lock = threading.Lock()
+
+
+def connect(database: Union[Path, str], read_only: bool = False):
+    """
+    Open a connection to the database in WAL mode with the tuned pragmas
+    :param database: the database path
+    :param read_only: if True, the connection cannot write and the database must exist
+    :return: database connection
+    """
+    database = Path(database)
+    if read_only:
+        con = sqlite3.connect(f'{database.resolve().as_uri()}?mode=ro', uri=True, check_same_thread=False)
+    else:
+        con = sqlite3.connect(database, check_same_thread=False)
+        # The journal mode is saved in the database file: the read only connections use it as well
+        journal_mode = con.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+        if journal_mode.lower() != 'wal':
+            logger.warning(f'WAL mode is not available for {database}: journal mode is {journal_mode}')
+    for pragma, value in PRAGMAS.items():
+        con.execute(f'PRAGMA {pragma}={value}')
+    return con
+
+
+class ConnectionManager:
+    """
+    Connections to a database reused by thread.
+    A sqlite connection must not be used by two threads at the same time, so each thread gets its own connection
+    which is kept open for the next calls of the thread.
+    """
+
+    def __init__(self, database: Union[Path, str], read_only: bool = False):
+        self.database = Path(database)
+        self.read_only = read_only
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self):
+        """
+        Connection of the current thread, opened on first use
+        :return: database connection
+        """
+        con = getattr(self._local, 'connection', None)
+        if con is None:
+            con = connect(self.database, self.read_only)
+            self._local.connection = con
+            with self._lock:
+                self._connections.append(con)
+        return con
+
+    def close(self):
+        """
+        Close the connection of the current thread
+        """
+        con = getattr(self._local, 'connection', None)
+        if con is not None:
+            self._local.connection = None
+            with self._lock:
+                self._connections.remove(con)
+            con.close()
+
+    def close_all(self):
+        """
+        Close the connections of all the threads
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for con in connections:
+            con.close()
+        self._local = threading.local()
+
+
+def get_connection_manager(database: Union[Path, str], read_only: bool = False):
+    """
+    Retrieve the connection manager of a database, shared by the whole process
+    :param database: the database path
+    :param read_only: if True, the manager gives read only connections, used by the dash app
+    :return: connection manager
+    """
+    key = (Path(database).resolve(), read_only)
+    with _connection_managers_lock:
+        manager = _connection_managers.get(key)
+        if manager is None:
+            manager = ConnectionManager(database, read_only)
+            _connection_managers[key] = manager
+    return manager
+
+
+def get_connection(database: Union[Path, str], read_only: bool = False):
+    """
+    Get the connection of the current thread to a database
+    :param database: the database path
+    :param read_only: if True, the connection cannot write
+    :return: database connection
+    """
+    return get_connection_manager(database, read_only).connection
+
+
+@contextmanager
+def read_transaction(database: Union[Path, str]):
+    """
+    Read the database in a single transaction: the queries of the current thread within the block all see the same
+    committed state, even if an ingest commits meanwhile
+    :param database: the database path
+    :return: read only connection of the current thread
+    """
+    con = get_connection(database, read_only=True)
+    con.execute('BEGIN')
+    try:
+        yield con
+    finally:
+        con.commit()
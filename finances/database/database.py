@@ -1,7 +1,11 @@
 import sqlite3
+import numpy as np
 import pandas as pd
-from typing import Union
+from pandas.api.types import union_categoricals
+from typing import List, Union
 from pathlib import Path
+from ..database.migrations import migrate, get_schema_version
+from ..database.connection import get_connection
 
 ATTRIBUTES = {'date': 'Date',
               'account': 'Account',
@@ -14,66 +18,21 @@ ATTRIBUTES = {'date': 'Date',
               'currency': 'Currency',
               'amount': 'Amount'}
 
+# Columns of the transactions saved as ids of the dimension tables
+DIMENSION_COLUMNS = ('account', 'entity', 'type', 'category', 'sub_category', 'method')
+
+CHUNK_SIZE = 50000
+
+# Number of names bound to a single query, below the limit of 999 variables of the sqlite versions before 3.32
+NAME_BATCH_SIZE = 500
+
 
 def create_db(db_cursor: sqlite3.Cursor):
     """
     Creates the Database structure
     :param db_cursor: database cursor
     """
-    db_cursor.execute(
-        '''
-        CREATE TABLE Method(
-            method_id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL UNIQUE,
-            symbol TEXT NOT NULL UNIQUE
-        );
-
-        CREATE TABLE Entity(
-            entity_id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL UNIQUE
-        );
-
-        CREATE TABLE Type(
-            type_id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL UNIQUE
-        );
-
-        CREATE TABLE Category(
-            category_id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL UNIQUE
-        );
-
-        CREATE TABLE Sub_category(
-            sub_category_id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL UNIQUE
-        );
-        
-        CREATE TABLE Account(
-            account_id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL UNIQUE
-        );
-
-        CREATE TABLE Statement (
-            transaction_id INTEGER PRIMARY KEY,
-            date TEXT NOT NULL,
-            account_id INTEGER NOT NULL,
-            detail TEXT NOT NULL,
-            entity_id INTEGER,
-            amount REAL NOT NULL,
-            currency CHAR(3) NOT NULL,
-            method_id INTEGER,
-            type_id INTEGER,
-            category_id INTEGER,
-            sub_category_id INTEGER,
-            FOREIGN KEY (entity_id) REFERENCES Entity (entity_id),
-            FOREIGN KEY (method_id) REFERENCES Method (method_id),
-            FOREIGN KEY (type_id) REFERENCES Type (type_id),
-            FOREIGN KEY (category_id) REFERENCES Category (category_id),
-            FOREIGN KEY (sub_category_id) REFERENCES Sub_Category (sub_category_id),
-            FOREIGN KEY (account_id) REFERENCES Account (account_id)
-        );
-        '''
-    )
+    migrate(db_cursor)
 
 
 def get_attr_id(db_cursor: sqlite3.Cursor, attribute: str, value: str, symbol: str = None):
@@ -125,8 +84,170 @@ def save_transaction_to_db(db_cursor: sqlite3.Cursor, transaction):
         ''',
         (transaction.date, transaction.entity, entity_id,
          transaction.amount, method_id, type_id, category_id,
-         sub_category_id, transaction.currency, account_id)
+         sub_category_id, transaction.ccy, account_id)
+    )
+
+
+class DimensionCache:
+    """
+    In-memory name to id maps of the dimension tables, loaded once and completed when new values are saved
+    """
+
+    DIMENSIONS = ('entity', 'method', 'type', 'category', 'sub_category', 'account')
+
+    def __init__(self, db_cursor: sqlite3.Cursor):
+        self.ids = {attribute: self._load(db_cursor, attribute) for attribute in self.DIMENSIONS}
+
+    @staticmethod
+    def _load(db_cursor: sqlite3.Cursor, attribute: str):
+        db_cursor.execute('SELECT name, ' + attribute + '_id FROM ' + attribute.title())
+        return dict(db_cursor.fetchall())
+
+    def get_ids(self, db_cursor: sqlite3.Cursor, attribute: str, values: List[str], symbols: List[str] = None):
+        """
+        Retrieve the ids of the given attribute values, inserting the missing values in one batch
+        :param db_cursor: database cursor
+        :param attribute: the attribute name
+        :param values: the attribute values
+        :param symbols: the transaction symbols of the values (method only)
+        :return: ids
+        """
+        ids = self.ids[attribute]
+        if symbols is None:
+            symbols = [None] * len(values)
+        missing = {}
+        for value, symbol in zip(values, symbols):
+            if not pd.isnull(value) and value not in ids and value not in missing:
+                missing[value] = symbol
+        if missing:
+            if attribute == 'method':
+                db_cursor.executemany('INSERT INTO ' + attribute.title() + ' (name, symbol) ' +
+                                      'VALUES (?, ?)', list(missing.items()))
+            else:
+                db_cursor.executemany('INSERT INTO ' + attribute.title() + ' (name) ' +
+                                      'VALUES (?)', [(value,) for value in missing])
+            # Only the inserted names are read back, whatever the size of the table
+            names = list(missing)
+            for i in range(0, len(names), NAME_BATCH_SIZE):
+                batch = names[i:i + NAME_BATCH_SIZE]
+                db_cursor.execute('SELECT name, ' + attribute + '_id FROM ' + attribute.title() +
+                                  ' WHERE name IN (' + ', '.join('?' * len(batch)) + ')', batch)
+                ids.update(db_cursor.fetchall())
+        return [None if pd.isnull(value) else ids[value] for value in values]
+
+
+def save_transactions_to_db(db_cursor: sqlite3.Cursor, transactions: list, dimension_cache: DimensionCache = None,
+                            statement_id: int = None):
+    """
+    Save transactions to the database with a single insert of all the rows
+    :param db_cursor: database cursor
+    :param transactions: transactions
+    :param dimension_cache: name to id maps of the dimension tables
+    :param statement_id: ledger id of the statement of the transactions
+    """
+    if dimension_cache is None:
+        dimension_cache = DimensionCache(db_cursor)
+    entity_ids = dimension_cache.get_ids(db_cursor, 'entity', [t.entity_name for t in transactions])
+    method_ids = dimension_cache.get_ids(db_cursor, 'method', [t.method for t in transactions],
+                                         [t.method_symbol for t in transactions])
+    type_ids = dimension_cache.get_ids(db_cursor, 'type', [t.type for t in transactions])
+    category_ids = dimension_cache.get_ids(db_cursor, 'category', [t.category for t in transactions])
+    account_ids = dimension_cache.get_ids(db_cursor, 'account', [t.account for t in transactions])
+    sub_category_ids = dimension_cache.get_ids(db_cursor, 'sub_category', [t.sub_category for t in transactions])
+    db_cursor.executemany(
+        '''
+        INSERT INTO Statement
+        (date, detail, entity_id, amount, method_id, type_id,
+        category_id, sub_category_id, currency, account_id, statement_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''',
+        [(t.date, t.entity, entity_id, t.amount, method_id, type_id, category_id, sub_category_id, t.ccy, account_id,
+          statement_id)
+         for t, entity_id, method_id, type_id, category_id, sub_category_id, account_id
+         in zip(transactions, entity_ids, method_ids, type_ids, category_ids, sub_category_ids, account_ids)]
+    )
+
+
+def save_ledger_entry(db_cursor: sqlite3.Cursor, statement):
+    """
+    Record an ingested statement in the ledger
+    :param db_cursor: database cursor
+    :param statement: processed statement
+    :return: ledger id of the statement
+    """
+    dates = [t.date for t in statement.transaction_collection]
+    db_cursor.execute(
+        '''
+        INSERT INTO Ledger
+        (file_name, file_hash, period, start_date, end_date, start_balance, end_balance, transaction_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''',
+        (statement.statement_file.name, statement.file_hash, statement.period, min(dates, default=None),
+         max(dates, default=None), statement.start_balance, statement.end_balance, len(dates))
     )
+    return db_cursor.lastrowid
+
+
+def get_ledger_entry(db_cursor: sqlite3.Cursor, period: str):
+    """
+    Get the ledger entry of the statement of a period
+    :param db_cursor: database cursor
+    :param period: statement period (yyyy-mm)
+    :return: statement id, file hash, start balance and end balance or None if the period is not in the ledger
+    """
+    db_cursor.execute('SELECT statement_id, file_hash, start_balance, end_balance FROM Ledger WHERE period = ?',
+                      (period,))
+    return db_cursor.fetchone()
+
+
+def get_ledger_hashes(db_cursor: sqlite3.Cursor):
+    """
+    Get the file hashes of the ingested statements
+    :param db_cursor: database cursor
+    :return: dictionary of the file hash to the statement period
+    """
+    db_cursor.execute('SELECT file_hash, period FROM Ledger')
+    return dict(db_cursor.fetchall())
+
+
+def get_previous_end_balance(db_cursor: sqlite3.Cursor, period: str):
+    """
+    Get the balance before a statement period.
+    It is the end balance of the previous statement in the ledger. Without previous statement in the ledger, it is
+    the sum of the transactions saved before the ledger, for the databases filled before it.
+    :param db_cursor: database cursor
+    :param period: statement period (yyyy-mm)
+    :return: balance or None if there is no previous statement, e.g. when an older statement is filled in
+    """
+    db_cursor.execute('SELECT end_balance FROM Ledger WHERE period < ? ORDER BY period DESC LIMIT 1', (period,))
+    res = db_cursor.fetchone()
+    if res is not None:
+        return res[0]
+    db_cursor.execute('SELECT SUM(amount) FROM Statement WHERE statement_id IS NULL')
+    balance = db_cursor.fetchone()[0]
+    return None if balance is None else round(balance, 2)
+
+
+def get_next_start_balance(db_cursor: sqlite3.Cursor, period: str):
+    """
+    Get the start balance of the statement following a period in the ledger
+    :param db_cursor: database cursor
+    :param period: statement period (yyyy-mm)
+    :return: balance or None if there is no following statement
+    """
+    db_cursor.execute('SELECT start_balance FROM Ledger WHERE period > ? ORDER BY period LIMIT 1', (period,))
+    res = db_cursor.fetchone()
+    return None if res is None else res[0]
+
+
+def delete_statement(db_cursor: sqlite3.Cursor, statement_id: int):
+    """
+    Delete the transactions and the ledger entry of a statement
+    :param db_cursor: database cursor
+    :param statement_id: ledger id of the statement
+    """
+    db_cursor.execute('DELETE FROM Statement WHERE statement_id = ?', (statement_id,))
+    db_cursor.execute('DELETE FROM Ledger WHERE statement_id = ?', (statement_id,))
 
 
 def get_balance(db_cursor: sqlite3.Cursor):
@@ -149,43 +270,192 @@ def get_db_last_date(db_cursor: sqlite3.Cursor):
     return db_cursor.fetchone()[0]
 
 
-def load_all_transactions(database: Union[Path, str], account_name: str = None):
+def get_data_version(db_cursor: sqlite3.Cursor):
+    """
+    Get the version of the saved transactions. It changes whenever a statement is saved or replaced.
+    :param db_cursor: database cursor
+    :return: data version
+    """
+    db_cursor.execute('SELECT COUNT(*), MAX(transaction_id) FROM Statement')
+    transaction_count, last_transaction_id = db_cursor.fetchone()
+    ledger_sequence = None
+    if get_schema_version(db_cursor) >= 4:
+        db_cursor.execute('''SELECT seq FROM sqlite_sequence WHERE name = 'Ledger' ''')
+        res = db_cursor.fetchone()
+        ledger_sequence = None if res is None else res[0]
+    return f'{ledger_sequence}-{transaction_count}-{last_transaction_id}'
+
+
+def get_last_transaction_id(db_cursor: sqlite3.Cursor):
+    """
+    Get the id of the last saved transaction. The transactions of a new statement get greater ids.
+    :param db_cursor: database cursor
+    :return: last transaction id, 0 if there are no transactions
+    """
+    db_cursor.execute('SELECT IFNULL(MAX(transaction_id), 0) FROM Statement')
+    return db_cursor.fetchone()[0]
+
+
+def get_statement_ids(db_cursor: sqlite3.Cursor):
+    """
+    Get the ids of the statements in the ledger. A statement which is replaced or deleted loses its id.
+    :param db_cursor: database cursor
+    :return: set of statement ids
+    """
+    if get_schema_version(db_cursor) < 4:
+        return set()
+    db_cursor.execute('SELECT statement_id FROM Ledger')
+    return {row[0] for row in db_cursor.fetchall()}
+
+
+def get_unledgered_last_date(db_cursor: sqlite3.Cursor):
+    """
+    Get the last date of the transactions saved before the ledger
+    :param db_cursor: database cursor
+    :return: last transaction date or None
+    """
+    db_cursor.execute('SELECT MAX(date) FROM Statement WHERE statement_id IS NULL')
+    return db_cursor.fetchone()[0]
+
+
+def load_entity_memo(db_cursor: sqlite3.Cursor, mapping_hash: str):
+    """
+    Load the entity mapping decisions saved for a version of the entity mapping file.
+    The decisions saved for the other versions are deleted.
+    :param db_cursor: database cursor
+    :param mapping_hash: hash of the entity mapping file
+    :return: dictionary of the lower case entity to the indices of its matching rows in the entity mapping file
+    """
+    db_cursor.execute('DELETE FROM Entity_memo WHERE mapping_hash != ?', (mapping_hash,))
+    db_cursor.execute('SELECT entity, mapping_rows FROM Entity_memo')
+    return {entity: tuple(int(index) for index in mapping_rows.split(',') if index)
+            for entity, mapping_rows in db_cursor.fetchall()}
+
+
+def save_entity_memo(db_cursor: sqlite3.Cursor, mapping_hash: str, entries: dict):
+    """
+    Save entity mapping decisions
+    :param db_cursor: database cursor
+    :param mapping_hash: hash of the entity mapping file
+    :param entries: dictionary of the lower case entity to the indices of its matching rows in the entity mapping file
+    """
+    db_cursor.executemany(
+        '''
+        INSERT OR REPLACE INTO Entity_memo
+        (entity, mapping_hash, mapping_rows)
+        VALUES (?, ?, ?)
+        ''',
+        [(entity, mapping_hash, ','.join(str(index) for index in indices)) for entity, indices in entries.items()]
+    )
+
+
+def get_dimension_codes(db_cursor: sqlite3.Cursor, attribute: str):
+    """
+    Load a dimension table as the categories of a pandas categorical
+    :param db_cursor: database cursor
+    :param attribute: the attribute name
+    :return: sorted names and array of the category code of each id (-1 for unknown ids)
+    """
+    db_cursor.execute('SELECT ' + attribute + '_id, name FROM ' + attribute.title() + ' ORDER BY name')
+    res = db_cursor.fetchall()
+    ids = np.array([row[0] for row in res], dtype=np.int64)
+    codes = np.full(ids.max(initial=0) + 1, -1, dtype=np.int32)
+    codes[ids] = np.arange(len(res), dtype=np.int32)
+    return [row[1] for row in res], codes
+
+
+def _to_array(column: str, values: tuple):
+    """
+    Convert the values of a column read from the database to a compact array
+    :param column: the column name
+    :param values: values of a chunk of rows
+    :return: array
+    """
+    if column == 'detail':
+        return np.array(values, dtype=object)
+    if column == 'currency':
+        return pd.Categorical(values)
+    if column == 'amount':
+        return np.array(values, dtype=np.float64)
+    return np.array(values, dtype=np.int64)
+
+
+def load_all_transactions(database: Union[Path, str], account_name: str = None, chunk_size: int = CHUNK_SIZE):
     """
     Load all transactions from the databse for a given account name
     :param database: the database name
     :param account_name: the account name
+    :param chunk_size: number of rows read at once
     :return: Dataframe of all the transactions
     """
+    # Read only connection reused by the thread: it does not wait for a running ingest
+    db_cursor = get_connection(database, read_only=True).cursor()
     if account_name is None:
-        account_condition = ''
-    else:
-        account_condition = f'''WHERE A.name = '{account_name}' '''
-    con = sqlite3.connect(database)
-    con.execute('pragma foreign_keys=ON')
-    db_cursor = con.cursor()
-    db_cursor.execute(
-        f'''
-        SELECT S.date, A.name, E.name, T.name,
-               C.name, SC.name, S.detail, M.name, S.currency, S.amount 
+        return read_transactions(db_cursor, chunk_size=chunk_size)
+    return read_transactions(db_cursor, 'S.account_id = (SELECT account_id FROM Account WHERE name = ?)',
+                             (account_name,), chunk_size)
+
+
+def load_new_transactions(database: Union[Path, str], last_transaction_id: int, account_name: str = None,
+                          chunk_size: int = CHUNK_SIZE):
+    """
+    Load the transactions saved after a given transaction
+    :param database: the database path
+    :param last_transaction_id: id of the last transaction already loaded
+    :param account_name: the account name
+    :param chunk_size: number of rows read at once
+    :return: Dataframe of the new transactions
+    """
+    condition, params = 'S.transaction_id > ?', (last_transaction_id,)
+    if account_name is not None:
+        condition += ' AND S.account_id = (SELECT account_id FROM Account WHERE name = ?)'
+        params += (account_name,)
+    return read_transactions(get_connection(database, read_only=True).cursor(), condition, params, chunk_size)
+
+
+def read_transactions(db_cursor: sqlite3.Cursor, condition: str = None, params: tuple = (),
+                      chunk_size: int = CHUNK_SIZE):
+    """
+    Read the transactions matching a condition.
+    The rows are streamed by chunks of ids: the dimensions are returned as categoricals built from their ids, the
+    dates are converted by sqlite to timestamps and the amounts to float64.
+    :param db_cursor: database cursor
+    :param condition: SQL condition on the Statement table aliased S
+    :param params: parameters of the condition
+    :param chunk_size: number of rows read at once
+    :return: Dataframe of the transactions sorted by date
+    """
+    dimensions = {attribute: get_dimension_codes(db_cursor, attribute) for attribute in DIMENSION_COLUMNS}
+    query = '''
+        SELECT CAST(strftime('%s', S.date) AS INTEGER), S.account_id, IFNULL(S.entity_id, 0), S.type_id,
+               IFNULL(S.category_id, 0), IFNULL(S.sub_category_id, 0), S.detail, IFNULL(S.method_id, 0),
+               S.currency, S.amount
               FROM Statement S
-              OUTER LEFT JOIN Entity E
-                  on E.entity_id = S.entity_id
-              OUTER LEFT JOIN Method M
-                  on M.method_id = S.method_id
-              INNER JOIN Type T
-                  on T.type_id = S.type_id
-              OUTER LEFT JOIN Category C
-                  on C.category_id = S.category_id
-              OUTER LEFT JOIN Account A
-                  on A.account_id = S.account_id
-              OUTER LEFT JOIN Sub_category SC
-                  on SC.sub_category_id = S.sub_category_id
-              {account_condition}
-              ;
-        ''')
-    res = db_cursor.fetchall()
-    con.close()
-    df = pd.DataFrame(res, columns=ATTRIBUTES.keys())
-    df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
-    df['amount'] = df['amount'].astype(float)
-    return df
+              WHERE S.type_id IS NOT NULL
+        '''
+    if condition:
+        query += f'AND {condition} '
+    db_cursor.execute(query + 'ORDER BY S.date, S.transaction_id', params)
+    chunks = {column: [] for column in ATTRIBUTES}
+    while True:
+        rows = db_cursor.fetchmany(chunk_size)
+        if rows:
+            for column, values in zip(ATTRIBUTES, zip(*rows)):
+                chunks[column].append(_to_array(column, values))
+        elif not chunks['date']:
+            # No transactions: empty columns
+            for column in ATTRIBUTES:
+                chunks[column].append(_to_array(column, ()))
+        if len(rows) < chunk_size:
+            break
+    # The values of the DatetimeIndex: the DataFrame would otherwise box every date to a Timestamp (pandas 0.24)
+    data = {'date': pd.to_datetime(np.concatenate(chunks['date']), unit='s').values}
+    for column in ATTRIBUTES:
+        if column in DIMENSION_COLUMNS:
+            categories, codes = dimensions[column]
+            data[column] = pd.Categorical.from_codes(codes[np.concatenate(chunks[column])], categories)
+        elif column == 'currency':
+            data[column] = union_categoricals(chunks[column])
+        elif column != 'date':
+            data[column] = np.concatenate(chunks[column])
+    return pd.DataFrame(data, columns=list(ATTRIBUTES))
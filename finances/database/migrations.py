@@ -0,0 +1,139 @@
+import sqlite3
+import logging
+
+logger = logging.getLogger('finances.database')
+
+# Schema migrations (version, description, sql script). The schema version of a database is saved in its
+# PRAGMA user_version. A new migration is added at the end of the list with the next version number.
+MIGRATIONS = [
+    (1, 'Create the tables',
+     '''
+     CREATE TABLE IF NOT EXISTS Method(
+         method_id INTEGER PRIMARY KEY,
+         name TEXT NOT NULL UNIQUE,
+         symbol TEXT NOT NULL UNIQUE
+     );
+
+     CREATE TABLE IF NOT EXISTS Entity(
+         entity_id INTEGER PRIMARY KEY,
+         name TEXT NOT NULL UNIQUE
+     );
+
+     CREATE TABLE IF NOT EXISTS Type(
+         type_id INTEGER PRIMARY KEY,
+         name TEXT NOT NULL UNIQUE
+     );
+
+     CREATE TABLE IF NOT EXISTS Category(
+         category_id INTEGER PRIMARY KEY,
+         name TEXT NOT NULL UNIQUE
+     );
+
+     CREATE TABLE IF NOT EXISTS Sub_category(
+         sub_category_id INTEGER PRIMARY KEY,
+         name TEXT NOT NULL UNIQUE
+     );
+
+     CREATE TABLE IF NOT EXISTS Account(
+         account_id INTEGER PRIMARY KEY,
+         name TEXT NOT NULL UNIQUE
+     );
+
+     CREATE TABLE IF NOT EXISTS Statement (
+         transaction_id INTEGER PRIMARY KEY,
+         date TEXT NOT NULL,
+         account_id INTEGER NOT NULL,
+         detail TEXT NOT NULL,
+         entity_id INTEGER,
+         amount REAL NOT NULL,
+         currency CHAR(3) NOT NULL,
+         method_id INTEGER,
+         type_id INTEGER,
+         category_id INTEGER,
+         sub_category_id INTEGER,
+         FOREIGN KEY (entity_id) REFERENCES Entity (entity_id),
+         FOREIGN KEY (method_id) REFERENCES Method (method_id),
+         FOREIGN KEY (type_id) REFERENCES Type (type_id),
+         FOREIGN KEY (category_id) REFERENCES Category (category_id),
+         FOREIGN KEY (sub_category_id) REFERENCES Sub_Category (sub_category_id),
+         FOREIGN KEY (account_id) REFERENCES Account (account_id)
+     );
+     '''),
+    (2, 'Create the entity mapping memo',
+     '''
+     CREATE TABLE IF NOT EXISTS Entity_memo(
+         entity TEXT PRIMARY KEY,
+         mapping_hash TEXT NOT NULL,
+         mapping_rows TEXT NOT NULL
+     );
+     '''),
+    (3, 'Index the transaction dates and foreign keys',
+     '''
+     CREATE INDEX IF NOT EXISTS Statement_date ON Statement (date, amount);
+     CREATE INDEX IF NOT EXISTS Statement_account_date ON Statement (account_id, date);
+     CREATE INDEX IF NOT EXISTS Statement_entity ON Statement (entity_id);
+     CREATE INDEX IF NOT EXISTS Statement_method ON Statement (method_id);
+     CREATE INDEX IF NOT EXISTS Statement_type ON Statement (type_id);
+     CREATE INDEX IF NOT EXISTS Statement_category ON Statement (category_id);
+     CREATE INDEX IF NOT EXISTS Statement_sub_category ON Statement (sub_category_id);
+     '''),
+    (4, 'Create the statement ledger',
+     '''
+     CREATE TABLE IF NOT EXISTS Ledger(
+         statement_id INTEGER PRIMARY KEY AUTOINCREMENT,
+         file_name TEXT NOT NULL,
+         file_hash TEXT NOT NULL UNIQUE,
+         period TEXT NOT NULL UNIQUE,
+         start_date TEXT,
+         end_date TEXT,
+         start_balance REAL NOT NULL,
+         end_balance REAL NOT NULL,
+         transaction_count INTEGER NOT NULL
+     );
+
+     ALTER TABLE Statement ADD COLUMN statement_id INTEGER REFERENCES Ledger (statement_id);
+     CREATE INDEX IF NOT EXISTS Statement_statement ON Statement (statement_id, date);
+     '''),
+    (5, 'Index the transactions by category and date for the aggregated queries',
+     '''
+     DROP INDEX IF EXISTS Statement_category;
+     CREATE INDEX IF NOT EXISTS Statement_category_date ON Statement (category_id, date, amount);
+     '''),
+    (6, 'Cover the account transaction counts and sums with the account index',
+     '''
+     DROP INDEX IF EXISTS Statement_account_date;
+     CREATE INDEX IF NOT EXISTS Statement_account_date ON Statement (account_id, date, type_id, amount);
+     '''),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(db_cursor: sqlite3.Cursor):
+    """
+    Get the schema version of the database
+    :param db_cursor: database cursor
+    :return: schema version
+    """
+    db_cursor.execute('PRAGMA user_version')
+    return db_cursor.fetchone()[0]
+
+
+def migrate(db_cursor: sqlite3.Cursor, target_version: int = SCHEMA_VERSION):
+    """
+    Upgrade the database in place by applying the pending migrations.
+    Each migration and its version number are committed in a single transaction.
+    :param db_cursor: database cursor
+    :param target_version: schema version to upgrade to
+    """
+    version = get_schema_version(db_cursor)
+    for migration_version, description, script in MIGRATIONS:
+        if migration_version <= version or migration_version > target_version:
+            continue
+        logger.info(f'Database migration {migration_version}: {description}')
+        try:
+            db_cursor.executescript(f'BEGIN;\n{script}\nPRAGMA user_version = {migration_version};\nCOMMIT;')
+        except sqlite3.Error:
+            db_cursor.connection.rollback()
+            logger.error(f'Database migration {migration_version} failed')
+            raise
@@ -0,0 +1,276 @@
+import threading
+import datetime as dt
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, List, Tuple, Union
+import pandas as pd
+from ..database.connection import get_connection
+from ..database.database import DIMENSION_COLUMNS, CHUNK_SIZE, read_transactions
+
+# SQL expressions of the periods the transactions can be grouped by. A month is identified by its last day.
+PERIODS = {
+    'day': 'S.date',
+    'month': "date(S.date, 'start of month', '+1 month', '-1 day')",
+    'year': "CAST(strftime('%Y', S.date) AS INTEGER)",
+}
+
+# SQL expressions of the columns of the transaction table and the dimension table they need
+TABLE_COLUMNS = {
+    'date': ('S.date', None),
+    'account': ('D_account.name', 'account'),
+    'entity': ('D_entity.name', 'entity'),
+    'type': ('D_type.name', 'type'),
+    'category': ('D_category.name', 'category'),
+    'sub_category': ("IFNULL(D_sub_category.name, 'None')", 'sub_category'),
+    'detail': ('S.detail', None),
+    'method': ('D_method.name', 'method'),
+    'currency': ('S.currency', None),
+    'amount': ('S.amount', None),
+}
+
+# SQL operators of the table filters
+OPERATORS = {'=': '=', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>=', 'contains': 'LIKE',
+             'datestartswith': 'LIKE'}
+
+Date = Union[str, dt.date]
+Names = Union[str, Iterable[str]]
+
+# Numbers of matching transactions and keys (date, transaction_id) of the last row of the pages of the transaction
+# table, by database, filters and data version: they stay valid until a statement is saved
+PAGE_CACHE_SIZE = 32
+_page_counts = OrderedDict()
+_page_keys = OrderedDict()
+_page_cache_lock = threading.Lock()
+
+
+def _get_cached(cache: OrderedDict, key: tuple, default=None):
+    """
+    :param cache: cache of the transaction table
+    :param key: key of the entry
+    :param default: entry added if the key is missing
+    :return: entry, made the most recently used
+    """
+    with _page_cache_lock:
+        if key not in cache:
+            if default is None:
+                return None
+            cache[key] = default
+        cache.move_to_end(key)
+        while len(cache) > PAGE_CACHE_SIZE:
+            cache.popitem(last=False)
+        return cache[key]
+
+
+def _join(attribute: str):
+    """
+    :param attribute: dimension name
+    :return: SQL join of the dimension table (aliased D_attribute) to the Statement table
+    """
+    return f'LEFT JOIN {attribute.title()} D_{attribute} ON D_{attribute}.{attribute}_id = S.{attribute}_id'
+
+
+def build_filters(start_date: Date = None, end_date: Date = None, account: Names = None, category: Names = None,
+                  sub_category: Names = None, entity: Names = None, transaction_type: Names = None):
+    """
+    Build the SQL condition on the Statement table (aliased S) selecting the transactions
+    :param start_date: first date included
+    :param end_date: last date included
+    :param account: account name or names
+    :param category: category name or names
+    :param sub_category: sub-category name or names
+    :param entity: entity name or names
+    :param transaction_type: type name or names (Expense, Income...)
+    :return: SQL condition and its parameters
+    """
+    conditions = ['S.type_id IS NOT NULL']
+    params = []
+    if start_date is not None:
+        conditions.append('S.date >= ?')
+        params.append(f'{pd.Timestamp(start_date):%Y-%m-%d}')
+    if end_date is not None:
+        conditions.append('S.date <= ?')
+        params.append(f'{pd.Timestamp(end_date):%Y-%m-%d}')
+    dimensions = {'account': account, 'category': category, 'sub_category': sub_category, 'entity': entity,
+                  'type': transaction_type}
+    for attribute, names in dimensions.items():
+        if names is None:
+            continue
+        names = [names] if isinstance(names, str) else list(names)
+        # The names are translated to ids once so that the indexes on the ids are used
+        if len(names) == 1:
+            conditions.append(f'S.{attribute}_id = (SELECT {attribute}_id FROM {attribute.title()} WHERE name = ?)')
+        else:
+            conditions.append(f'S.{attribute}_id IN (SELECT {attribute}_id FROM {attribute.title()} '
+                              f'WHERE name IN ({", ".join("?" * len(names))}))')
+        params.extend(names)
+    return ' AND '.join(conditions), tuple(params)
+
+
+def query_transactions(database: Union[Path, str], start_date: Date = None, end_date: Date = None,
+                       account: Names = None, category: Names = None, sub_category: Names = None,
+                       entity: Names = None, transaction_type: Names = None, chunk_size: int = CHUNK_SIZE):
+    """
+    Load the transactions matching the filters
+    :param database: the database path
+    :param start_date: first date included
+    :param end_date: last date included
+    :param account: account name or names
+    :param category: category name or names
+    :param sub_category: sub-category name or names
+    :param entity: entity name or names
+    :param transaction_type: type name or names
+    :param chunk_size: number of rows read at once
+    :return: DataFrame of the transactions sorted by date, in the format of load_all_transactions
+    """
+    condition, params = build_filters(start_date, end_date, account, category, sub_category, entity,
+                                      transaction_type)
+    return read_transactions(get_connection(database, read_only=True).cursor(), condition, params, chunk_size)
+
+
+def aggregate_transactions(database: Union[Path, str], group_by: Tuple[str, ...] = ('month',),
+                           start_date: Date = None, end_date: Date = None, account: Names = None,
+                           category: Names = None, sub_category: Names = None, entity: Names = None,
+                           transaction_type: Names = None):
+    """
+    Sum the amounts of the transactions matching the filters by group, in SQL
+    e.g. monthly spend per category for 2023:
+    aggregate_transactions(database, ('month', 'category'), '2023-01-01', '2023-12-31', transaction_type='Expense')
+    :param database: the database path
+    :param group_by: periods (day, month, year) and dimensions (account, entity, type, category, sub_category,
+    method) to group by
+    :param start_date: first date included
+    :param end_date: last date included
+    :param account: account name or names
+    :param category: category name or names
+    :param sub_category: sub-category name or names
+    :param entity: entity name or names
+    :param transaction_type: type name or names
+    :return: DataFrame of the group keys with the amount and the number of transactions of each group, sorted by
+    group keys. The days and months are timestamps (month end) and the missing dimensions are None.
+    """
+    select, joins, groups = [], [], []
+    for key in group_by:
+        if key in PERIODS:
+            select.append(f'{PERIODS[key]} AS {key}')
+            groups.append(key)
+        elif key in DIMENSION_COLUMNS:
+            joins.append(_join(key))
+            select.append(f'D_{key}.name AS {key}')
+            groups.append(f'S.{key}_id')
+        else:
+            raise ValueError(f'Unknown group: {key}')
+    condition, params = build_filters(start_date, end_date, account, category, sub_category, entity,
+                                      transaction_type)
+    query = f'''
+        SELECT {', '.join(select + ['SUM(S.amount)', 'COUNT(*)'])}
+              FROM Statement S
+              {' '.join(joins)}
+              WHERE {condition}
+        '''
+    if groups:
+        query += f'GROUP BY {", ".join(groups)} ORDER BY {", ".join(group_by)}'
+    db_cursor = get_connection(database, read_only=True).cursor()
+    db_cursor.execute(query, params)
+    df = pd.DataFrame(db_cursor.fetchall(), columns=list(group_by) + ['amount', 'count'])
+    df['amount'] = df['amount'].fillna(0).astype(float)
+    for key in group_by:
+        if key in ('day', 'month'):
+            df[key] = pd.to_datetime(df[key], format='%Y-%m-%d')
+    return df
+
+
+def page_transactions(database: Union[Path, str], page: int, page_size: int, sort_by: List[Tuple[str, bool]] = None,
+                      filters: List[Tuple[str, str, object]] = None, account: Names = None, data_version: str = None):
+    """
+    Get a page of the transaction table, sorted and filtered in SQL
+    :param database: the database path
+    :param page: page number starting from 0
+    :param page_size: number of transactions by page
+    :param sort_by: columns of the table to sort by, with True for the ascending order. The transactions are sorted by
+    date by default.
+    :param filters: conditions (column, operator, value) on the columns of the table. The operators are the keys of
+    OPERATORS.
+    :param account: account name or names
+    :param data_version: data version of the database (see get_data_version). When given, the number of matching
+    transactions is counted once and the pages sorted by date only start after the last row of a page already read
+    instead of skipping all the previous rows.
+    :return: transactions of the page as dictionaries of the table columns and number of matching transactions
+    """
+    condition, params = build_filters(account=account)
+    params = list(params)
+    dimensions = set()
+    for column, operator, value in filters or []:
+        expression, dimension = TABLE_COLUMNS[column]
+        dimensions.add(dimension)
+        if operator == 'contains':
+            condition += f" AND {expression} LIKE ? ESCAPE '\\'"
+            params.append(f'%{_escape_like(value)}%')
+        elif operator == 'datestartswith':
+            condition += f" AND {expression} LIKE ? ESCAPE '\\'"
+            params.append(f'{_escape_like(value)}%')
+        else:
+            condition += f' AND {expression} {OPERATORS[operator]} ?'
+            params.append(value)
+    filter_key = None if data_version is None else (str(Path(database).resolve()), condition, tuple(params),
+                                                    data_version)
+    db_cursor = get_connection(database, read_only=True).cursor()
+    transaction_count = None if filter_key is None else _get_cached(_page_counts, filter_key)
+    if transaction_count is None:
+        # Only the dimension tables used by the filters are joined to count the transactions
+        db_cursor.execute(f'''
+            SELECT COUNT(*)
+                  FROM Statement S
+                  {' '.join(_join(dimension) for dimension in DIMENSION_COLUMNS if dimension in dimensions)}
+                  WHERE {condition}
+            ''', params)
+        transaction_count = db_cursor.fetchone()[0]
+        if filter_key is not None:
+            _get_cached(_page_counts, filter_key, transaction_count)
+    sort_by = sort_by or [('date', True)]
+    ascending = sort_by[0][1]
+    order = [f'{TABLE_COLUMNS[column][0]} {"ASC" if column_ascending else "DESC"}'
+             for column, column_ascending in sort_by]
+    # The ties are broken in the direction of the first column so that a single index scan gives the order by date
+    order.append(f'S.transaction_id {"ASC" if ascending else "DESC"}')
+    dimensions.update(TABLE_COLUMNS[column][1] for column, _ in sort_by)
+    # Keyset paging: the pages sorted by date start after the last row of the closest previous page already read
+    page_keys = None
+    offset = page * page_size
+    if filter_key is not None and [column for column, _ in sort_by] == ['date']:
+        page_keys = _get_cached(_page_keys, (*filter_key, page_size, ascending), {})
+        with _page_cache_lock:
+            previous_page = max((i for i in page_keys if i < page), default=None)
+            previous_key = page_keys.get(previous_page)
+        if previous_key is not None:
+            date, transaction_id = previous_key
+            comparison = '>' if ascending else '<'
+            condition += f' AND S.date {comparison}= ? AND (S.date {comparison} ? OR S.transaction_id {comparison} ?)'
+            params.extend([date, date, transaction_id])
+            offset = (page - previous_page - 1) * page_size
+    # The page is selected on the transaction ids first so that the skipped rows are not joined to all the dimensions
+    db_cursor.execute(f'''
+        SELECT {', '.join(expression for expression, _ in TABLE_COLUMNS.values())}, S.transaction_id
+              FROM (SELECT S.transaction_id
+                          FROM Statement S
+                          {' '.join(_join(dimension) for dimension in DIMENSION_COLUMNS if dimension in dimensions)}
+                          WHERE {condition}
+                          ORDER BY {', '.join(order)}
+                          LIMIT ? OFFSET ?) P
+              JOIN Statement S ON S.transaction_id = P.transaction_id
+              {' '.join(_join(dimension) for dimension in DIMENSION_COLUMNS)}
+              ORDER BY {', '.join(order)}
+        ''', params + [page_size, offset])
+    result = db_cursor.fetchall()
+    if page_keys is not None and len(result) == page_size:
+        with _page_cache_lock:
+            page_keys[page] = (result[-1][0], result[-1][-1])
+    rows = [dict(zip(TABLE_COLUMNS, row)) for row in result]
+    return rows, transaction_count
+
+
+def _escape_like(value):
+    """
+    :param value: value searched with LIKE
+    :return: value with the LIKE wildcards escaped
+    """
+    return str(value).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
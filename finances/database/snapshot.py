@@ -0,0 +1,99 @@
+import os
+import logging
+from pathlib import Path
+from typing import Union
+import pyarrow as pa
+from ..database.connection import get_connection
+from ..database.database import load_all_transactions, get_data_version
+
+logger = logging.getLogger('finances.database')
+
+DATA_VERSION_KEY = b'data_version'
+
+
+def get_snapshot_file(database: Union[Path, str]):
+    """
+    Path of the transaction snapshot of a database, saved next to it
+    :param database: the database path
+    :return: snapshot file path
+    """
+    database = Path(database)
+    return database.with_name(f'{database.stem}.transactions.arrow')
+
+
+def get_snapshot_version(snapshot_file: Path):
+    """
+    Read the data version of a snapshot without reading its data
+    :param snapshot_file: snapshot file path
+    :return: data version or None if the snapshot does not exist or cannot be read
+    """
+    if not snapshot_file.exists():
+        return None
+    try:
+        with pa.memory_map(str(snapshot_file)) as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+    except pa.ArrowException:
+        logger.warning(f'Invalid transaction snapshot {snapshot_file}')
+        return None
+    version = metadata.get(DATA_VERSION_KEY)
+    return None if version is None else version.decode()
+
+
+def write_snapshot(database: Union[Path, str]):
+    """
+    Export the denormalized transactions of all the accounts to an Arrow IPC file keyed by the data version of the
+    database. The file is written only when the database has changed since the last export.
+    :param database: the database path
+    """
+    snapshot_file = get_snapshot_file(database)
+    con = get_connection(database, read_only=True)
+    data_version = get_data_version(con.cursor())
+    if get_snapshot_version(snapshot_file) == data_version:
+        return
+    transaction_df = load_all_transactions(database)
+    table = pa.Table.from_pandas(transaction_df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           DATA_VERSION_KEY: data_version.encode()})
+    # Written to a temporary file then renamed so that the app never reads a partial snapshot
+    tmp_file = snapshot_file.with_name(f'{snapshot_file.name}.{os.getpid()}.tmp')
+    try:
+        with pa.OSFile(str(tmp_file), 'wb') as sink:
+            with pa.RecordBatchFileWriter(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(str(tmp_file), str(snapshot_file))
+    finally:
+        if tmp_file.exists():
+            tmp_file.unlink()
+    logger.info(f'Transaction snapshot saved: {len(transaction_df)} transactions (data version {data_version})')
+
+
+def read_snapshot(database: Union[Path, str], account_name: str = None):
+    """
+    Load the transactions from the memory mapped snapshot if it is up to date with the database
+    :param database: the database path
+    :param account_name: the account name
+    :return: Dataframe of all the transactions or None if the snapshot is missing or outdated
+    """
+    snapshot_file = get_snapshot_file(database)
+    data_version = get_data_version(get_connection(database, read_only=True).cursor())
+    if get_snapshot_version(snapshot_file) != data_version:
+        return None
+    with pa.memory_map(str(snapshot_file)) as source:
+        transaction_df = pa.ipc.open_file(source).read_all().to_pandas()
+    if account_name is not None:
+        transaction_df = transaction_df[transaction_df['account'] == account_name].reset_index(drop=True)
+    return transaction_df
+
+
+def load_transactions(database: Union[Path, str], account_name: str = None):
+    """
+    Load the transactions of an account from the snapshot, or from the database when the snapshot is not up to date
+    :param database: the database path
+    :param account_name: the account name
+    :return: Dataframe of all the transactions
+    """
+    transaction_df = read_snapshot(database, account_name)
+    if transaction_df is None:
+        logger.info('Transaction snapshot missing or outdated: loading the transactions from the database')
+        transaction_df = load_all_transactions(database, account_name)
+    return transaction_df
@@ -0,0 +1,235 @@
+import os
+import hashlib
+import logging
+import struct
+import zlib
+from pathlib import Path, PurePath
+from typing import BinaryIO, List, Optional, Union
+from ..hsbc.preprocessing import String
+from ..hsbc.vars import COL, CHAR_HEIGHT, CHAR_WIDTH, TABLE_BBOX
+
+logger = logging.getLogger('finances.cache')
+
+CACHE_VERSION = 2
+CACHE_MAGIC = b'FPC2'
+CACHE_SUFFIX = '.pages'
+COL_NAMES = list(COL)
+
+# Binary layout of a cache entry (zlib compressed):
+# magic | for each page: string count | for each string: row, col, text length, utf-8 text | end of pages
+# The pages are written as they are read, so the entry ends with a marker instead of starting with a page count.
+_COUNT = struct.Struct('<I')
+_STRING = struct.Struct('<IBH')
+_END_OF_PAGES = 2 ** 32 - 1
+
+
+def layout_signature(fast: bool = False):
+    """
+    Signature of the layout constants used to read the statements.
+    A change of the layout invalidates all the cache entries.
+    :param fast: True for the fast extraction which also depends on the table bounding box
+    :return: layout signature
+    """
+    if fast:
+        return repr((CACHE_VERSION, tuple(COL.items()), CHAR_HEIGHT, CHAR_WIDTH, tuple(TABLE_BBOX.items())))
+    return repr((CACHE_VERSION, tuple(COL.items()), CHAR_HEIGHT, CHAR_WIDTH))
+
+
+def encode_page(str_list: List[String]):
+    """
+    Encode the strings of a statement page in the binary cache format
+    :param str_list: strings of the page
+    :return: uncompressed bytes
+    """
+    chunks = [_COUNT.pack(len(str_list))]
+    for string in str_list:
+        text = string.text.encode('utf-8')
+        chunks.append(_STRING.pack(string.row, string.col, len(text)))
+        chunks.append(text)
+    return b''.join(chunks)
+
+
+def decode_pages(data: bytes):
+    """
+    Decode the strings of the statement pages from the binary cache format
+    :param data: compressed bytes
+    :return: strings of each page
+    """
+    data = zlib.decompress(data)
+    if data[:len(CACHE_MAGIC)] != CACHE_MAGIC:
+        raise ValueError('Invalid page cache entry')
+    offset = len(CACHE_MAGIC)
+    page_list = []
+    while True:
+        # Raises struct.error if the entry is truncated before the end of pages marker
+        str_count, = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        if str_count == _END_OF_PAGES:
+            break
+        str_list = []
+        for _ in range(str_count):
+            row, col, length = _STRING.unpack_from(data, offset)
+            offset += _STRING.size
+            string = String(row, col, COL_NAMES[col])
+            string.text = data[offset:offset + length].decode('utf-8')
+            offset += length
+            str_list.append(string)
+        page_list.append(str_list)
+    return page_list
+
+
+class PageCacheEntry:
+    """
+    Cache entry written page by page to a temporary file, which replaces the entry when all the pages are written.
+    Used as a context manager: the temporary file is discarded if the pages are not all written.
+    """
+
+    def __init__(self, page_cache: 'PageCache', key: str):
+        self.page_cache = page_cache
+        self.path = page_cache._get_path(key)
+        self.tmp_path = Path(PurePath(page_cache.cache_folder, f'{key}.{os.getpid()}.tmp'))
+        self.f = open(self.tmp_path, 'wb')
+        self.compressor = zlib.compressobj()
+        self.f.write(self.compressor.compress(CACHE_MAGIC))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+    def write_page(self, str_list: List[String]):
+        """
+        Append the strings of a page to the entry
+        :param str_list: strings of the page
+        """
+        self.f.write(self.compressor.compress(encode_page(str_list)))
+
+    def commit(self):
+        """
+        Close the entry, replace the previous one and evict the least recently used entries
+        """
+        self.f.write(self.compressor.compress(_COUNT.pack(_END_OF_PAGES)))
+        self.f.write(self.compressor.flush())
+        self.f.close()
+        os.replace(self.tmp_path, self.path)
+        self.page_cache._evict()
+
+    def discard(self):
+        """
+        Close the entry without saving it
+        """
+        self.f.close()
+        self.page_cache._remove(self.tmp_path)
+
+
+class PageCache:
+    """
+    On-disk cache of the strings read from the pdf statements.
+    Entries are keyed by the SHA-256 of the pdf bytes and of the layout constants so that re-reading a statement
+    skips pdfminer. The least recently used entries are evicted when the cache exceeds max_size bytes.
+    """
+
+    def __init__(self, cache_folder: Union[str, Path], max_size: int = 50 * 2 ** 20):
+        self.cache_folder = Path(cache_folder)
+        self.max_size = max_size
+        self.cache_folder.mkdir(parents=True, exist_ok=True)
+
+    def get_key(self, f: BinaryIO, fast: bool = False):
+        """
+        Compute the cache key of a pdf statement
+        :param f: pdf file object, read from the start and rewound
+        :param fast: True if the statement is read with the fast extraction
+        :return: cache key
+        """
+        f.seek(0)
+        sha = hashlib.sha256(f.read())
+        f.seek(0)
+        sha.update(layout_signature(fast).encode('utf-8'))
+        return sha.hexdigest()
+
+    def _get_path(self, key: str):
+        return Path(PurePath(self.cache_folder, f'{key}{CACHE_SUFFIX}'))
+
+    def get(self, key: str) -> Optional[List[List[String]]]:
+        """
+        Retrieve the strings of the statement pages from the cache
+        :param key: cache key
+        :return: strings of each page or None if the statement is not cached
+        """
+        path = self._get_path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            page_list = decode_pages(data)
+        except (ValueError, struct.error, zlib.error):
+            logger.warning(f'Corrupted page cache entry {path.name} has been removed')
+            self._remove(path)
+            return None
+        # Touch the entry to mark it as recently used
+        os.utime(path)
+        return page_list
+
+    def open_entry(self, key: str):
+        """
+        Open a cache entry to save the strings of the statement pages as they are read
+        :param key: cache key
+        :return: cache entry
+        """
+        return PageCacheEntry(self, key)
+
+    def put(self, key: str, page_list: List[List[String]]):
+        """
+        Save the strings of the statement pages in the cache and evict the least recently used entries
+        :param key: cache key
+        :param page_list: strings of each page
+        """
+        with self.open_entry(key) as entry:
+            for str_list in page_list:
+                entry.write_page(str_list)
+
+    def invalidate(self, file: Union[str, Path]):
+        """
+        Remove the cache entry of a pdf statement
+        :param file: pdf statement
+        """
+        with open(file, 'rb') as f:
+            for fast in (False, True):
+                self._remove(self._get_path(self.get_key(f, fast)))
+
+    def clear(self):
+        """
+        Remove all the cache entries
+        """
+        for path in self.cache_folder.glob(f'*{CACHE_SUFFIX}'):
+            self._remove(path)
+
+    def _evict(self):
+        """
+        Remove the least recently used entries until the cache size is below max_size
+        """
+        entries = []
+        for path in self.cache_folder.glob(f'*{CACHE_SUFFIX}'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in sorted(entries, key=lambda entry: entry[0]):
+            if size <= self.max_size:
+                break
+            self._remove(path)
+            size -= entry_size
+
+    @staticmethod
+    def _remove(path: Path):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
@@ -4,58 +4,14 @@ from pdfminer.layout import LAParams, LTTextBoxHorizontal, LTChar
 from pdfminer.converter import PDFPageAggregator
 from pdfminer.pdfinterp import PDFPageInterpreter
 from pathlib import Path
-from typing import Iterator, Union
+from typing import Iterator, List, Union
+import numpy as np
 from ..utils.tools import to_float, extract_characters, to_date_str, to_date
-from ..hsbc.vars import COL, CHAR_HEIGHT, CHAR_WIDTH, METHOD, CCY, ACCOUNT
+from ..hsbc.vars import COL, CHAR_HEIGHT, CHAR_WIDTH, TABLE_BBOX, METHOD, CCY, ACCOUNT
 
-
-class Char:
-    """
-    Class representing a character from the HSBC statement
-    """
-
-    def __init__(self, lt_char: LTChar):
-        self.x0 = round(lt_char.x0, 2)
-        self.x1 = round(lt_char.x1, 2)
-        self.y0 = round(lt_char.y0, 2)
-        self.y1 = round(lt_char.y1, 2)
-        self.box = (self.x0, self.y0, self.x1, self.y1)
-        self.height = round(lt_char.height, 2)
-        self.width = round(lt_char.width, 2)
-        self.text = lt_char.get_text()
-        self.row = None
-        self.col = None
-        self.col_name = None
-        self.get_col()
-
-    def __str__(self):
-        return (f'text: {self.text}'
-                f' | box: {self.box}'
-                f' | row: {self.row}'
-                f' | col: {self.col}')
-
-    def get_col(self):
-        """
-        Get the column name from the pds statement based on the layout
-        """
-        if self.x0 < COL['date']:
-            self.col = 0
-            self.col_name = 'date'
-        elif self.x0 < COL['payment_type']:
-            self.col = 1
-            self.col_name = 'payment_type'
-        elif self.x0 < COL['entity']:
-            self.col = 2
-            self.col_name = 'entity'
-        elif self.x0 < COL['paid_out']:
-            self.col = 3
-            self.col_name = 'paid_out'
-        elif self.x0 < COL['paid_in']:
-            self.col = 4
-            self.col_name = 'paid_in'
-        else:
-            self.col = 5
-            self.col_name = 'balance'
+COL_NAMES = list(COL)
+# Left bounds of the columns after the first one: a character belongs to the column of the number of bounds <= x0
+COL_BOUNDS = np.array([COL[col_name] for col_name in COL_NAMES[:-1]])
 
 
 class String:
@@ -84,32 +40,147 @@ class String:
                 f' | col_name: {self.col_name}')
 
 
+def round_coordinates(coordinates: np.ndarray):
+    """
+    Round the coordinates to 2 decimals like the builtin round.
+    np.round only differs from round near the half-way cases, which are rounded with the builtin.
+    :param coordinates: array of coordinates
+    :return: rounded coordinates
+    """
+    rounded = np.round(coordinates, 2)
+    scaled = coordinates * 100
+    for i in np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6):
+        rounded.flat[i] = round(float(coordinates.flat[i]), 2)
+    return rounded
+
+
+def get_character_arrays(characters: List[LTChar]):
+    """
+    Convert the characters of a page into arrays
+    :param characters: characters of the page
+    :return: arrays of the rounded x0, x1, y0 and of the text of the characters
+    """
+    if len(characters) == 0:
+        return np.empty(0), np.empty(0), np.empty(0), np.empty(0, dtype=object)
+    x0, x1, y0 = round_coordinates(np.array([(char.x0, char.x1, char.y0) for char in characters])).T
+    text = np.array([char.get_text() for char in characters], dtype=object)
+    return x0, x1, y0, text
+
+
+def add_blank_rows(x0: np.ndarray, x1: np.ndarray, y0: np.ndarray, text: np.ndarray):
+    """
+    Add a blank character above and below the transaction table.
+    When the page is cropped to the table, they take the place of the page header and footer which are skipped by
+    segment_characters.
+    :param x0: rounded x0 of the characters
+    :param x1: rounded x1 of the characters
+    :param y0: rounded y0 of the characters
+    :param text: text of the characters
+    :return: arrays of the characters with the blank ones
+    """
+    blank = np.array([''], dtype=object)
+    return (np.concatenate(([0.], x0, [0.])),
+            np.concatenate(([0.], x1, [0.])),
+            np.concatenate(([TABLE_BBOX['y1'] + CHAR_HEIGHT], y0, [TABLE_BBOX['y0'] - CHAR_HEIGHT])),
+            np.concatenate((blank, text, blank)))
+
+
+def segment_characters(x0: np.ndarray, x1: np.ndarray, y0: np.ndarray, text: np.ndarray):
+    """
+    Group the characters of a page into strings by row and column.
+    Rows are assigned from the gaps between the sorted y0 and columns by binning x0 against the COL layout.
+    :param x0: rounded x0 of the characters
+    :param x1: rounded x1 of the characters
+    :param y0: rounded y0 of the characters
+    :param text: text of the characters
+    :return: strings of the page
+    """
+    if len(x0) == 0:
+        return iter([])
+    # Sort from top to bottom and attribute a row number to each character
+    order = np.argsort(-y0, kind='stable')
+    y0 = y0[order]
+    row = np.concatenate(([0], np.cumsum((y0[:-1] - y0[1:]) > CHAR_HEIGHT / 2)))
+    # Sort by row then from left to right
+    x0 = x0[order]
+    order_x = np.argsort(x0, kind='stable')
+    order_x = order_x[np.argsort(row[order_x], kind='stable')]
+    row = row[order_x]
+    x0 = x0[order_x]
+    x1 = x1[order][order_x]
+    text = text[order][order_x]
+    col = np.searchsorted(COL_BOUNDS, x0, side='right')
+    # A new string starts at each change of row or column. A space is added before the characters that are
+    # separated from the previous one by more than CHAR_WIDTH.
+    # As in the original character loop, the first character of the page is skipped, the first string takes
+    # the row and column of the second character and the last string of the page is not kept.
+    starts = np.flatnonzero((row[1:] != row[:-1]) | (col[1:] != col[:-1])) + 1
+    space = (x0[1:] - x1[:-1]) > CHAR_WIDTH
+    pieces = [' ' + char_text if is_space else char_text for char_text, is_space in zip(text[1:], space)]
+    str_list = []
+    begin = 1
+    for end in starts:
+        string = String(int(row[begin]), int(col[begin]), COL_NAMES[col[begin]])
+        string.text = ''.join(pieces[begin - 1:end - 1])
+        string.clean()
+        str_list.append(string)
+        begin = end
+    return iter(sorted(str_list, key=lambda x: (x.row, x.col)))
+
+
 class StatementReader:
     """
     Reader Class of a pdf statement
     """
 
-    def __init__(self, file: Union[str, Path]):
+    def __init__(self, file: Union[str, Path], page_cache=None, fast: bool = False):
         self.start_balance = None
         self.transaction_list = []
+        self.page_cache = page_cache
+        self.fast = fast
+        self._last_transaction = None
         self.f = open(file, 'rb')
         resource_manager = PDFResourceManager()
-        params = LAParams()
+        # The fast extraction collects the raw characters without the layout analysis
+        params = None if fast else LAParams()
         self.device = PDFPageAggregator(resource_manager, laparams=params)
         self.interpreter = PDFPageInterpreter(resource_manager, self.device)
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close_statement()
+
+    def iter_pages(self):
+        """
+        Read the pdf statement page by page. When a page cache is given, pages already read are loaded from the cache.
+        :return: generator of the strings of each page
+        """
+        if self.page_cache is None:
+            for page in PDFPage.get_pages(self.f):
+                yield iter(list(self.read_page(page)))
+            return
+        key = self.page_cache.get_key(self.f, self.fast)
+        page_list = self.page_cache.get(key)
+        if page_list is not None:
+            for str_list in page_list:
+                yield iter(str_list)
+            return
+        # Process each page contained in the statement, saving it to the cache entry as soon as it is read.
+        # The entry is discarded if the reading stops before the last page.
+        with self.page_cache.open_entry(key) as entry:
+            for page in PDFPage.get_pages(self.f):
+                str_list = list(self.read_page(page))
+                entry.write_page(str_list)
+                yield iter(str_list)
+
     def read_statement(self):
         """
         Read the pdf statement pages
         :return: statement pages
         """
-        # Process each page contained in the statement.
-        page_list = []
-        for page in PDFPage.get_pages(self.f):
-            str_list = self.read_page(page)
-
-            page_list.append(str_list)
-        return page_list
+        return list(self.iter_pages())
 
     def read_page(self, page: Iterator[PDFPage]):
         """
@@ -117,64 +188,47 @@ class StatementReader:
         :param page: statement page
         :return: strings of the page
         """
-        characters = []
         self.interpreter.process_page(page)
         layout = self.device.get_result()
-        for box in layout:
-            if isinstance(box, LTTextBoxHorizontal):
-                characters.extend(extract_characters(box))
-        # Create list of characters
-        char_list = [Char(char) for char in characters if
-                     isinstance(char, LTChar)]
-        char_list = sorted(char_list, key=lambda char: char.y0, reverse=True)
-        # Attribute a row number to each character
-        char_list[0].row = 0
-        for i in range(1, len(char_list)):
-            if (char_list[i - 1].y0 - char_list[i].y0) > CHAR_HEIGHT / 2:
-                char_list[i].row = char_list[i - 1].row + 1
-            else:
-                char_list[i].row = char_list[i - 1].row
-        char_list = sorted(char_list, key=lambda char: (char.row, char.x0))
-        # Create list of strings
-        str_list = []
-        previous_row = char_list[0].row
-        previous_col = char_list[0].col
-        i = 1
-        while i < len(char_list):
-            current_row = char_list[i].row
-            current_col = char_list[i].col
-            current_col_name = char_list[i].col_name
-            string = String(current_row, current_col, current_col_name)
-            while True and i < len(char_list):
-                if (char_list[i].row == previous_row and
-                        char_list[i].col == previous_col):
-                    if (char_list[i].x0 - char_list[i - 1].x1) > CHAR_WIDTH:
-                        string.text = ' '.join((string.text,
-                                                char_list[i].text))
-                    else:
-                        string.text = ''.join((string.text, char_list[i].text))
-                else:
-                    previous_row = char_list[i].row
-                    previous_col = char_list[i].col
-                    string.clean()
-                    str_list.append(string)
-                    break
-                i = i + 1
-        str_list = iter(sorted(str_list, key=lambda x: (x.row, x.col)))
-        return str_list
+        if self.fast:
+            # Keep only the characters of the transaction table
+            characters = [char for char in layout if isinstance(char, LTChar)
+                          and TABLE_BBOX['x0'] <= char.x0 < TABLE_BBOX['x1']
+                          and TABLE_BBOX['y0'] <= char.y0 < TABLE_BBOX['y1']]
+        else:
+            characters = [char for box in layout if isinstance(box, LTTextBoxHorizontal)
+                          for char in extract_characters(box) if isinstance(char, LTChar)]
+        # Release the page layout before reading the next page
+        self.device.result = None
+        character_arrays = get_character_arrays(characters)
+        if self.fast:
+            character_arrays = add_blank_rows(*character_arrays)
+        return segment_characters(*character_arrays)
+
+    def iter_transactions(self):
+        """
+        Read the transactions while the statement pages are read.
+        A transaction is yielded when the next one starts as its entity can continue on the following rows.
+        :return: generator of transactions
+        """
+        for str_list in self.iter_pages():
+            yield from self.get_transaction_details(str_list)
+        if self._last_transaction is not None:
+            transaction = self._last_transaction
+            self._last_transaction = None
+            yield transaction
 
     def get_statement_details(self):
         """
         Map the strings from the all the statement pages to attributes
         """
-        page_list = self.read_statement()
-        for str_list in page_list:
-            self.get_transaction_details(str_list)
+        self.transaction_list.extend(self.iter_transactions())
 
     def get_transaction_details(self, str_list: Iterator[String]):
         """
         Map the strings from the page to attributes
         :param str_list: string list of a page
+        :return: generator of the transactions completed on the page
         """
         while True:
             string = next(str_list, None)
@@ -219,8 +273,7 @@ class StatementReader:
                     else:
                         if new_transaction:
                             if date is None:
-                                prev_transaction = self.transaction_list[-1]
-                                date = prev_transaction['date']
+                                date = self._last_transaction['date']
                             transaction = dict(date=date,
                                                method=METHOD[method_symbol],
                                                method_symbol=method_symbol,
@@ -228,12 +281,13 @@ class StatementReader:
                                                amount=amount,
                                                ccy=CCY,
                                                account=ACCOUNT)
-                            self.transaction_list.append(transaction)
+                            if self._last_transaction is not None:
+                                yield self._last_transaction
+                            self._last_transaction = transaction
                         else:
-                            prev_transaction = self.transaction_list[-1]
+                            prev_transaction = self._last_transaction
                             prev_transaction['amount'] = amount
                             prev_transaction['entity'] = ' '.join((prev_transaction['entity'], entity))
-                            self.transaction_list[-1] = prev_transaction
                 else:
                     break
 
@@ -10,6 +10,13 @@ COL = {
     'paid_in': 500,
     'balance': 600
     }
+# Bounding box of the transaction table used by the fast extraction. Characters outside of it are ignored.
+TABLE_BBOX = {
+    'x0': 0,
+    'y0': 40,
+    'x1': COL['balance'],
+    'y1': 780
+    }
 
 METHOD = {
     'ATM': 'Cash Machine',
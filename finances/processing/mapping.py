@@ -0,0 +1,66 @@
+import io
+import hashlib
+import logging
+from pathlib import Path, PurePath
+from typing import Union
+import pandas as pd
+from ..processing.matcher import EntityMatcher
+
+logger = logging.getLogger('finances.mapping')
+
+ENTITY_MAPPING_FILE = 'entity_mapping.csv'
+
+# Entity mappings compiled by the current process, by file path
+_entity_mappings = {}
+
+
+class EntityMapping:
+    """
+    Entity mapping compiled from the entity_mapping.csv file: parsed, sorted by keyword length and indexed by the
+    keyword matcher. It is identified by the SHA-256 of the file.
+    """
+
+    def __init__(self, file_path: Path):
+        self.file_path = file_path
+        self.mtime = file_path.stat().st_mtime_ns
+        data = file_path.read_bytes()
+        self.hash = hashlib.sha256(data).hexdigest()
+        self.entity_mapping = pd.read_csv(io.BytesIO(data), sep=',', header=0,
+                                          usecols=['keyword', 'entity_name', 'type', 'category', 'sub_category'])
+        self.entity_mapping['key'] = list(map(len, self.entity_mapping.keyword))
+        self.entity_mapping.sort_values(by=['key'], ascending=False, inplace=True)
+        self.matcher = EntityMatcher(self.entity_mapping)
+
+    def is_modified(self):
+        """
+        Check if the file has been modified since it was compiled. The content is only hashed when its mtime changed.
+        :return: True if the file content has changed, False otherwise
+        """
+        mtime = self.file_path.stat().st_mtime_ns
+        if mtime == self.mtime:
+            return False
+        if hashlib.sha256(self.file_path.read_bytes()).hexdigest() == self.hash:
+            self.mtime = mtime
+            return False
+        return True
+
+
+def get_entity_mapping(project_folder: Union[str, Path]):
+    """
+    Retrieve the compiled entity mapping of the project.
+    It is compiled once per process and compiled again only when the file content changes.
+    :param project_folder: the project folder
+    :return: compiled entity mapping
+    """
+    file_path = Path(PurePath(Path(project_folder), ENTITY_MAPPING_FILE))
+    if not file_path.exists():
+        logger.error(f'{ENTITY_MAPPING_FILE} not found'
+                     f'Please create the file in {project_folder} root')
+        raise FileNotFoundError
+    entity_mapping = _entity_mappings.get(file_path)
+    if entity_mapping is None or entity_mapping.is_modified():
+        if entity_mapping is not None:
+            logger.info(f'{ENTITY_MAPPING_FILE} has changed and has been reloaded')
+        entity_mapping = EntityMapping(file_path)
+        _entity_mappings[file_path] = entity_mapping
+    return entity_mapping
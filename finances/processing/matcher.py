@@ -0,0 +1,140 @@
+from collections import deque
+from typing import Dict, Iterable, Tuple
+import pandas as pd
+
+
+class EntityMatcher:
+    """
+    Keyword matcher of the entity mapping.
+    The keywords are compiled once into an Aho-Corasick automaton which finds all the keywords contained in an
+    entity in one pass over the entity.
+    """
+
+    def __init__(self, entity_mapping: pd.DataFrame):
+        self.rows = list(entity_mapping.itertuples())
+        self._positions = {row.Index: position for position, row in enumerate(self.rows)}
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        for position, row in enumerate(self.rows):
+            self._add_keyword(row.keyword.lower(), position)
+        self._build_fail()
+
+    def _add_keyword(self, keyword: str, position: int):
+        """
+        Add a keyword to the trie of the automaton
+        :param keyword: lower case keyword
+        :param position: position of the keyword row in the entity mapping
+        """
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        self._output[state] = self._output[state] + (position,)
+
+    def _build_fail(self):
+        """
+        Compute the failure links of the automaton and merge the outputs along them
+        """
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail_state = self._fail[state]
+                while fail_state and char not in self._goto[fail_state]:
+                    fail_state = self._fail[fail_state]
+                self._fail[next_state] = self._goto[fail_state].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find(self, entity: str):
+        """
+        Find the positions of the keywords contained in the entity (case insensitive)
+        :param entity: entity of the transaction
+        :return: sorted positions of the matching rows in the entity mapping
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        positions = set(output[0])
+        state = 0
+        for char in entity.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                positions.update(output[state])
+        return sorted(positions)
+
+    def match(self, entity: str):
+        """
+        Find the entity mapping rows whose keyword is contained in the entity
+        :param entity: entity of the transaction
+        :return: matching rows in the entity mapping order
+        """
+        return [self.rows[position] for position in self.find(entity)]
+
+    def get_rows(self, indices: Iterable):
+        """
+        Retrieve the entity mapping rows from their index
+        :param indices: indices of the rows in the entity mapping file
+        :return: rows in the entity mapping order
+        """
+        return [self.rows[position] for position in sorted(self._positions[index] for index in indices)]
+
+
+class EntityMemo:
+    """
+    Memo of the entity mapping decisions.
+    For each entity (in lower case as the matching is case insensitive), the memo keeps the indices of the matching
+    rows of the entity mapping file identified by its hash.
+    """
+
+    def __init__(self, mapping_hash: str, entries: Dict[str, Tuple[int, ...]] = None):
+        self.mapping_hash = mapping_hash
+        self.entries = {} if entries is None else entries
+        self.new_entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def spawn(self):
+        """
+        Create a memo sharing the entries with its own counters and new entries, used for a statement
+        :return: memo
+        """
+        return EntityMemo(self.mapping_hash, self.entries)
+
+    def match(self, entity_matcher: EntityMatcher, entity: str):
+        """
+        Find the entity mapping rows whose keyword is contained in the entity, from the memo when possible
+        :param entity_matcher: matcher of the entity mapping keywords
+        :param entity: entity of the transaction
+        :return: matching rows in the entity mapping order
+        """
+        key = entity.lower()
+        indices = self.entries.get(key)
+        if indices is None:
+            indices = self.new_entries.get(key)
+        if indices is not None:
+            self.hits += 1
+            return entity_matcher.get_rows(indices)
+        self.misses += 1
+        rows = entity_matcher.match(entity)
+        self.new_entries[key] = tuple(row.Index for row in rows)
+        return rows
+
+    def merge(self, memo):
+        """
+        Add the new entries and the counters of a memo spawned from this one
+        :param memo: spawned memo
+        """
+        self.entries.update(memo.new_entries)
+        self.new_entries.update(memo.new_entries)
+        self.hits += memo.hits
+        self.misses += memo.misses
@@ -2,8 +2,13 @@ import pandas as pd
 from pathlib import Path, PurePath
 import sqlite3
 import logging
+from ..database.database import DimensionCache, save_transactions_to_db, save_ledger_entry
 from ..hsbc.preprocessing import StatementReader
+from ..hsbc.cache import PageCache
 from ..processing.transaction import Transaction
+from ..processing.matcher import EntityMemo
+from ..processing.mapping import get_entity_mapping
+from ..utils.tools import file_hash, statement_file_date
 
 logger = logging.getLogger('finances.statement')
 
@@ -13,14 +18,21 @@ class Statement:
     Statement class which is a collection of Transactions
     """
 
-    def __init__(self, statement_file: Path, project_folder: Path, prev_end_balance: float):
+    def __init__(self, statement_file: Path, project_folder: Path, prev_end_balance: float = None,
+                 page_cache: PageCache = None, fast_extraction: bool = False, entity_memo: EntityMemo = None):
         self.statement_file = statement_file
-        self.reader = StatementReader(statement_file)
+        self.file_hash = file_hash(statement_file)
+        self.period = f'{statement_file_date(statement_file):%Y-%m}'
+        self.entity_memo = None if entity_memo is None else entity_memo.spawn()
+        self.page_cache = page_cache
+        self.fast_extraction = fast_extraction
         self.project_folder = project_folder
         self.prev_end_balance = prev_end_balance
-        self.entity_mapping = self._get_entity_mapping_file()
+        self.next_start_balance = None
         self.error_folder = Path(PurePath(Path(self.project_folder), 'error'))
         self.transaction_collection = None
+        self.start_balance = None
+        self.end_balance = None
         self._create_error_folder()
         self._delete_error_file()
 
@@ -34,21 +46,10 @@ class Statement:
 
     def _get_entity_mapping_file(self):
         """
-        Read and format the entity mapping file
-        :return: entity mapping DataFrame
+        Retrieve the entity mapping compiled once per process and shared by the statements
+        :return: compiled entity mapping
         """
-        file_name = 'entity_mapping.csv'
-        file_path = Path(PurePath(Path(self.project_folder), file_name))
-        if not file_path.exists():
-            logger.error(f'{file_name} not found'
-                         f'Please create the file in {self.project_folder} root')
-            raise FileNotFoundError
-
-        entity_mapping = pd.read_csv(file_path, sep=',', header=0, usecols=['keyword', 'entity_name', 'type',
-                                                                            'category', 'sub_category'])
-        entity_mapping['key'] = list(map(len, entity_mapping.keyword))
-        entity_mapping.sort_values(by=['key'], ascending=False, inplace=True)
-        return entity_mapping
+        return get_entity_mapping(self.project_folder)
 
     def _create_error_folder(self):
         """
@@ -56,8 +57,8 @@ class Statement:
         """
         # error folder
         self.error_folder = Path(PurePath(Path(self.project_folder), 'error'))
-        if not self.error_folder.exists():
-            self.error_folder.mkdir()
+        # exist_ok as the statements can be read concurrently by several processes
+        self.error_folder.mkdir(exist_ok=True)
         self.error_file = Path(PurePath(self.error_folder, f'mapping_error_{self.statement_file.name[:-4]}.csv'))
 
     def _delete_error_file(self):
@@ -80,11 +81,19 @@ class Statement:
         """
         Check if the previous ending balance is equal to the strating balance from the pdf statement
         """
+        if self.prev_end_balance is None:
+            logger.info(f'No previous balance in the Database: Statement Starting Balance is {self.start_balance}')
+            return
         if self.prev_end_balance != self.start_balance:
             logger.error(f'Start balance and transactions amounts are different:'
                          f'Database Ending Balance: {self.prev_end_balance}'
                          f'/ Statement Starting Balance: {self.start_balance}')
             raise ValueError('Start balance and transactions amounts are different')
+        if self.next_start_balance is not None and self.next_start_balance != self.end_balance:
+            logger.error(f'End balance and next statement start balance are different:'
+                         f'Statement Ending Balance: {self.end_balance}'
+                         f'/ Next Statement Starting Balance: {self.next_start_balance}')
+            raise ValueError('End balance and next statement start balance are different')
 
     def _get_end_balance(self):
         """
@@ -92,27 +101,46 @@ class Statement:
         """
         self.end_balance = round(self.start_balance + sum(t.amount for t in self.transaction_collection), 2)
 
-    def _process(self):
+    def read(self):
         """
-        Read and map each transaction from the statement
+        Read the transactions and the starting balance from the pdf statement
         """
         self.transaction_collection = []
-        self.reader.get_statement_details()
-        self.start_balance = self.reader.start_balance
-        for transaction in self.reader.transaction_list:
-            new_transaction = Transaction(date=transaction['date'],
-                                          method=transaction['method'],
-                                          method_symbol=transaction['method_symbol'],
-                                          entity=transaction['entity'],
-                                          amount=transaction['amount'],
-                                          ccy=transaction['ccy'],
-                                          account=transaction['account'])
-            new_transaction.map_entity_detail(entity_mapping=self.entity_mapping)
-            self.transaction_collection.append(new_transaction)
+        self.end_balance = None
+        with StatementReader(self.statement_file, self.page_cache, self.fast_extraction) as reader:
+            for transaction in reader.iter_transactions():
+                self.transaction_collection.append(Transaction(date=transaction['date'],
+                                                               method=transaction['method'],
+                                                               method_symbol=transaction['method_symbol'],
+                                                               entity=transaction['entity'],
+                                                               amount=transaction['amount'],
+                                                               ccy=transaction['ccy'],
+                                                               account=transaction['account']))
+            self.start_balance = reader.start_balance
+
+    def map_entities(self):
+        """
+        Map each transaction read from the statement to its entity and compute the ending balance
+        """
+        # The compiled entity mapping is not kept by the statement, which is sent back by the worker processes
+        entity_mapping = self._get_entity_mapping_file()
+        entity_matcher = entity_mapping.matcher
+        if self.entity_memo is not None and self.entity_memo.mapping_hash != entity_mapping.hash:
+            # The entity mapping file has changed since the memo was loaded
+            self.entity_memo = EntityMemo(entity_mapping.hash)
+        for transaction in self.transaction_collection:
+            transaction.map_entity_detail(entity_matcher=entity_matcher, entity_memo=self.entity_memo)
         self._check_mapping_error()
-        self._check_balance_error()
         self._get_end_balance()
 
+    def process(self):
+        """
+        Read and map each transaction from the statement.
+        The balance check is left to save_to_database so that statements can be processed in any order.
+        """
+        self.read()
+        self.map_entities()
+
     def save_error_file(self):
         """
         Save the error file in the error folder
@@ -120,11 +148,16 @@ class Statement:
         logger.error(f'Missing Mappings to complete are in {self.error_file}')
         self.mapping_error_df.to_csv(self.error_file, index=False)
 
-    def save_to_database(self, db_cursor: sqlite3.Cursor):
+    def save_to_database(self, db_cursor: sqlite3.Cursor, dimension_cache: DimensionCache = None):
         """
-        Save each transaction of the statement in the database
+        Save the transactions of the statement in the database
         :param db_cursor: database cursor
+        :param dimension_cache: name to id maps of the dimension tables
         """
-        self._process()
-        for transaction in self.transaction_collection:
-            transaction.save_to_database(db_cursor)
+        if self.transaction_collection is None:
+            self.read()
+        if self.end_balance is None:
+            self.map_entities()
+        self._check_balance_error()
+        statement_id = save_ledger_entry(db_cursor, self)
+        save_transactions_to_db(db_cursor, self.transaction_collection, dimension_cache, statement_id)
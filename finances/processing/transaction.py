@@ -1,7 +1,7 @@
 import logging
-import pandas as pd
 import sqlite3
 from ..database.database import save_transaction_to_db
+from ..processing.matcher import EntityMatcher, EntityMemo
 
 logger = logging.getLogger('finances.transaction')
 
@@ -27,16 +27,17 @@ class Transaction:
         self.mapping_error = None
         self.error = False
 
-    def get_entity_detail(self, entity_mapping: pd.DataFrame):
+    def get_entity_detail(self, entity_matcher: EntityMatcher, entity_memo: EntityMemo = None):
         """
-        Retrieves the entity details from the transaction's entity_mapping DataFrame
-        :param entity_mapping: entity_mapping DataFrame
+        Retrieves the entity details from the transaction's entity mapping
+        :param entity_matcher: matcher of the entity mapping keywords
+        :param entity_memo: memo of the previous entity mapping decisions
         :return: the transaction's entity details
         """
-        entity_detail_list = []
-        for row in entity_mapping.itertuples():
-            if self.entity.lower().find(row.keyword.lower()) > -1:
-                entity_detail_list.append(row)
+        if entity_memo is None:
+            entity_detail_list = entity_matcher.match(self.entity)
+        else:
+            entity_detail_list = entity_memo.match(entity_matcher, self.entity)
 
         if len(entity_detail_list) == 0:
             logger.error(f'Entity mapping is missing for {self}')
@@ -60,12 +61,13 @@ class Transaction:
             return True
         return False
 
-    def map_entity_detail(self, entity_mapping: pd.DataFrame):
+    def map_entity_detail(self, entity_matcher: EntityMatcher, entity_memo: EntityMemo = None):
         """
         Map the transaction's attributes to the transaction's entity details
-        :param entity_mapping: entity mapping DataFrame
+        :param entity_matcher: matcher of the entity mapping keywords
+        :param entity_memo: memo of the previous entity mapping decisions
         """
-        entity_detail = self.get_entity_detail(entity_mapping)
+        entity_detail = self.get_entity_detail(entity_matcher, entity_memo)
         if not self.is_mapping_error(entity_detail):
             self.entity_name = entity_detail.entity_name
             self.category = entity_detail.category
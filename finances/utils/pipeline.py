@@ -0,0 +1,173 @@
+import time
+import queue
+import logging
+import threading
+from typing import Callable, Iterable, List
+
+logger = logging.getLogger('finances.pipeline')
+
+QUEUE_SIZE = 2
+
+# Marker of the end of the items in a queue
+_END = object()
+
+
+class _Failure:
+    """
+    Exception raised by a stage, passed downstream in place of the items
+    """
+
+    def __init__(self, exception: BaseException):
+        self.exception = exception
+
+
+class Stage:
+    """
+    Step of a pipeline applying a function to each item and measuring its throughput
+    """
+
+    def __init__(self, name: str, function: Callable = None, size: Callable = None, unit: str = 'items'):
+        """
+        :param name: name of the stage
+        :param function: function applied to each item returning the item passed to the next stage. The first stage
+        of a pipeline has no function: its time is the time spent producing the items.
+        :param size: function giving the size of an item (e.g. its number of transactions)
+        :param unit: unit of the size
+        """
+        self.name = name
+        self.function = function
+        self.size = size
+        self.unit = unit
+        self.item_count = 0
+        self.item_size = 0
+        self.busy_time = 0.0
+
+    def record(self, item, start: float):
+        """
+        Count an item processed by the stage
+        :param item: item
+        :param start: time at which the stage started to process the item
+        """
+        self.busy_time += time.perf_counter() - start
+        self.item_count += 1
+        if self.size is not None:
+            self.item_size += self.size(item)
+
+    def summary(self):
+        """
+        :return: throughput of the stage
+        """
+        rate = self.item_size / self.busy_time if self.busy_time else 0
+        return (f'{self.name}: {self.item_count} items ({self.item_size} {self.unit}) in {self.busy_time:.2f}s '
+                f'- {rate:,.0f} {self.unit}/s')
+
+
+class Pipeline:
+    """
+    Stages connected by bounded queues.
+    The source stage and the intermediate stages each run in their own thread and the last stage runs in the calling
+    thread, so that the stages work on consecutive items at the same time while the items keep their order.
+    When a stage is more than queue_size items ahead of the next one, it waits (backpressure).
+    An exception in any stage stops all the stages and is raised by run after the items already passed to the last
+    stage.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = QUEUE_SIZE):
+        self.stages = stages
+        self.queue_size = queue_size
+        self._stop = threading.Event()
+
+    def _put(self, item_queue: queue.Queue, item):
+        while not self._stop.is_set():
+            try:
+                item_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, item_queue: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                return item_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _produce(self, source: Iterable, output_queue: queue.Queue):
+        """
+        Pass the items of the source to the first queue
+        """
+        stage = self.stages[0]
+        iterator = iter(source)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                stage.record(item, start)
+                if not self._put(output_queue, item):
+                    break
+            self._put(output_queue, _END)
+        except BaseException as exception:
+            self._put(output_queue, _Failure(exception))
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+
+    def _transform(self, stage: Stage, input_queue: queue.Queue, output_queue: queue.Queue):
+        """
+        Apply a stage function to the items of its input queue
+        """
+        while True:
+            item = self._get(input_queue)
+            if item is _END or isinstance(item, _Failure):
+                self._put(output_queue, item)
+                return
+            start = time.perf_counter()
+            try:
+                item = stage.function(item)
+            except BaseException as exception:
+                self._put(output_queue, _Failure(exception))
+                return
+            stage.record(item, start)
+            if not self._put(output_queue, item):
+                return
+
+    def run(self, source: Iterable):
+        """
+        Run the items of the source through the stages
+        :param source: iterable of the items, produced by the first stage
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages[:-1]]
+        threads = [threading.Thread(target=self._produce, args=(source, queues[0]),
+                                    name=f'pipeline-{self.stages[0].name}', daemon=True)]
+        for i, stage in enumerate(self.stages[1:-1], 1):
+            threads.append(threading.Thread(target=self._transform, args=(stage, queues[i - 1], queues[i]),
+                                            name=f'pipeline-{stage.name}', daemon=True))
+        for thread in threads:
+            thread.start()
+        last_stage = self.stages[-1]
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is _END:
+                    break
+                if isinstance(item, _Failure):
+                    raise item.exception
+                start = time.perf_counter()
+                last_stage.function(item)
+                last_stage.record(item, start)
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+    def log_summary(self):
+        """
+        Log the throughput of each stage
+        """
+        for stage in self.stages:
+            logger.info(stage.summary())
@@ -1,4 +1,5 @@
 import datetime as dt
+import hashlib
 from pathlib import Path
 from typing import Iterator
 import pandas as pd
@@ -22,6 +23,11 @@ def statement_file_date(file: Path):
     return dt.datetime.strptime(file.name[11:-4], '%Y-%m').date()
 
 
+def file_hash(file: Path):
+    with open(file, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
 def to_float(string: str):
     return float(string.replace(',', ''))
 
@@ -0,0 +1,58 @@
+import sqlite3
+from pathlib import Path
+import pytest
+from finances.database.connection import get_connection_manager
+from finances.database.database import create_db
+
+# Transactions of the sample database: date, account, entity, type, category, sub_category, detail, amount
+TRANSACTIONS = [
+    ('2022-12-30', 'HSBC UK', 'Tesco', 'Expense', 'Food & Drink', 'Grocery', 'TESCO STORES 2345', -25.5),
+    ('2023-01-02', 'HSBC UK', 'Acme', 'Income', 'Paycheck', None, 'SALARY ACME', 2000.),
+    ('2023-01-15', 'HSBC UK', 'Tesco', 'Expense', 'Food & Drink', 'Grocery', 'TESCO STORES 1234', -40.),
+    ('2023-02-03', 'HSBC UK', '123', 'Expense', 'Shopping', None, 'SHOP 123', -123.),
+    ('2023-02-10', 'HSBC UK', 'Costa', 'Expense', 'Food & Drink', 'Coffee shop', 'COSTA 50%_OFF', -3.2),
+    ('2023-03-01', 'Savings', 'Acme', 'Income', 'Paycheck', None, 'SALARY ACME', 500.),
+]
+
+
+def insert_transactions(database: Path, transactions: list):
+    """
+    Save transactions in the format of TRANSACTIONS, with the missing dimension names
+    :param database: the database path
+    :param transactions: transactions to save
+    """
+    con = sqlite3.connect(str(database))
+    db_cursor = con.cursor()
+    for date, account, entity, transaction_type, category, sub_category, detail, amount in transactions:
+        ids = []
+        for table, name in [('Account', account), ('Entity', entity), ('Type', transaction_type),
+                            ('Category', category), ('Sub_category', sub_category)]:
+            if name is None:
+                ids.append(None)
+                continue
+            db_cursor.execute(f'INSERT OR IGNORE INTO {table} (name) VALUES (?)', (name,))
+            db_cursor.execute(f'SELECT {table.lower()}_id FROM {table} WHERE name = ?', (name,))
+            ids.append(db_cursor.fetchone()[0])
+        db_cursor.execute(
+            '''
+            INSERT INTO Statement
+            (date, account_id, entity_id, type_id, category_id, sub_category_id, detail, amount, currency)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'GBP')
+            ''', (date, *ids, detail, amount))
+    con.commit()
+    con.close()
+
+
+@pytest.fixture
+def database(tmp_path):
+    """
+    Sample database with the transactions of TRANSACTIONS
+    :return: the database path
+    """
+    database = tmp_path / 'finance.db'
+    con = sqlite3.connect(str(database))
+    create_db(con.cursor())
+    con.close()
+    insert_transactions(database, TRANSACTIONS)
+    yield database
+    get_connection_manager(database, read_only=True).close_all()
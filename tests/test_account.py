@@ -0,0 +1,120 @@
+import threading
+import pandas as pd
+import pytest
+from finances.dash_app.account import Account
+from .conftest import insert_transactions
+
+
+@pytest.fixture
+def account(database):
+    return Account(database, 'HSBC UK')
+
+
+@pytest.fixture
+def state(account):
+    return account.state
+
+
+def test_month_range(state):
+    assert list(state.months.strftime('%Y-%m')) == ['2022-12', '2023-01', '2023-02']
+    assert state.get_month_range() == state.get_month_range([]) == (0, 3)
+    assert state.get_month_range([1, 1]) == (1, 2)
+    # The positions are clipped to the months of the account
+    assert state.get_month_range([-2, 100]) == (0, 3)
+    assert state.get_month_range([2, 1]) == (2, 3)
+
+
+def test_summary(state):
+    summary = state.get_summary()
+    assert summary['balance'] == pytest.approx(1808.3)
+    assert summary['range_begin'] == pd.Timestamp('2022-12-01')
+    assert summary['range_end'] == pd.Timestamp('2023-02-28')
+    assert summary['range_pnl'] == pytest.approx(1808.3)
+    assert summary['actual_month_begin'] == pd.Timestamp('2023-02-01')
+    assert summary['actual_month_pnl'] == pytest.approx(-126.2)
+    assert summary['previous_month_end'] == pd.Timestamp('2023-01-31')
+    assert summary['previous_month_pnl'] == pytest.approx(1960.)
+    # The last month is not counted in the average
+    assert summary['avg_monthly_pnl'] == pytest.approx((-25.5 + 1960.) / 2)
+    summary = state.get_summary(1, 2)
+    assert summary['balance'] == pytest.approx(1934.5)
+    assert summary['range_pnl'] == pytest.approx(1960.)
+    assert summary['avg_monthly_pnl'] == pytest.approx(1960.)
+
+
+def test_warmed_figures_are_used(account):
+    account.warm_figure_cache().join()
+    misses = account.figure_cache.misses
+    state = account.state
+    for category in state.categories:
+        state.get_sub_category_figure_bar(category, *state.get_month_range())
+    assert account.figure_cache.misses == misses
+
+
+def test_figures_of_a_range(state):
+    figure = state.get_category_figure_bar(1, 3)
+    assert [trace['name'] for trace in figure['data']] == ['Food & Drink', 'Paycheck', 'Shopping', 'Total']
+    figure = state.get_total_figure(*state.get_month_range([0, 1]))
+    assert list(figure['data'][0]['y']) == pytest.approx([-25.5, 1934.5])
+
+
+def test_refresh(database, account):
+    assert not account.refresh()
+    insert_transactions(database, [
+        ('2022-10-05', 'HSBC UK', 'Tesco', 'Expense', 'Food & Drink', 'Grocery', 'TESCO', -10.),
+        ('2023-03-02', 'HSBC UK', 'Tesco', 'Expense', 'Travel', None, 'TFL', -2.5),
+        ('2023-03-02', 'Savings', 'Acme', 'Income', 'Paycheck', None, 'SALARY ACME', 500.),
+    ])
+    assert account.refresh()
+    assert account.state.first_month == 2022 * 12 + 9
+    assert account.state.balance == pytest.approx(1808.3 - 12.5)
+    assert 'Travel' in account.state.categories
+    fresh = Account(database, 'HSBC UK')
+    assert account.state.data_version == fresh.state.data_version
+    assert account.state.get_summary(1, 4) == fresh.state.get_summary(1, 4)
+
+
+def test_refresh_publishes_a_new_state(database, account):
+    state = account.state
+    months, balance = state.months, state.balance
+    insert_transactions(database, [
+        ('2022-10-05', 'HSBC UK', 'Tesco', 'Expense', 'Travel', None, 'TFL', -10.),
+    ])
+    assert account.refresh()
+    # The previous state is left as it was for the threads still reading it
+    assert account.state is not state
+    assert state.months.equals(months) and state.balance == balance
+    assert 'Travel' not in state.categories and 'Travel' not in state.cube.categories
+    assert state.cube.amounts.shape[0] == len(months)
+
+
+def test_read_while_refreshed(database, account):
+    errors = []
+    refreshed = threading.Event()
+
+    def read():
+        while not refreshed.is_set():
+            state = account.state
+            try:
+                start, end = state.get_month_range()
+                state._create_total_figure(start, end)
+                state._create_category_figure_bar(start, end)
+                state.get_summary(start, end)
+            except Exception as e:
+                errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    try:
+        for i in range(30):
+            # Each refresh adds a month and a category
+            insert_transactions(database, [(f'{2023 + (i + 2) // 12}-{(i + 2) % 12 + 1:02d}-01', 'HSBC UK', 'Tesco',
+                                            'Expense', f'Category {i}', None, 'TESCO', -1.)])
+            assert account.refresh()
+    finally:
+        refreshed.set()
+        for reader in readers:
+            reader.join()
+    assert errors == []
+    assert len(account.state.months) == 33
@@ -0,0 +1,115 @@
+import json
+import pytest
+from finances.app import create_app
+from finances.dash_app.figure_store import get_figure_folder
+from .conftest import insert_transactions
+
+
+def call(client, outputs: list, inputs: dict, state: dict = None):
+    """
+    Call a callback of the app like the dash renderer
+    :param client: test client of the app server
+    :param outputs: outputs of the callback (id.property)
+    :param inputs: values of the inputs (id.property)
+    :param state: values of the states (id.property)
+    :return: values of the outputs, None if the update is prevented
+    """
+    def to_props(values: dict):
+        return [{'id': key.split('.')[0], 'property': key.split('.')[1], 'value': value}
+                for key, value in values.items()]
+
+    output = outputs[0] if len(outputs) == 1 else f'..{"...".join(outputs)}..'
+    output_props = [{'id': key.split('.')[0], 'property': key.split('.')[1]} for key in outputs]
+    response = client.post('/_dash-update-component', json={
+        'output': output,
+        'outputs': output_props[0] if len(outputs) == 1 else output_props,
+        'inputs': to_props(inputs),
+        'state': to_props(state or {}),
+        'changedPropIds': [],
+    })
+    if response.status_code == 204:
+        return None
+    assert response.status_code == 200
+    props = json.loads(response.data)['response']
+    if 'props' in props:
+        # Single output of dash < 1.11
+        return [props['props'][outputs[0].split('.')[1]]]
+    return [props[key.split('.')[0]][key.split('.')[1]] for key in outputs]
+
+
+@pytest.fixture
+def app(database):
+    return create_app(str(database.parent), database.name)
+
+
+def update_month_range(client, data_version: str, month_range: list, previous_last: int, first_month: int):
+    return call(client, ['month_range.max', 'month_range.marks', 'month_range.value', 'first_month.data'],
+                {'data_version.data': data_version},
+                {'month_range.value': month_range, 'month_range.max': previous_last,
+                 'first_month.data': first_month})
+
+
+def test_month_range_keeps_the_selected_months(database, app):
+    client = app.server.test_client()
+    data_version = app.layout['data_version'].data
+    first_month = app.layout['first_month'].data
+    # 2022-12 to 2023-02: the first two months are selected
+    last, _, month_range, _ = update_month_range(client, data_version, [0, 1], 2, first_month)
+    assert (last, month_range) == (2, [0, 1])
+    insert_transactions(database, [
+        ('2022-10-05', 'HSBC UK', 'Tesco', 'Expense', 'Food & Drink', 'Grocery', 'TESCO', -10.),
+        ('2023-03-02', 'HSBC UK', 'Tesco', 'Expense', 'Food & Drink', 'Grocery', 'TESCO', -2.5),
+    ])
+    data_version, = call(client, ['data_version.data'], {'refresh_interval.n_intervals': 1},
+                         {'data_version.data': data_version})
+    # 2022-10 to 2023-03: the same months are selected after the two months added before them
+    last, marks, month_range, new_first_month = update_month_range(client, data_version, [0, 1], 2, first_month)
+    assert (last, month_range, new_first_month) == (5, [2, 3], first_month - 2)
+    # A range ending on the last month follows the new months
+    _, _, month_range, _ = update_month_range(client, data_version, [1, 2], 2, first_month)
+    assert month_range == [3, 5]
+
+
+def test_figures_are_sent_until_modified(database, app):
+    client = app.server.test_client()
+    response = client.get('/figures/total/0/3')
+    assert response.status_code == 200
+    assert len(json.loads(response.data)['data'][0]['y']) == 3
+    etag = response.headers['ETag']
+    assert client.get('/figures/total/0/3', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/figures/unknown/0/3').status_code == 404
+
+
+def test_not_modified_before_reading_the_figure(database, app):
+    client = app.server.test_client()
+    etag = client.get('/figures/total/0/3').headers['ETag']
+    figure_folder = get_figure_folder(database)
+    for figure_file in figure_folder.iterdir():
+        figure_file.unlink()
+    response = client.get('/figures/total/0/3', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    # The figure store is not read: the figure is not created again
+    assert list(figure_folder.iterdir()) == []
+    insert_transactions(database, [
+        ('2023-03-02', 'HSBC UK', 'Tesco', 'Expense', 'Food & Drink', 'Grocery', 'TESCO', -2.5),
+    ])
+    response = client.get('/figures/total/0/3', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_workers_serve_the_same_data(database, app):
+    # Each process serving the app has its own app
+    worker = create_app(str(database.parent), database.name)
+    insert_transactions(database, [
+        ('2023-03-02', 'HSBC UK', 'Tesco', 'Expense', 'Food & Drink', 'Grocery', 'TESCO', -2.5),
+    ])
+    # The requests are served with the new transactions even when no session has polled the worker
+    for worker_app in (app, worker):
+        client = worker_app.server.test_client()
+        response = client.get('/figures/total/0/10')
+        assert json.loads(response.data)['data'][0]['x'][-1] == '2023-03-31'
+    data_versions = [call(worker_app.server.test_client(), ['data_version.data'], {'refresh_interval.n_intervals': 1},
+                          {'data_version.data': None})[0] for worker_app in (app, worker)]
+    assert data_versions[0] == data_versions[1] != app.layout['data_version'].data
@@ -0,0 +1,129 @@
+import io
+import os
+import zlib
+import struct
+import pytest
+from finances.hsbc.cache import CACHE_MAGIC, CACHE_SUFFIX, PageCache, decode_pages, encode_page
+from finances.hsbc.preprocessing import String
+from finances.hsbc.vars import COL
+
+COL_NAMES = list(COL)
+
+
+def make_page(*texts: str):
+    str_list = []
+    for i, text in enumerate(texts):
+        string = String(i // 2, i % len(COL_NAMES), COL_NAMES[i % len(COL_NAMES)])
+        string.text = text
+        str_list.append(string)
+    return str_list
+
+
+def to_tuples(page_list):
+    return [[(string.row, string.col, string.col_name, string.text) for string in str_list]
+            for str_list in page_list]
+
+
+PAGES = [make_page('01 Jan 20', 'VIS', 'CAFÉ NERO', '2.50'), [], make_page('BALANCE CARRIED FORWARD', '100.00')]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PageCache(tmp_path / 'cache')
+
+
+def get_entries(cache: PageCache):
+    return sorted(path.name for path in cache.cache_folder.iterdir())
+
+
+def iter_pages(cache: PageCache, key: str, page_list: list):
+    """
+    Pages saved to a cache entry as they are read, as by the statement reader
+    """
+    with cache.open_entry(key) as entry:
+        for str_list in page_list:
+            entry.write_page(str_list)
+            yield str_list
+
+
+def test_put_and_get(cache):
+    cache.put('key', PAGES)
+    assert to_tuples(cache.get('key')) == to_tuples(PAGES)
+    assert get_entries(cache) == [f'key{CACHE_SUFFIX}']
+    assert cache.get('other key') is None
+
+
+def test_end_of_pages_marker():
+    data = CACHE_MAGIC + b''.join(encode_page(str_list) for str_list in PAGES)
+    # An entry without the marker is incomplete: its writing stopped before the last page
+    with pytest.raises(struct.error):
+        decode_pages(zlib.compress(data))
+    data += b'\xff\xff\xff\xff'
+    assert to_tuples(decode_pages(zlib.compress(data))) == to_tuples(PAGES)
+    assert decode_pages(zlib.compress(CACHE_MAGIC + b'\xff\xff\xff\xff')) == []
+
+
+@pytest.mark.parametrize('corrupt', [
+    lambda data: data[:len(data) // 2],
+    lambda data: zlib.compress(zlib.decompress(data)[:-4]),
+    lambda data: zlib.compress(b'FPC1' + zlib.decompress(data)[4:]),
+    lambda data: b'not a cache entry',
+], ids=['truncated', 'no end marker', 'magic', 'not compressed'])
+def test_corrupted_entry_removed(cache, corrupt):
+    cache.put('key', PAGES)
+    path = cache.cache_folder / f'key{CACHE_SUFFIX}'
+    path.write_bytes(corrupt(path.read_bytes()))
+    assert cache.get('key') is None
+    assert get_entries(cache) == []
+
+
+def test_least_recently_used_entries_evicted(cache):
+    for i in range(3):
+        cache.put(f'key {i}', PAGES)
+        os.utime(cache.cache_folder / f'key {i}{CACHE_SUFFIX}', (1000 + i, 1000 + i))
+    entry_size = (cache.cache_folder / f'key 0{CACHE_SUFFIX}').stat().st_size
+    cache.max_size = 3 * entry_size
+    # Reading the oldest entry makes it the most recently used
+    assert cache.get('key 0') is not None
+    cache.put('key 3', PAGES)
+    assert get_entries(cache) == [f'key 0{CACHE_SUFFIX}', f'key 2{CACHE_SUFFIX}', f'key 3{CACHE_SUFFIX}']
+
+
+def test_invalidate_removes_both_entries(cache, tmp_path):
+    statement_file = tmp_path / 'statement.pdf'
+    statement_file.write_bytes(b'%PDF statement')
+    other_file = tmp_path / 'other.pdf'
+    other_file.write_bytes(b'%PDF other statement')
+    for file in (statement_file, other_file):
+        with open(file, 'rb') as f:
+            for fast in (False, True):
+                cache.put(cache.get_key(f, fast), PAGES)
+    assert len(get_entries(cache)) == 4
+    cache.invalidate(statement_file)
+    with open(other_file, 'rb') as f:
+        assert get_entries(cache) == sorted(f'{cache.get_key(f, fast)}{CACHE_SUFFIX}' for fast in (False, True))
+
+
+def test_get_key_depends_on_the_extraction(cache):
+    f = io.BytesIO(b'%PDF statement')
+    assert cache.get_key(f) != cache.get_key(f, fast=True)
+    assert cache.get_key(f) == cache.get_key(io.BytesIO(b'%PDF statement'))
+    assert f.tell() == 0
+
+
+def test_entry_discarded_when_reading_stops(cache):
+    pages = iter_pages(cache, 'key', PAGES)
+    next(pages)
+    assert len(get_entries(cache)) == 1  # temporary file
+    pages.close()
+    assert get_entries(cache) == []
+    assert cache.get('key') is None
+    # A page which cannot be read discards the entry as well
+    with pytest.raises(ValueError):
+        with cache.open_entry('key') as entry:
+            entry.write_page(PAGES[0])
+            raise ValueError('unreadable page')
+    assert get_entries(cache) == []
+    # Reading all the pages commits the entry
+    assert len(list(iter_pages(cache, 'key', PAGES))) == len(PAGES)
+    assert to_tuples(cache.get('key')) == to_tuples(PAGES)
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+from finances.dash_app.cube import AggregateCube
+
+
+def get_transactions(rows: list):
+    return pd.DataFrame(rows, columns=['date', 'category', 'sub_category', 'amount']).assign(
+        date=lambda df: pd.to_datetime(df['date']))
+
+
+@pytest.fixture
+def cube():
+    return AggregateCube.from_transactions(get_transactions([
+        ('2023-01-05', 'Food & Drink', 'Grocery', -10.),
+        ('2023-01-20', 'Food & Drink', 'Restaurant', -30.),
+        ('2023-01-31', 'Paycheck', None, 1000.),
+        ('2023-03-02', 'Food & Drink', 'Grocery', -20.),
+        ('2023-03-15', None, None, -5.),
+    ]))
+
+
+def test_months(cube):
+    # The months without transactions are kept in the cube
+    assert list(cube.months.strftime('%Y-%m-%d')) == ['2023-01-31', '2023-02-28', '2023-03-31']
+    assert cube.amounts.shape == cube.counts.shape == (3, len(cube.categories), len(cube.sub_categories))
+    assert cube.counts.sum() == 5
+
+
+def test_month_totals(cube):
+    months, totals = cube.month_totals()
+    assert list(months.strftime('%Y-%m')) == ['2023-01', '2023-03']
+    np.testing.assert_allclose(totals, [960., -25.])
+    months, totals = cube.month_totals(1, 3)
+    assert list(months.strftime('%Y-%m')) == ['2023-03']
+
+
+def test_category_amounts(cube):
+    months, categories, amounts = cube.category_amounts()
+    # The transactions without category are only counted in the totals
+    assert categories == ['Food & Drink', 'Paycheck']
+    np.testing.assert_allclose(amounts, [[-40., 1000.], [-20., 0.]])
+    months, categories, amounts = cube.category_amounts(2)
+    assert categories == ['Food & Drink']
+    np.testing.assert_allclose(amounts, [[-20.]])
+
+
+def test_sub_category_amounts(cube):
+    months, sub_categories, amounts = cube.sub_category_amounts('Food & Drink')
+    assert sub_categories == ['Grocery', 'Restaurant']
+    np.testing.assert_allclose(amounts, [[-10., -30.], [-20., 0.]])
+    months, sub_categories, amounts = cube.sub_category_amounts('Paycheck')
+    assert sub_categories == ['None']
+    months, sub_categories, amounts = cube.sub_category_amounts('Unknown')
+    assert len(months) == 0 and sub_categories == [] and amounts.shape == (0, 0)
+
+
+def test_cumulative_amounts(cube):
+    amounts, counts = cube.cumulative_amounts()
+    assert amounts.shape == (4, len(cube.categories))
+    np.testing.assert_allclose(amounts.sum(axis=1), [0., 960., 960., 935.])
+    np.testing.assert_array_equal(counts.sum(axis=1), [0, 3, 3, 5])
+
+
+def test_append(cube):
+    cube.append(get_transactions([
+        ('2022-11-10', 'Shopping', None, -50.),
+        ('2023-04-01', 'Food & Drink', 'Coffee shop', -3.),
+        ('2023-01-06', 'Food & Drink', 'Grocery', -1.),
+    ]))
+    assert list(cube.months.strftime('%Y-%m')) == ['2022-11', '2022-12', '2023-01', '2023-02', '2023-03',
+                                                    '2023-04']
+    months, totals = cube.month_totals()
+    np.testing.assert_allclose(totals, [-50., 959., -25., -3.])
+    months, sub_categories, amounts = cube.sub_category_amounts('Food & Drink')
+    assert sub_categories == ['Coffee shop', 'Grocery', 'Restaurant']
+    np.testing.assert_allclose(amounts[0], [0., -11., -30.])
+
+
+def test_append_equals_from_transactions():
+    rng = np.random.RandomState(0)
+    df = get_transactions({
+        'date': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.randint(0, 1000, 500), unit='D'),
+        'category': rng.choice(['A', 'B', None], 500),
+        'sub_category': rng.choice(['x', 'y', None], 500),
+        'amount': rng.normal(size=500).round(2),
+    })
+    cube = AggregateCube.from_transactions(df)
+    appended = AggregateCube()
+    for chunk in np.array_split(np.arange(len(df)), 7):
+        appended.append(df.iloc[chunk])
+    appended.append(df.iloc[:0])
+    for method in ('month_totals', 'category_amounts'):
+        *expected_labels, expected_amounts = getattr(cube, method)()
+        *labels, amounts = getattr(appended, method)()
+        for expected, actual in zip(expected_labels, labels):
+            assert list(expected) == list(actual)
+        np.testing.assert_allclose(expected_amounts, amounts)
+    np.testing.assert_allclose(df['amount'].sum(), appended.amounts.sum())
+
+
+def test_empty_cube():
+    cube = AggregateCube.from_transactions(get_transactions([]))
+    assert len(cube.months) == 0
+    months, totals = cube.month_totals()
+    assert len(months) == len(totals) == 0
@@ -0,0 +1,22 @@
+import sqlite3
+from finances.database.database import NAME_BATCH_SIZE, DimensionCache
+
+
+def test_dimension_cache_reads_back_the_inserted_names(database):
+    con = sqlite3.connect(str(database))
+    db_cursor = con.cursor()
+    dimension_cache = DimensionCache(db_cursor)
+    known_entities = dict(dimension_cache.ids['entity'])
+    # Saved by another process after the cache was loaded: not read by the cache
+    db_cursor.execute("INSERT INTO Entity (name) VALUES ('OTHER')")
+    names = [f'ENTITY {i}' for i in range(NAME_BATCH_SIZE + 10)]
+    values = [*names, None, *known_entities, names[0]]
+    ids = dimension_cache.get_ids(db_cursor, 'entity', values)
+    db_cursor.execute('SELECT name, entity_id FROM Entity')
+    table_ids = dict(db_cursor.fetchall())
+    assert ids == [None if value is None else table_ids[value] for value in values]
+    assert dimension_cache.ids['entity'] == {name: table_ids[name] for name in [*known_entities, *names]}
+    method_ids = dimension_cache.get_ids(db_cursor, 'method', ['NEW METHOD'], ['NM'])
+    db_cursor.execute("SELECT method_id, symbol FROM Method WHERE name = 'NEW METHOD'")
+    assert db_cursor.fetchall() == [(method_ids[0], 'NM')]
+    con.close()
@@ -0,0 +1,51 @@
+import gzip
+import json
+import os
+import pytest
+from finances.dash_app.figure_store import FigureStore
+
+
+@pytest.fixture
+def figure_store(tmp_path):
+    return FigureStore(tmp_path / 'finance.db', max_files=3)
+
+
+def get_names(figure_store):
+    return sorted(figure_file.name.split('.')[0] for figure_file in figure_store.folder.glob('*.json.gz'))
+
+
+def test_figures_are_created_once(figure_store):
+    created = []
+
+    def create_figure():
+        created.append(1)
+        return {'data': [{'y': [1, 2]}]}
+
+    content, etag, last_modified = figure_store.get('total-0-2', 'v1', create_figure)
+    assert json.loads(gzip.decompress(content)) == {'data': [{'y': [1, 2]}]}
+    assert etag == f'total-0-2.{figure_store.get_key("v1")}'
+    assert figure_store.get('total-0-2', 'v1', create_figure) == (content, etag, last_modified)
+    assert len(created) == 1
+    # The figures of another data version have another ETag
+    assert figure_store.get('total-0-2', 'v2', create_figure)[1] != etag
+    assert len(created) == 2
+
+
+def test_previous_versions_are_deleted(figure_store):
+    figure_store.get('total-0-2', 'v1', dict)
+    figure_store.get('category-0-2', 'v1', dict)
+    content, *_ = figure_store.get('total-0-2', 'v2', dict)
+    assert get_names(figure_store) == ['total-0-2']
+    # A figure of the previous version that is still requested is created again rather than failing
+    assert figure_store.get('category-0-2', 'v1', dict)[0] == content
+    assert get_names(figure_store) == ['category-0-2']
+
+
+def test_oldest_figures_are_removed(figure_store):
+    for i, name in enumerate(['total-0-1', 'total-0-2', 'total-0-3', 'total-1-3']):
+        figure_store.get(name, 'v1', dict)
+        # Distinct modification times whatever the resolution of the file system
+        figure_file = next(figure_store.folder.glob(f'{name}.*.json.gz'))
+        os.utime(str(figure_file), (i, i))
+    figure_store.get('total-2-3', 'v1', dict)
+    assert get_names(figure_store) == ['total-0-3', 'total-1-3', 'total-2-3']
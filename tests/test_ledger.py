@@ -0,0 +1,68 @@
+import sqlite3
+import pytest
+from finances.database.database import create_db, get_previous_end_balance, get_next_start_balance
+
+
+@pytest.fixture
+def db_cursor():
+    con = sqlite3.connect(':memory:')
+    db_cursor = con.cursor()
+    create_db(db_cursor)
+    db_cursor.execute('''INSERT INTO Account (account_id, name) VALUES (1, 'HSBC UK')''')
+    yield db_cursor
+    con.close()
+
+
+def add_statement(db_cursor: sqlite3.Cursor, period: str, start_balance: float, amounts: list):
+    """
+    Save the transactions of a statement with its ledger entry
+    :return: end balance of the statement
+    """
+    end_balance = round(start_balance + sum(amounts), 2)
+    db_cursor.execute(
+        '''
+        INSERT INTO Ledger
+        (file_name, file_hash, period, start_balance, end_balance, transaction_count) VALUES (?, ?, ?, ?, ?, ?)
+        ''',
+        (f'statements_{period}.pdf', period, period, start_balance, end_balance, len(amounts)))
+    statement_id = db_cursor.lastrowid
+    add_transactions(db_cursor, f'{period}-15', amounts, statement_id)
+    return end_balance
+
+
+def add_transactions(db_cursor: sqlite3.Cursor, date: str, amounts: list, statement_id: int = None):
+    db_cursor.executemany(
+        '''
+        INSERT INTO Statement (date, account_id, detail, amount, currency, statement_id)
+        VALUES (?, 1, 'detail', ?, 'GBP', ?)
+        ''',
+        [(date, amount, statement_id) for amount in amounts])
+
+
+def test_empty_database(db_cursor):
+    assert get_previous_end_balance(db_cursor, '2019-03') is None
+    assert get_next_start_balance(db_cursor, '2019-03') is None
+
+
+def test_previous_statement_in_ledger(db_cursor):
+    end_balance = add_statement(db_cursor, '2019-01', 100., [-10., 25.5])
+    add_statement(db_cursor, '2019-03', 300., [-50.])
+    assert get_previous_end_balance(db_cursor, '2019-02') == end_balance == 115.5
+    assert get_next_start_balance(db_cursor, '2019-02') == 300.
+
+
+def test_older_statement_filled_in(db_cursor):
+    # The balance before the earliest statement is unknown: the ledgered transactions are not counted
+    add_statement(db_cursor, '2019-03', 300., [-50.])
+    add_statement(db_cursor, '2019-04', 250., [20.])
+    assert get_previous_end_balance(db_cursor, '2019-02') is None
+    assert get_next_start_balance(db_cursor, '2019-02') == 300.
+
+
+def test_transactions_saved_before_the_ledger(db_cursor):
+    add_transactions(db_cursor, '2018-12-15', [100., -20.25])
+    assert get_previous_end_balance(db_cursor, '2019-01') == 79.75
+    add_statement(db_cursor, '2019-02', 79.75, [-50.])
+    # Only the transactions without ledger entry make the balance before the earliest statement
+    assert get_previous_end_balance(db_cursor, '2019-01') == 79.75
+    assert get_previous_end_balance(db_cursor, '2019-03') == 29.75
@@ -0,0 +1,39 @@
+import random
+import pandas as pd
+from finances.processing.matcher import EntityMatcher, EntityMemo
+
+
+def get_entity_mapping(keywords: list):
+    return pd.DataFrame({'keyword': keywords, 'entity': [keyword.upper() for keyword in keywords]},
+                        index=range(10, 10 + len(keywords)))
+
+
+def test_overlapping_keywords():
+    matcher = EntityMatcher(get_entity_mapping(['he', 'She', 'his', 'hers', 'costa']))
+    assert [row.keyword for row in matcher.match('USHERS')] == ['he', 'She', 'hers']
+    assert [row.keyword for row in matcher.match('Costa Coffee')] == ['costa']
+    assert matcher.match('TESCO') == []
+    assert [row.keyword for row in matcher.get_rows([13, 10])] == ['he', 'hers']
+
+
+def test_same_matches_as_a_substring_search():
+    rnd = random.Random(0)
+    keywords = list({''.join(rnd.choice('abc') for _ in range(rnd.randint(1, 4))) for _ in range(40)})
+    matcher = EntityMatcher(get_entity_mapping(keywords))
+    for _ in range(200):
+        entity = ''.join(rnd.choice('abcABd ') for _ in range(rnd.randint(0, 15)))
+        assert [row.keyword for row in matcher.match(entity)] == [keyword for keyword in keywords
+                                                                   if keyword in entity.lower()]
+
+
+def test_memo():
+    matcher = EntityMatcher(get_entity_mapping(['tesco', 'costa']))
+    memo = EntityMemo('hash')
+    statement_memo = memo.spawn()
+    assert [row.keyword for row in statement_memo.match(matcher, 'TESCO STORES')] == ['tesco']
+    # The matching is case insensitive, so is the memo
+    assert [row.keyword for row in statement_memo.match(matcher, 'Tesco Stores')] == ['tesco']
+    assert (statement_memo.hits, statement_memo.misses) == (1, 1)
+    memo.merge(statement_memo)
+    assert memo.new_entries == {'tesco stores': (10,)}
+    assert memo.spawn().match(matcher, 'tesco stores')[0].keyword == 'tesco'
@@ -0,0 +1,47 @@
+import sqlite3
+import pytest
+from finances.database import migrations
+from finances.database.migrations import SCHEMA_VERSION, get_schema_version, migrate
+
+
+def get_schema(db_cursor: sqlite3.Cursor):
+    db_cursor.execute('SELECT type, name, sql FROM sqlite_master ORDER BY type, name')
+    return db_cursor.fetchall()
+
+
+@pytest.fixture
+def db_cursor():
+    con = sqlite3.connect(':memory:')
+    yield con.cursor()
+    con.close()
+
+
+def test_migrate_in_steps(db_cursor):
+    migrate(db_cursor, target_version=1)
+    assert get_schema_version(db_cursor) == 1
+    db_cursor.execute('INSERT INTO Account (name) VALUES (?)', ('HSBC UK',))
+    db_cursor.connection.commit()
+    migrate(db_cursor)
+    assert get_schema_version(db_cursor) == SCHEMA_VERSION
+    # The data are kept and the schema is the one of a new database
+    db_cursor.execute('SELECT name FROM Account')
+    assert db_cursor.fetchall() == [('HSBC UK',)]
+    new_con = sqlite3.connect(':memory:')
+    migrate(new_con.cursor())
+    assert get_schema(db_cursor) == get_schema(new_con.cursor())
+    new_con.close()
+    # Nothing is applied twice
+    migrate(db_cursor)
+    assert get_schema_version(db_cursor) == SCHEMA_VERSION
+
+
+def test_failed_migration_is_rolled_back(db_cursor, monkeypatch):
+    migrate(db_cursor)
+    schema = get_schema(db_cursor)
+    monkeypatch.setattr(migrations, 'MIGRATIONS', migrations.MIGRATIONS + [
+        (SCHEMA_VERSION + 1, 'Broken migration', 'CREATE TABLE Test (test_id INTEGER); SELECT * FROM Unknown;'),
+    ])
+    with pytest.raises(sqlite3.Error):
+        migrate(db_cursor, SCHEMA_VERSION + 1)
+    assert get_schema_version(db_cursor) == SCHEMA_VERSION
+    assert get_schema(db_cursor) == schema
@@ -0,0 +1,83 @@
+import time
+import random
+import itertools
+import threading
+import pytest
+from finances.utils.pipeline import Pipeline, Stage
+
+
+def get_pipeline_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith('pipeline-')]
+
+
+def test_items_keep_their_order():
+    rnd = random.Random(0)
+    written = []
+
+    def transform(item):
+        time.sleep(rnd.random() / 1000)
+        return item * 2
+
+    pipeline = Pipeline([Stage('read'), Stage('double', transform), Stage('add', lambda item: item + 1),
+                         Stage('write', written.append)])
+    pipeline.run(range(100))
+    assert written == [2 * i + 1 for i in range(100)]
+    assert [stage.item_count for stage in pipeline.stages] == [100] * 4
+    assert get_pipeline_threads() == []
+
+
+def test_full_queue_blocks_the_previous_stage():
+    produced = []
+    written = []
+    release = threading.Event()
+
+    def source():
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    def write(item):
+        release.wait()
+        written.append(item)
+
+    pipeline = Pipeline([Stage('read'), Stage('write', write)], queue_size=2)
+    thread = threading.Thread(target=pipeline.run, args=(source(),))
+    thread.start()
+    time.sleep(0.3)
+    # One item in the last stage, two in the queue and one waiting to be put in the queue
+    assert len(produced) == 4
+    release.set()
+    thread.join()
+    assert written == list(range(10))
+
+
+def fail_on(value: int, name: str):
+    def function(item):
+        if item == value:
+            raise ValueError(name)
+        return item
+    return function
+
+
+def failing_source():
+    yield from range(3)
+    raise ValueError('source')
+
+
+@pytest.mark.parametrize('failing_stage', ['source', 'middle', 'last'])
+def test_failure_stops_every_stage(failing_stage):
+    written = []
+
+    def write(item):
+        if failing_stage == 'last':
+            fail_on(3, 'last')(item)
+        written.append(item)
+
+    # The source is endless unless it fails: the other stages must stop it
+    source = failing_source() if failing_stage == 'source' else itertools.count()
+    middle = fail_on(3, 'middle') if failing_stage == 'middle' else (lambda item: item)
+    pipeline = Pipeline([Stage('read'), Stage('middle', middle), Stage('write', write)])
+    with pytest.raises(ValueError, match=failing_stage):
+        pipeline.run(source)
+    assert written == [0, 1, 2]
+    assert get_pipeline_threads() == []
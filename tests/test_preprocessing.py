@@ -0,0 +1,122 @@
+import random
+import numpy as np
+import pytest
+from finances.hsbc.preprocessing import String, get_character_arrays, round_coordinates, segment_characters
+from finances.hsbc.vars import COL, CHAR_HEIGHT, CHAR_WIDTH
+
+
+class Glyph:
+    """
+    Character of a page with the attributes of the pdfminer LTChar read by the statement reader
+    """
+
+    def __init__(self, x0: float, y0: float, width: float, text: str):
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x0 + width, y0 + CHAR_HEIGHT
+        self.width, self.height = width, CHAR_HEIGHT
+        self.text = text
+
+    def get_text(self):
+        return self.text
+
+
+class Char:
+    """
+    Character of the original statement reader
+    """
+
+    def __init__(self, lt_char: Glyph):
+        self.x0 = round(lt_char.x0, 2)
+        self.x1 = round(lt_char.x1, 2)
+        self.y0 = round(lt_char.y0, 2)
+        self.text = lt_char.get_text()
+        self.row = None
+        for self.col, col_name in enumerate(COL):
+            self.col_name = col_name
+            if self.x0 < COL[col_name]:
+                break
+
+
+def read_page_loop(characters: list):
+    """
+    Character loop of the original statement reader
+    :param characters: characters of the page
+    :return: strings of the page
+    """
+    char_list = [Char(char) for char in characters]
+    char_list = sorted(char_list, key=lambda char: char.y0, reverse=True)
+    char_list[0].row = 0
+    for i in range(1, len(char_list)):
+        if (char_list[i - 1].y0 - char_list[i].y0) > CHAR_HEIGHT / 2:
+            char_list[i].row = char_list[i - 1].row + 1
+        else:
+            char_list[i].row = char_list[i - 1].row
+    char_list = sorted(char_list, key=lambda char: (char.row, char.x0))
+    str_list = []
+    previous_row = char_list[0].row
+    previous_col = char_list[0].col
+    i = 1
+    while i < len(char_list):
+        string = String(char_list[i].row, char_list[i].col, char_list[i].col_name)
+        while i < len(char_list):
+            if char_list[i].row == previous_row and char_list[i].col == previous_col:
+                if (char_list[i].x0 - char_list[i - 1].x1) > CHAR_WIDTH:
+                    string.text = ' '.join((string.text, char_list[i].text))
+                else:
+                    string.text = ''.join((string.text, char_list[i].text))
+            else:
+                previous_row = char_list[i].row
+                previous_col = char_list[i].col
+                string.clean()
+                str_list.append(string)
+                break
+            i = i + 1
+    return iter(sorted(str_list, key=lambda x: (x.row, x.col)))
+
+
+def to_tuples(str_list):
+    return [(string.row, string.col, string.col_name, string.text) for string in str_list]
+
+
+def segment(characters: list):
+    return to_tuples(segment_characters(*get_character_arrays(characters)))
+
+
+def random_page(rnd: random.Random):
+    """
+    Random layout of glyphs on a few rows sharing y0, with runs of adjacent glyphs in each column and coordinates
+    near the half-way cases of the rounding to 2 decimals
+    """
+    characters = []
+    for _ in range(rnd.randint(1, 8)):
+        y0 = rnd.choice([700, 650.005, 600.125, 555.555, 500]) - rnd.choice([0, 0, 0.001, CHAR_HEIGHT / 2, 20])
+        for _ in range(rnd.randint(1, 4)):
+            x0 = rnd.choice([0, *COL.values()][:-1]) + rnd.choice([-0.005, 0, 0.005, 0.015, 1.125, 5])
+            for _ in range(rnd.randint(1, 6)):
+                width = rnd.choice([4.995, 5, 5.625, 6.125])
+                characters.append(Glyph(x0, y0 + rnd.choice([0, 0, 0.004, -0.005]), width, rnd.choice('AB1 .')))
+                x0 += width + rnd.choice([0, 0, 0.625, 0.63, 3])
+    rnd.shuffle(characters)
+    return characters
+
+
+def test_round_coordinates():
+    coordinates = np.array([0.125, 0.135, 2.675, 1.005, 650.005, 555.555, 1.2345, -0.125, 7.])
+    assert list(round_coordinates(coordinates)) == [round(float(value), 2) for value in coordinates]
+
+
+def test_empty_page():
+    assert segment([]) == []
+
+
+def test_first_glyph_skipped_and_last_string_dropped():
+    characters = [Glyph(10, 700, 5, 'A'), Glyph(15, 700, 5, 'B'), Glyph(200, 700, 5, 'C'), Glyph(10, 680, 5, 'D')]
+    # The first glyph is skipped and the last string of the page is never closed
+    assert segment(characters) == [(0, 0, 'date', 'B'), (0, 2, 'entity', 'C')]
+    assert segment(characters) == to_tuples(read_page_loop(characters))
+    assert segment(characters[:1]) == to_tuples(read_page_loop(characters[:1])) == []
+
+
+@pytest.mark.parametrize('seed', range(300))
+def test_same_strings_as_the_character_loop(seed):
+    characters = random_page(random.Random(seed))
+    assert segment(characters) == to_tuples(read_page_loop(characters))
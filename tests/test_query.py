@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+from finances.database.query import build_filters, query_transactions, aggregate_transactions
+
+
+def test_build_filters():
+    condition, params = build_filters('2023-01-01', pd.Timestamp('2023-01-31'), account='HSBC UK',
+                                      category=['Food & Drink', 'Shopping'])
+    assert condition == ('S.type_id IS NOT NULL AND S.date >= ? AND S.date <= ? '
+                         'AND S.account_id = (SELECT account_id FROM Account WHERE name = ?) '
+                         'AND S.category_id IN (SELECT category_id FROM Category WHERE name IN (?, ?))')
+    assert params == ('2023-01-01', '2023-01-31', 'HSBC UK', 'Food & Drink', 'Shopping')
+    assert build_filters() == ('S.type_id IS NOT NULL', ())
+
+
+def test_query_transactions(database):
+    df = query_transactions(database, start_date='2023-01-01', account='HSBC UK', transaction_type='Expense')
+    assert list(df['detail']) == ['TESCO STORES 1234', 'SHOP 123', 'COSTA 50%_OFF']
+    assert list(df['date']) == sorted(df['date'])
+    assert query_transactions(database, category='Unknown').empty
+
+
+def test_aggregate_transactions(database):
+    df = aggregate_transactions(database, ('month', 'category'), account='HSBC UK')
+    assert list(df['month'].dt.strftime('%Y-%m-%d')) == ['2022-12-31', '2023-01-31', '2023-01-31', '2023-02-28',
+                                                         '2023-02-28']
+    assert list(df['category']) == ['Food & Drink', 'Food & Drink', 'Paycheck', 'Food & Drink', 'Shopping']
+    assert list(df['amount']) == pytest.approx([-25.5, -40., 2000., -3.2, -123.])
+    df = aggregate_transactions(database, ('year', 'account'))
+    assert df.to_dict('records') == [
+        {'year': 2022, 'account': 'HSBC UK', 'amount': pytest.approx(-25.5), 'count': 1},
+        {'year': 2023, 'account': 'HSBC UK', 'amount': pytest.approx(1833.8), 'count': 4},
+        {'year': 2023, 'account': 'Savings', 'amount': pytest.approx(500.), 'count': 1},
+    ]
+    with pytest.raises(ValueError):
+        aggregate_transactions(database, ('week',))
@@ -0,0 +1,12 @@
+from finances.archiver import update_snapshot
+from finances.database.connection import get_connection_manager
+from finances.database.snapshot import get_snapshot_file, read_snapshot
+from .conftest import TRANSACTIONS
+
+
+def test_update_snapshot_closes_the_read_only_connections(database):
+    update_snapshot(database)
+    assert get_snapshot_file(database).exists()
+    # No connection is left open on the database file by the export
+    assert get_connection_manager(database, read_only=True)._connections == []
+    assert len(read_snapshot(database)) == len(TRANSACTIONS)
@@ -0,0 +1,86 @@
+from finances.dash_app.table import parse_filter_value, parse_filter_query, get_transaction_page
+from finances.database.query import page_transactions
+from .conftest import TRANSACTIONS, insert_transactions
+
+
+def test_parse_filter_value():
+    assert parse_filter_value('2023') == '2023'
+    assert parse_filter_value('2023', numeric=True) == 2023.
+    assert parse_filter_value('"Food & Drink"') == 'Food & Drink'
+    assert parse_filter_value('"10"', numeric=True) == 10.
+    assert parse_filter_value(r"'it\'s'") == "it's"
+    assert parse_filter_value('Tesco', numeric=True) == 'Tesco'
+
+
+def test_parse_filter_query():
+    filters = parse_filter_query('{date} datestartswith 2023 && {detail} contains 2345 && {entity} = 123 '
+                                 '&& {amount} > 10 && {amount} contains 12 && {unknown} = 1 && {amount} ~ 1')
+    assert filters == [('date', 'datestartswith', '2023'), ('detail', 'contains', '2345'), ('entity', '=', '123'),
+                       ('amount', '>', 10.), ('amount', 'contains', '12')]
+    assert parse_filter_query('') == parse_filter_query(None) == []
+
+
+def get_details(database, filter_query: str):
+    rows, _ = get_transaction_page(database, 'HSBC UK', 0, 50, [], filter_query)
+    return [row['detail'] for row in rows]
+
+
+def test_date_starts_with(database):
+    assert get_details(database, '{date} datestartswith 2023') == [
+        'SALARY ACME', 'TESCO STORES 1234', 'SHOP 123', 'COSTA 50%_OFF']
+    assert get_details(database, '{date} datestartswith 2023-02') == ['SHOP 123', 'COSTA 50%_OFF']
+
+
+def test_contains(database):
+    assert get_details(database, '{detail} contains 2345') == ['TESCO STORES 2345']
+    # The LIKE wildcards are matched literally
+    assert get_details(database, '{detail} contains %_') == ['COSTA 50%_OFF']
+    assert get_details(database, '{amount} contains 123') == ['SHOP 123']
+
+
+def test_text_equal_to_a_number(database):
+    assert get_details(database, '{entity} = 123') == ['SHOP 123']
+    assert get_details(database, '{entity} eq "Tesco"') == ['TESCO STORES 2345', 'TESCO STORES 1234']
+
+
+def test_numeric_comparisons(database):
+    assert get_details(database, '{amount} < -30') == ['TESCO STORES 1234', 'SHOP 123']
+    assert get_details(database, '{amount} >= 2000 && {category} = Paycheck') == ['SALARY ACME']
+
+
+def test_page_count_and_sort(database):
+    rows, page_count = get_transaction_page(database, 'HSBC UK', 1, 2, [{'column_id': 'amount',
+                                                                         'direction': 'desc'}], '')
+    assert page_count == 3
+    assert [row['amount'] for row in rows] == [-25.5, -40.]
+    rows, transaction_count = page_transactions(database, 0, 10, filters=[('sub_category', '=', 'None')])
+    assert transaction_count == 3
+    assert {row['account'] for row in rows} == {'HSBC UK', 'Savings'}
+
+
+def get_pages(database, pages: list, sort_by: list, data_version: str = None):
+    return [[row['detail'] for row in page_transactions(database, page, 2, sort_by, data_version=data_version)[0]]
+            for page in pages]
+
+
+def test_keyset_pages(database):
+    # Transactions sharing their dates across the pages
+    insert_transactions(database, [(date, 'HSBC UK', 'Shop', 'Expense', 'Shopping', None, f'SHOP {date} {i}', -1.)
+                                   for date in ('2023-01-15', '2023-02-03') for i in range(3)])
+    for sort_by in ([], [('date', True)], [('date', False)]):
+        pages = get_pages(database, range(7), sort_by)
+        assert sum(len(page) for page in pages) == 12
+        # Read in order, after a jump and back, with the keys of the pages already read
+        for order in (range(7), [3, 0, 1, 5, 2, 6, 4], [6, 5, 4, 3, 2, 1, 0]):
+            keyset_pages = get_pages(database, order, sort_by, f'version {sort_by} {list(order)}')
+            assert keyset_pages == [pages[page] for page in order]
+
+
+def test_count_cached_by_data_version(database):
+    _, transaction_count = page_transactions(database, 0, 10, data_version='1')
+    assert transaction_count == 6
+    insert_transactions(database, TRANSACTIONS[:1])
+    assert page_transactions(database, 0, 10, data_version='1')[1] == 6
+    assert page_transactions(database, 0, 10, data_version='2')[1] == 7
+    assert page_transactions(database, 0, 10, filters=[('amount', '<', 0)], data_version='2')[1] == 5
+    assert page_transactions(database, 0, 10)[1] == 7